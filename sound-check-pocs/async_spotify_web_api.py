@@ -0,0 +1,336 @@
+import asyncio
+import random
+import time
+import aiohttp
+from instrumentation import api_metrics, endpoint_name
+from json_codec import loads
+from library_mutations import MutationPlan, batches
+from spotify_web_api import (API_URL, DEFAULT_MARKET, MAX_PAGES, PLAYLIST_TRACKS_PAGE_LIMIT, TIME_RANGES,
+                             PlaylistFilter, SpotifyApiError, playlist_fields)
+from request_scheduler import RequestScheduler, retry_after_seconds
+from saved_songs_store import song_key
+
+
+class AsyncSpotifyWebApi:
+    """
+    asyncio counterpart of SpotifyWebApi for the read and library-mutation endpoints.
+
+    Authentication stays on SpotifyWebApi (the PKCE flow is interactive anyway); build this
+    client from an authorized one with from_api. Every attempt draws on a RequestScheduler's
+    token bucket (the sync client's, via from_api, so both share one request budget) and a 429
+    pauses every caller of that scheduler until Retry-After has passed. A semaphore caps
+    in-flight requests and 5xx responses are retried with jittered backoff.
+    """
+
+    def __init__(self, access_token, max_concurrency=8, timeout=30, max_retries=5,
+                 playlist_cache=None, saved_songs_store=None, token_manager=None, metadata_cache=None, api_url=API_URL,
+                 metrics=None, playlist_filter=None, scheduler=None):
+        self.access_token = access_token
+        self.api_url = api_url.rstrip("/")
+        self.max_concurrency = max_concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.playlist_cache = playlist_cache
+        self.saved_songs_store = saved_songs_store
+        self.token_manager = token_manager
+        self.metadata_cache = metadata_cache
+        self.metrics = metrics or api_metrics
+        self.playlist_filter = playlist_filter or PlaylistFilter.from_env()
+        self._current_user_id = None
+        self.session = None
+        self._semaphore = None
+        # Request budget and 429 pauses; only its rate limiting is used, retries are handled here
+        self.scheduler = scheduler or RequestScheduler()
+        self.stats = {"requests": 0, "throttled": 0, "retried": 0, "failed": 0}
+
+    @classmethod
+    def from_api(cls, api, **kwargs):
+        """Create an async client sharing an authorized SpotifyWebApi's token and caches."""
+        kwargs.setdefault("max_concurrency", api.max_workers)
+        kwargs.setdefault("playlist_cache", api.playlist_cache)
+        kwargs.setdefault("saved_songs_store", api.saved_songs_store)
+        kwargs.setdefault("token_manager", api.token_manager)
+        kwargs.setdefault("metadata_cache", api.metadata_cache)
+        kwargs.setdefault("api_url", api.api_url)
+        kwargs.setdefault("metrics", api.metrics)
+        kwargs.setdefault("playlist_filter", api.playlist_filter)
+        kwargs.setdefault("scheduler", api.scheduler)
+        client = cls(api.access_token, **kwargs)
+        client._current_user_id = api._current_user_id
+        return client
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def close(self):
+        if self.session:
+            await self.session.close()
+            self.session = None
+
+    async def _get_headers(self):
+        if self.token_manager:
+            # May wait on the token file lock or refresh over HTTP, so keep it off the event loop
+            self.access_token = await asyncio.to_thread(self.token_manager.get_access_token) or self.access_token
+        if not self.access_token:
+            raise Exception("Access token not set. Authenticate first.")
+        return {"Authorization": f"Bearer {self.access_token}"}
+
+    async def _request(self, method, url, description, params=None, json_body=None):
+        # The session and semaphore have to be created inside the running event loop
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit=self.max_concurrency)
+            self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        endpoint = endpoint_name(method, url)
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                wait = self.scheduler.reserve()
+                while wait > 0:
+                    await asyncio.sleep(wait)
+                    wait = self.scheduler.reserve()
+                headers = await self._get_headers()
+                self.stats["requests"] += 1
+                start = time.perf_counter()
+                try:
+                    async with self.session.request(method, url, headers=headers,
+                                                    params=params, json=json_body) as response:
+                        status = response.status
+                        body = await response.read()
+                        self.metrics.record(endpoint, status, time.perf_counter() - start, len(body), attempt > 0)
+                        if status == 401 and self.token_manager and attempt < self.max_retries:
+                            # The token this attempt sent; another coroutine may have refreshed since
+                            rejected_token = headers["Authorization"].split(" ", 1)[-1]
+                        elif status == 429:
+                            retry_after = retry_after_seconds(response.headers.get("Retry-After"),
+                                                              maximum=self.scheduler.backoff_max)
+                        elif status < 500:
+                            if status not in (200, 201):
+                                raise SpotifyApiError(f"Failed to {description}: {status}, {body.decode('utf-8', 'replace')}", status)
+                            self.scheduler.succeeded()
+                            # Library mutations answer 200 with an empty body
+                            return loads(body) if body else None
+                except (aiohttp.ClientConnectionError, asyncio.TimeoutError):
+                    self.metrics.record(endpoint, None, time.perf_counter() - start, retry=attempt > 0)
+                    if attempt >= self.max_retries:
+                        self.stats["failed"] += 1
+                        raise
+                    status = None
+
+            if attempt >= self.max_retries:
+                break
+            if status == 401:
+                # The access token was revoked or expired early; refresh it (blocking I/O, off the loop) and retry
+                access_token = await asyncio.to_thread(self.token_manager.get_access_token, rejected_token)
+                if not access_token or access_token == rejected_token:
+                    break
+                self.access_token = access_token
+            elif status == 429:
+                self.stats["throttled"] += 1
+                self.scheduler.block(retry_after)
+            else:
+                self.stats["retried"] += 1
+                await asyncio.sleep(random.uniform(0, min(30, 2 ** attempt)))
+
+        self.stats["failed"] += 1
+        raise SpotifyApiError(f"Failed to {description}: {status}, retries exhausted", status)
+
+    async def _get_pages(self, url, description, params):
+        """Follow a paging object's next cursor and return every item."""
+        items = []
+        pages = 0
+        while url and pages < MAX_PAGES:
+            data = await self._request("GET", url, description, params=params)
+            items.extend(data['items'])
+            url = data.get('next')
+            params = None
+            pages += 1
+        return items
+
+    async def get_current_user_id(self):
+        if self._current_user_id is None:
+            self._current_user_id = (await self._request("GET", f"{self.api_url}/me", "get current user"))["id"]
+        return self._current_user_id
+
+    async def get_playlists(self):
+        """The user's playlists that pass the playlist filter (see SpotifyWebApi.iter_playlists)."""
+        user_id = None if self.playlist_filter.owners else await self.get_current_user_id()
+        playlists = await self._get_pages(f"{self.api_url}/me/playlists", "get playlists", {"limit": 50, "offset": 0})
+        return [pl for pl in playlists if self.playlist_filter.includes(pl, user_id)]
+
+    async def get_playlist(self, playlist_id, snapshot_id=None, item_fields=None):
+        return (await self.get_playlists_data([playlist_id], [snapshot_id], item_fields))[0]
+
+    async def get_playlists_data(self, playlist_ids, snapshot_ids=None, item_fields=None):
+        """Fetch full playlist objects for every playlist concurrently (see SpotifyWebApi.get_playlists_data)."""
+        snapshot_ids = list(snapshot_ids or [None] * len(playlist_ids))
+        first_fields, page_fields = playlist_fields(item_fields)
+        first_params = {"fields": first_fields} if first_fields else None
+        page_params = {"fields": page_fields} if page_fields else {}
+
+        async def fetch(playlist_id, snapshot_id):
+            if self.playlist_cache:
+                if not snapshot_id:
+                    data = await self._request("GET", f"{self.api_url}/playlists/{playlist_id}",
+                                               "get playlist snapshot", params={"fields": "snapshot_id"})
+                    snapshot_id = data["snapshot_id"]
+                cached = self.playlist_cache.get(playlist_id, snapshot_id, item_fields)
+                if cached is not None:
+                    return cached
+
+            playlist_data = await self._request("GET", f"{self.api_url}/playlists/{playlist_id}", "get playlist",
+                                                params=first_params)
+            tracks = playlist_data["tracks"]
+            limit = tracks.get("limit") or PLAYLIST_TRACKS_PAGE_LIMIT
+            pages = await asyncio.gather(*[
+                self._request("GET", f"{self.api_url}/playlists/{playlist_id}/tracks",
+                              "get playlist tracks", params=dict(page_params, offset=offset, limit=limit))
+                for offset in range(len(tracks["items"]), tracks["total"], limit)
+            ])
+            for page in pages:
+                tracks["items"].extend(page["items"])
+            if self.playlist_cache:
+                self.playlist_cache.put(playlist_data, item_fields)
+            return playlist_data
+
+        return list(await asyncio.gather(*[fetch(pid, sid) for pid, sid in zip(playlist_ids, snapshot_ids)]))
+
+    async def get_saved_songs(self, full_sync=False, market=DEFAULT_MARKET):
+        """Retrieve saved songs, syncing incrementally when a saved songs store is set (see SpotifyWebApi.get_saved_songs)."""
+        store = self.saved_songs_store
+        known_keys = store.known_keys() if store and not (full_sync or store.needs_full_sync()) else None
+        url = f"{self.api_url}/me/tracks"
+        params = {"limit": 50, "offset": 0}
+        if market:
+            params["market"] = market
+        new_songs = []
+        pages = 0
+        while url and pages < MAX_PAGES:
+            data = await self._request("GET", url, "get saved songs", params=params)
+            for item in data['items']:
+                if known_keys and song_key(item) in known_keys:
+                    url = None
+                    break
+                new_songs.append(item)
+            else:
+                url = data.get('next')
+            params = None
+            pages += 1
+
+        if not store:
+            return new_songs
+        if known_keys is None:
+            store.save(new_songs, full_sync=True)
+            return new_songs
+        new_ids = {song_key(item)[0] for item in new_songs}
+        saved_songs = new_songs + [item for item in store.items if song_key(item)[0] not in new_ids]
+        store.save(saved_songs)
+        return saved_songs
+
+    async def get_top_songs(self, time_range="medium_term"):
+        return await self._get_pages(
+            f"{self.api_url}/me/top/tracks", "get top songs",
+            {"time_range": time_range, "limit": 50, "offset": 0}
+        )
+
+    async def get_top_songs_by_range(self, time_ranges=TIME_RANGES):
+        """Top tracks for every time range, fetched concurrently, as a dict of time_range -> track objects."""
+        top_songs = await asyncio.gather(*[self.get_top_songs(time_range) for time_range in time_ranges])
+        return dict(zip(time_ranges, top_songs))
+
+    async def _get_entities(self, kind, ids, url, batch_size, key, description):
+        """Fetch album or artist objects; fresh ones come from the metadata cache, the rest in concurrent batches."""
+        ids = list(ids)
+        cached, missing = self.metadata_cache.get_many(kind, ids) if self.metadata_cache else ({}, ids)
+        batches = await asyncio.gather(*[
+            self._request("GET", url, description, params={"ids": ",".join(missing[i:i + batch_size])})
+            for i in range(0, len(missing), batch_size)
+        ])
+        fetched = [entity for data in batches for entity in data.get(key, [])]
+        if self.metadata_cache:
+            self.metadata_cache.put_many(kind, fetched)
+        entities = dict(cached)
+        entities.update((entity["id"], entity) for entity in fetched if entity)
+        return [entities.get(entity_id) for entity_id in ids]
+
+    async def get_albums(self, album_ids):
+        """Retrieve one or more album objects by Spotify album IDs, batches fetched concurrently."""
+        return await self._get_entities("album", album_ids, f"{self.api_url}/albums", 20, "albums", "get albums")
+
+    async def get_artists(self, artist_ids):
+        """Retrieve one or more artist objects by Spotify artist IDs, batches fetched concurrently."""
+        return await self._get_entities("artist", artist_ids, f"{self.api_url}/artists", 50, "artists", "get artists")
+
+    async def _check_saved_batch(self, batch):
+        """Saved flags for up to 50 track IDs, or None when the check fails."""
+        try:
+            response_data = await self._request("GET", f"{self.api_url}/me/tracks/contains",
+                                                "check saved songs", params={"ids": ",".join(batch)})
+            # The response can be either a list or a dict with 'contains' field
+            if isinstance(response_data, dict) and "contains" in response_data:
+                return response_data["contains"]
+            if isinstance(response_data, list):
+                return response_data
+            raise Exception(f"Unexpected response format: {type(response_data)}")
+        except Exception as e:
+            print(f"  Failed to check {len(batch)} songs - {type(e).__name__}: {str(e)}")
+            return None
+
+    async def check_saved_songs(self, track_ids):
+        """Saved flags per track ID, batches checked concurrently (see SpotifyWebApi.check_saved_songs)."""
+        track_ids = list(track_ids)
+        saved_flags = {}
+        id_batches = batches(track_ids)
+        all_flags = await asyncio.gather(*[self._check_saved_batch(batch) for batch in id_batches])
+        for batch, flags in zip(id_batches, all_flags):
+            for j, track_id in enumerate(batch):
+                saved_flags[track_id] = None if flags is None else bool(j < len(flags) and flags[j])
+        return saved_flags
+
+    async def plan_library_changes(self, save_ids=(), unsave_ids=(), saved_ids=None):
+        """MutationPlan for the changes, from saved_ids or /me/tracks/contains (see SpotifyWebApi.plan_library_changes)."""
+        save_ids, unsave_ids = list(save_ids), list(unsave_ids)
+        if saved_ids is not None:
+            saved_flags = {track_id: track_id in saved_ids for track_id in save_ids + unsave_ids}
+        else:
+            saved_flags = await self.check_saved_songs(list(dict.fromkeys(save_ids + unsave_ids)))
+        return MutationPlan(save_ids, unsave_ids, saved_flags)
+
+    async def _change_saved_batch(self, method, batch):
+        try:
+            await self._request(method, f"{self.api_url}/me/tracks", f"{method.lower()} saved songs", json_body={"ids": batch})
+            return True
+        except Exception as e:
+            print(f"  Failed to {method.lower()} {len(batch)} songs - {type(e).__name__}: {str(e)}")
+            return False
+
+    async def apply_library_changes(self, plan):
+        """Send a MutationPlan's PUT/DELETE batches concurrently (see SpotifyWebApi.apply_library_changes)."""
+        save_result, unsave_result = plan.empty_results()
+        jobs = [("PUT", batch) for batch in plan.save_batches()] + [("DELETE", batch) for batch in plan.unsave_batches()]
+        outcomes = await asyncio.gather(*[self._change_saved_batch(method, batch) for method, batch in jobs])
+        for (method, batch), succeeded in zip(jobs, outcomes):
+            result = save_result if method == "PUT" else unsave_result
+            result[("saved" if method == "PUT" else "unsaved") if succeeded else "failed"].extend(batch)
+        return save_result, unsave_result
+
+    async def save_songs(self, track_ids):
+        """Save songs to the user's library; same result dict as SpotifyWebApi.save_songs."""
+        if not track_ids:
+            return {"saved": [], "already_saved": [], "failed": []}
+        return (await self.apply_library_changes(await self.plan_library_changes(save_ids=track_ids)))[0]
+
+    async def unsave_songs(self, track_ids):
+        """Remove songs from the user's library; same result dict as SpotifyWebApi.unsave_songs."""
+        if not track_ids:
+            return {"unsaved": [], "not_saved": [], "failed": []}
+        return (await self.apply_library_changes(await self.plan_library_changes(unsave_ids=track_ids)))[1]
+
+    def summary(self):
+        return (
+            f"{self.stats['requests']} requests, {self.stats['throttled']} throttled, "
+            f"{self.stats['retried']} retried, {self.stats['failed']} failed"
+        )
@@ -0,0 +1,181 @@
+# Eli Dow
+# January 2026
+# SoundCheck POC - Sync and regenerate reports for every curator on the team at once
+
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
+from async_spotify_web_api import AsyncSpotifyWebApi
+from instrumentation import start_run, write_run_summary
+from library_store import SYNC_SCOPE, LibraryStore, create_sync_api, detail_ids, fetch_library_async
+from metadata_cache import MetadataCache
+from request_scheduler import RequestScheduler
+from spotify_web_api import PlaylistFilter
+from stage_timer import count, mark
+from token_manager import create_token_manager
+
+load_dotenv()
+filePath = os.getenv("FILE_PATH") or ""
+
+# Get the directory where this script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Report folders the POCs write into without creating them
+REPORT_DIRS = ["playlist-songs", "intersections", "favorite-songs"]
+
+def load_users(config_path):
+    """
+    Users from a JSON list such as [{"name": "eli", "owners": ["eliasjohnsondow"]}]. Optional keys:
+    owners (playlist owner IDs or display names, default the user themselves), excluded_playlists
+    (default EXCLUDED_PLAYLISTS or 'On Repeat 🎧') and playlist_id (poc4's playlist).
+    """
+    with open(config_path, encoding='utf-8') as f:
+        return {user["name"]: user for user in json.load(f)}
+
+def user_dir(name):
+    """Each user's own FILE_PATH: tokens, playlist/saved songs caches, library store and reports."""
+    return os.path.join(filePath, "users", name) + os.path.sep
+
+def playlist_filter(user):
+    return PlaylistFilter(user.get("owners"), user.get("excluded_playlists"))
+
+def create_user_api(user, metadata_cache, scheduler=None):
+    """Authorized SpotifyWebApi for user with their own tokens and caches, the shared metadata cache and scheduler."""
+    directory = user_dir(user["name"])
+    for name in REPORT_DIRS:
+        os.makedirs(os.path.join(directory, name), exist_ok=True)
+    return create_sync_api(directory, metadata_cache=metadata_cache, playlist_filter=playlist_filter(user),
+                           scheduler=scheduler)
+
+async def sync_users(apis):
+    """
+    Fetch every user's library concurrently, then album and artist details once for all of them,
+    so entities several users share are fetched (or read from the shared cache) a single time.
+
+    Returns:
+        Dict of user name -> LibraryStore for each user whose sync succeeded
+    """
+    async def fetch(api):
+        async with AsyncSpotifyWebApi.from_api(api) as client:
+            return await fetch_library_async(client)
+
+    mark("fetch")
+    names = list(apis)
+    print(f"Fetching libraries of {len(names)} users...")
+    fetched = await asyncio.gather(*[fetch(apis[name]) for name in names], return_exceptions=True)
+    libraries = {}
+    for name, result in zip(names, fetched):
+        if isinstance(result, Exception):
+            print(f"  {name}: sync failed ({result})")
+        else:
+            libraries[name] = result
+            print(f"  {name}: {len(result[0])} playlists, {len(result[2])} saved songs")
+    if not libraries:
+        return {}
+
+    album_ids, artist_ids = {}, {}
+    user_ids = {}
+    for name, (playlists, playlists_data, saved_songs, top_songs) in libraries.items():
+        user_ids[name] = detail_ids(saved_songs, playlists_data, top_songs)
+        album_ids.update(dict.fromkeys(user_ids[name][0]))
+        artist_ids.update(dict.fromkeys(user_ids[name][1]))
+    requested = sum(len(albums) + len(artists) for albums, artists in user_ids.values())
+    print(f"Fetching details for {len(album_ids)} albums and {len(artist_ids)} artists "
+          f"({requested - len(album_ids) - len(artist_ids)} shared between users)...")
+    async with AsyncSpotifyWebApi.from_api(apis[next(iter(libraries))]) as client:
+        albums, artists = await asyncio.gather(client.get_albums(album_ids), client.get_artists(artist_ids))
+    albums = {album["id"]: album for album in albums if album}
+    artists = {artist["id"]: artist for artist in artists if artist}
+    count("users", len(libraries))
+    count("albums", len(albums))
+    count("artists", len(artists))
+
+    mark("write")
+    stores = {}
+    for name, (playlists, playlists_data, saved_songs, top_songs) in libraries.items():
+        store = LibraryStore(os.path.join(user_dir(name), "library.db"))
+        user_album_ids, user_artist_ids = user_ids[name]
+        store.replace(playlists, playlists_data, saved_songs, top_songs,
+                      [albums.get(album_id) for album_id in user_album_ids],
+                      [artists.get(artist_id) for artist_id in user_artist_ids])
+        stores[name] = store
+    return stores
+
+def run_reports(user, report_args):
+    """Run run-reports.py for user in their own directory, logging its output to reports.log there."""
+    directory = user_dir(user["name"])
+    env = dict(os.environ, FILE_PATH=directory, PERSONAL_DATA_PATH=directory)
+    env["PLAYLIST_OWNERS"] = ",".join(user.get("owners") or [])
+    if user.get("excluded_playlists") is not None:
+        env["EXCLUDED_PLAYLISTS"] = ",".join(user["excluded_playlists"])
+    if user.get("playlist_id"):
+        env["PLAYLIST_ID"] = user["playlist_id"]
+    with open(os.path.join(directory, "reports.log"), 'w', encoding='utf-8') as log:
+        completed = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, "run-reports.py"), *report_args],
+                                   cwd=SCRIPT_DIR, env=env, stdout=log, stderr=subprocess.STDOUT)
+    return completed.returncode
+
+def main():
+    start_run()
+    parser = argparse.ArgumentParser(description="Sync libraries and regenerate reports for several Spotify users")
+    parser.add_argument("users", nargs="*", help="Users to process (default: everyone in the users file)")
+    parser.add_argument("--users-file", default=os.path.join(filePath, "users.json"), help="JSON list of users")
+    parser.add_argument("--authorize", metavar="NAME", help="Authorize one user interactively and exit")
+    parser.add_argument("--max-parallel", type=int, default=4, help="Users whose reports run at the same time")
+    parser.add_argument("--skip-reports", action="store_true", help="Only sync the libraries")
+    parser.add_argument("--force", action="store_true", help="Rerun reports even if their inputs are unchanged")
+    args = parser.parse_args()
+
+    users = load_users(args.users_file)
+    metadata_cache = MetadataCache(os.path.join(filePath, "cache", "metadata.db"))
+    if args.authorize:
+        create_user_api(users[args.authorize], metadata_cache).close()
+        print(f"Authorized {args.authorize}, tokens stored in {user_dir(args.authorize)}cache")
+        return
+
+    start_time = time.time()
+
+    # Only users who already authorized; prompting for codes mid-batch would stall everyone else.
+    # Spotify rate limits the app, not each user, so every user's client shares one request budget.
+    scheduler = RequestScheduler()
+    apis = {}
+    for name in args.users or list(users):
+        if not create_token_manager(user_dir(name)).has_scope(SYNC_SCOPE):
+            print(f"Skipping {name}: not authorized yet (run with --authorize {name})")
+            continue
+        apis[name] = create_user_api(users[name], metadata_cache, scheduler)
+
+    stores = asyncio.run(sync_users(apis))
+    for api in apis.values():
+        api.close()
+    for store in stores.values():
+        store.close()
+
+    results = {}
+    if not args.skip_reports and stores:
+        print(f"Regenerating reports for {len(stores)} users...")
+        report_args = ["--force"] if args.force else []
+        with ThreadPoolExecutor(max_workers=args.max_parallel) as executor:
+            futures = {name: executor.submit(run_reports, users[name], report_args) for name in stores}
+            results = {name: future.result() for name, future in futures.items()}
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"\nComplete!")
+    for name in apis:
+        status = "sync failed" if name not in stores else "synced" if name not in results else \
+            "reports done" if results[name] == 0 else f"reports failed ({results[name]})"
+        print(f"{name}: {status}" + (f", log in {user_dir(name)}reports.log" if name in results else ""))
+    print(f"Album/artist cache: {metadata_cache.summary()}")
+    print(f"Total time: {total_time:.2f} seconds")
+    metadata_cache.close()
+    print(f"Run summary: {write_run_summary(filePath, __file__)}")
+
+if __name__ == "__main__":
+    main()
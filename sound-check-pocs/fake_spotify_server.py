@@ -0,0 +1,376 @@
+import argparse
+import json
+import random
+import threading
+import time
+import urllib.parse
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# The authorized user, who owns every playlist but Spotify's generated one
+OWNER = "eliasjohnsondow"
+
+GENRES = ["pop", "rock", "indie", "hip hop", "r&b", "edm", "house", "country", "jazz", "soul",
+          "folk", "metal", "punk", "latin", "k-pop", "classical", "alt z", "bedroom pop"]
+# Real track objects carry a long market list; it makes up much of every page
+MARKETS = ["AD", "AR", "AT", "AU", "BE", "BG", "BO", "BR", "CA", "CH", "CL", "CO", "CR", "CY", "CZ", "DE",
+           "DK", "DO", "EC", "EE", "ES", "FI", "FR", "GB", "GR", "GT", "HK", "HN", "HU", "ID", "IE", "IS",
+           "IT", "JP", "LI", "LT", "LU", "LV", "MC", "MT", "MX", "MY", "NI", "NL", "NO", "NZ", "PA", "PE",
+           "PH", "PL", "PT", "PY", "RO", "SE", "SG", "SK", "SV", "TR", "TW", "US", "UY", "ZA"]
+
+
+def _id(kind, index):
+    # Spotify IDs are 22 base62 characters
+    return f"{kind}{index:0{22 - len(kind)}d}"
+
+
+def _images(rng):
+    return [{"url": f"https://i.scdn.co/image/{rng.getrandbits(64):016x}", "height": width, "width": width}
+            for width in (640, 300, 64)]
+
+
+def parse_fields(fields):
+    """Spotify fields filter (e.g. "id,tracks(items(track(name)))") as a nested dict; None keeps the whole value."""
+    def parse(pos):
+        node, name = {}, ""
+        while pos < len(fields) and fields[pos] != ")":
+            char = fields[pos]
+            if char == "(":
+                node[name.strip()], pos = parse(pos + 1)
+                name = ""
+            elif char == ",":
+                if name.strip():
+                    node[name.strip()] = None
+                name = ""
+            else:
+                name += char
+            pos += 1
+        if name.strip():
+            node[name.strip()] = None
+        return node, pos
+    return parse(0)[0]
+
+
+def project(value, tree):
+    """Keep only the fields in tree (from parse_fields); lists are projected item by item."""
+    if tree is None:
+        return value
+    if isinstance(value, list):
+        return [project(item, tree) for item in value]
+    if isinstance(value, dict):
+        return {key: project(value[key], subtree) for key, subtree in tree.items() if key in value}
+    return value
+
+
+class SyntheticLibrary:
+    """
+    Deterministic fake Spotify library of track_count tracks for benchmarking.
+
+    Tracks are spread over albums and artists, about 1.5x track_count playlist items over
+    track_count // 100 playlists (songs repeat across playlists), saved songs covering 60% of the
+    tracks and 100 top tracks per time range. Track objects are built on demand with the fields
+    and rough size of real API responses, so a 100k library stays cheap to hold in memory.
+    """
+
+    def __init__(self, track_count, seed=0):
+        rng = random.Random(seed)
+        self.track_count = track_count
+        self.artist_count = max(1, track_count // 10)
+        self.album_count = max(1, track_count // 8)
+        today = datetime(2026, 1, 1)
+
+        self.artists = [{
+            "id": _id("ar", i), "name": f"Artist {i}", "type": "artist",
+            "genres": rng.sample(GENRES, rng.randint(0, 3)),
+            "popularity": rng.randint(0, 100), "followers": {"href": None, "total": rng.randint(0, 10 ** 7)},
+            "images": _images(rng),
+        } for i in range(self.artist_count)]
+        self.albums = [{
+            "id": _id("al", i), "name": f"Album {i}", "album_type": "album", "total_tracks": rng.randint(1, 20),
+            "release_date": (today - timedelta(days=rng.randint(0, 40 * 365))).strftime("%Y-%m-%d"),
+            "release_date_precision": "day", "popularity": rng.randint(0, 100),
+            "artists": [self._simple_artist(rng.randrange(self.artist_count))],
+            "images": _images(rng), "available_markets": MARKETS,
+        } for i in range(self.album_count)]
+        self.track_albums = [rng.randrange(self.album_count) for _ in range(track_count)]
+        self.track_features = [(rng.randint(0, 100), rng.randint(90_000, 420_000),
+                                rng.randrange(self.artist_count) if rng.random() < 0.2 else None)
+                               for _ in range(track_count)]
+
+        def added_at(days):
+            return (today - timedelta(days=days, seconds=rng.randrange(86400))).strftime("%Y-%m-%dT%H:%M:%SZ")
+
+        playlist_count = max(2, track_count // 100)
+        self.playlists = []
+        for i in range(playlist_count):
+            size = min(track_count, max(5, int(rng.expovariate(1 / 150))))
+            items = [(index, added_at(rng.randint(0, 6 * 365))) for index in rng.sample(range(track_count), size)]
+            self.playlists.append({
+                "id": _id("pl", i), "name": f"Playlist {i}", "snapshot_id": f"snap-{i}-0",
+                "owner": {"id": OWNER, "display_name": OWNER}, "items": items,
+            })
+        # Spotify's generated playlist the POCs skip
+        self.playlists.append({
+            "id": _id("pl", playlist_count), "name": "On Repeat 🎧", "snapshot_id": f"snap-{playlist_count}-0",
+            "owner": {"id": "spotify", "display_name": "Spotify"},
+            "items": [(index, added_at(1)) for index in rng.sample(range(track_count), min(30, track_count))],
+        })
+
+        saved = rng.sample(range(track_count), int(track_count * 0.6))
+        self.saved = sorted(((index, added_at(rng.randint(0, 8 * 365))) for index in saved), key=lambda item: item[1], reverse=True)
+        self.top = {time_range: rng.sample(range(track_count), min(100, track_count))
+                    for time_range in ("short_term", "medium_term", "long_term")}
+        self._lock = threading.Lock()
+
+    def _simple_artist(self, index):
+        artist = self.artists[index]
+        return {"id": artist["id"], "name": artist["name"], "type": "artist"}
+
+    def _simple_album(self, index):
+        album = self.albums[index]
+        return {key: value for key, value in album.items() if key != "popularity"}
+
+    def track(self, index, market=None):
+        """Track object; with a market, available_markets is left out as Spotify does."""
+        album_index = self.track_albums[index]
+        popularity, duration_ms, featured = self.track_features[index]
+        album = self.albums[album_index]
+        artists = list(album["artists"])
+        if featured is not None:
+            artists.append(self._simple_artist(featured))
+        track = {
+            "id": _id("tr", index), "name": f"Song {index}", "type": "track", "popularity": popularity,
+            "duration_ms": duration_ms, "explicit": index % 7 == 0, "track_number": index % 12 + 1,
+            "album": self._simple_album(album_index), "artists": artists,
+            "available_markets": MARKETS, "external_ids": {"isrc": f"US{index:010d}"},
+        }
+        if market:
+            del track["available_markets"], track["album"]["available_markets"]
+        return track
+
+    def track_index(self, track_id):
+        return int(track_id[2:]) if track_id.startswith("tr") and track_id[2:].isdigit() else None
+
+    def save(self, track_ids, saved):
+        """Save (saved=True) or unsave tracks; newly saved tracks go first, as on Spotify."""
+        indexes = {self.track_index(track_id) for track_id in track_ids} - {None}
+        now = datetime.now().strftime("%Y-%m-%dT%H:%M:%SZ")
+        with self._lock:
+            current = {index for index, _ in self.saved}
+            if saved:
+                self.saved = [(index, now) for index in indexes - current] + self.saved
+            else:
+                self.saved = [item for item in self.saved if item[0] not in indexes]
+
+    def saved_ids(self):
+        with self._lock:
+            return {index for index, _ in self.saved}
+
+
+class FakeSpotifyServer(ThreadingHTTPServer):
+    """
+    Local HTTP stand-in for the Spotify Web API and token endpoint serving a SyntheticLibrary.
+
+    Every request waits latency seconds (plus up to jitter) and answers 429 with Retry-After
+    for a throttle_rate fraction of requests, so client retry and rate-limit paths run too.
+    Point the clients at it with SPOTIFY_API_URL=<url>/v1 and SPOTIFY_ACCOUNTS_URL=<url>.
+    """
+    daemon_threads = True
+
+    def __init__(self, library, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, throttle_rate=0.0,
+                 retry_after=1, seed=0):
+        super().__init__((host, port), FakeSpotifyHandler)
+        self.library = library
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self._rng = random.Random(seed)
+        self._rng_lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "bytes": 0}
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def random(self):
+        with self._rng_lock:
+            return self._rng.random()
+
+    def start(self):
+        """Serve from a daemon thread; returns self so it can be used as server = FakeSpotifyServer(...).start()."""
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+class FakeSpotifyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, headers=None):
+        raw = json.dumps(body).encode("utf-8") if body is not None else b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(raw)
+        self.server.stats["bytes"] += len(raw)
+
+    def _paging(self, path, items, query, default_limit, make_item, extra_query=""):
+        offset = int(query.get("offset", 0))
+        limit = int(query.get("limit", default_limit))
+        page = items[offset:offset + limit]
+        next_offset = offset + limit
+        base = f"{self.server.url}{path}?{extra_query}"
+        return {
+            "href": f"{base}offset={offset}&limit={limit}",
+            "items": [make_item(item) for item in page],
+            "limit": limit,
+            "next": f"{base}offset={next_offset}&limit={limit}" if next_offset < len(items) else None,
+            "offset": offset,
+            "previous": None,
+            "total": len(items),
+        }
+
+    def _handle(self, method):
+        server = self.server
+        server.stats["requests"] += 1
+        if server.latency or server.jitter:
+            time.sleep(server.latency + server.jitter * server.random())
+        parsed = urllib.parse.urlsplit(self.path)
+        pairs = urllib.parse.parse_qsl(parsed.query)
+        query = dict(pairs)
+        body = None
+        if self.headers.get("Content-Length"):
+            raw = self.rfile.read(int(self.headers["Content-Length"]))
+            body = json.loads(raw) if method != "POST" else dict(urllib.parse.parse_qsl(raw.decode("utf-8")))
+
+        if parsed.path == "/api/token" and method == "POST":
+            return self._send(200, {
+                "access_token": f"fake-access-{int(time.time())}", "token_type": "Bearer", "expires_in": 3600,
+                "refresh_token": (body or {}).get("refresh_token") or "fake-refresh", "scope": "",
+            })
+        if server.throttle_rate and server.random() < server.throttle_rate:
+            server.stats["throttled"] += 1
+            return self._send(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                              {"Retry-After": str(server.retry_after)})
+        # Reject repeated parameters (e.g. offset sent again next to a next URL) instead of guessing which one counts
+        if len(query) != len(pairs):
+            return self._send(400, {"error": {"status": 400, "message": "Repeated query parameter"}})
+        if not (self.headers.get("Authorization") or "").startswith("Bearer "):
+            return self._send(401, {"error": {"status": 401, "message": "No token provided"}})
+
+        response = self._route(method, parsed.path, query, body)
+        if response is None:
+            return self._send(404, {"error": {"status": 404, "message": "Service not found"}})
+        self._send(200, response if response != () else None)
+
+    def _route(self, method, path, query, body):
+        library = self.server.library
+        parts = path.strip("/").split("/")
+        if parts[:1] != ["v1"]:
+            return None
+        parts = parts[1:]
+
+        if parts == ["me"] and method == "GET":
+            return {"id": OWNER, "display_name": OWNER, "type": "user"}
+        if parts == ["me", "playlists"] and method == "GET":
+            return self._paging(path, library.playlists, query, 20, self._playlist_summary)
+        if len(parts) in (2, 3) and parts[0] == "playlists" and method == "GET":
+            playlist = next((pl for pl in library.playlists if pl["id"] == parts[1]), None)
+            if playlist is None:
+                return None
+            tracks_path = f"/v1/playlists/{playlist['id']}/tracks"
+            if len(parts) == 3:
+                if parts[2] != "tracks":
+                    return None
+                response = self._paging(tracks_path, playlist["items"], query, 100, self._track_item)
+            else:
+                response = dict(self._playlist_summary(playlist), description="", followers={"href": None, "total": 0},
+                                tracks=self._paging(tracks_path, playlist["items"], {}, 100, self._track_item))
+            return project(response, parse_fields(query["fields"])) if query.get("fields") else response
+        if parts == ["me", "tracks"]:
+            if method == "GET":
+                with library._lock:
+                    saved = list(library.saved)
+                market = query.get("market")
+                return self._paging(path, saved, query, 20, lambda item: self._track_item(item, market),
+                                    f"market={market}&" if market else "")
+            if method in ("PUT", "DELETE"):
+                library.save((body or {}).get("ids") or query.get("ids", "").split(","), method == "PUT")
+                return ()
+        if parts == ["me", "tracks", "contains"] and method == "GET":
+            saved = library.saved_ids()
+            return [library.track_index(track_id) in saved for track_id in query.get("ids", "").split(",")]
+        if parts == ["me", "top", "tracks"] and method == "GET":
+            time_range = query.get("time_range", "medium_term")
+            return self._paging(path, library.top.get(time_range, []), query, 20, library.track,
+                                f"time_range={time_range}&")
+        if parts in (["albums"], ["artists"]) and method == "GET":
+            entities = library.albums if parts == ["albums"] else library.artists
+            prefix = "al" if parts == ["albums"] else "ar"
+            result = []
+            for entity_id in query.get("ids", "").split(","):
+                index = int(entity_id[2:]) if entity_id.startswith(prefix) and entity_id[2:].isdigit() else None
+                result.append(entities[index] if index is not None and index < len(entities) else None)
+            return {parts[0]: result}
+        return None
+
+    def _playlist_summary(self, playlist):
+        return {
+            "id": playlist["id"], "name": playlist["name"], "snapshot_id": playlist["snapshot_id"],
+            "owner": playlist["owner"], "public": True, "collaborative": False, "type": "playlist",
+            "tracks": {"href": f"{self.server.url}/v1/playlists/{playlist['id']}/tracks", "total": len(playlist["items"])},
+        }
+
+    def _track_item(self, item, market=None):
+        index, added_at = item
+        return {"added_at": added_at, "added_by": {"id": OWNER}, "is_local": False,
+                "track": self.server.library.track(index, market)}
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_PUT(self):
+        self._handle("PUT")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+    def do_POST(self):
+        self._handle("POST")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic Spotify library locally")
+    parser.add_argument("--tracks", type=int, default=1000, help="Number of distinct tracks in the library")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds every request waits before answering")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Up to this many extra seconds per request")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    library = SyntheticLibrary(args.tracks, seed=args.seed)
+    server = FakeSpotifyServer(library, port=args.port, latency=args.latency, jitter=args.jitter,
+                               throttle_rate=args.throttle_rate, retry_after=args.retry_after, seed=args.seed)
+    print(f"Serving {args.tracks} tracks in {len(library.playlists)} playlists at {server.url}")
+    print(f"SPOTIFY_API_URL={server.url}/v1 SPOTIFY_ACCOUNTS_URL={server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+from collections import Counter
+
+UNKNOWN = "Unknown"
+
+
+class FrequencyEngine:
+    """
+    Single-pass song, artist and album frequency counts over (playlist, track) rows.
+
+    Playlists, songs, artists and albums get dense integer codes in first-seen order, and every
+    count is a Counter keyed on those codes, so one pass over the rows produces the totals and
+    the per-playlist breakdowns for all three groupings. Rows come back in first-seen order,
+    which keeps ties in the same order as the dict-of-dict counting this replaces.
+    """
+
+    def __init__(self):
+        self.playlists = []
+        self.songs = []
+        self.artists = []
+        self.albums = []
+        self._playlist_codes = {}
+        self._song_codes = {}
+        self._artist_codes = {}
+        self._album_codes = {}
+        self.song_counts = Counter()
+        self.artist_counts = Counter()
+        self.album_counts = Counter()
+        # (entity code, playlist code) -> count
+        self.song_playlist_counts = Counter()
+        self.artist_playlist_counts = Counter()
+        self.album_playlist_counts = Counter()
+
+    @staticmethod
+    def _code(codes, values, key, value):
+        code = codes.get(key)
+        if code is None:
+            code = codes[key] = len(values)
+            values.append(value)
+        return code
+
+    def add(self, track, playlist=None):
+        """Count one occurrence of track, optionally as a member of the playlist titled playlist."""
+        if not track or not track.id:
+            return
+        artist_id = track.artist_id or UNKNOWN
+        artist_name = track.artist_name or UNKNOWN
+        album_id = track.album_id or UNKNOWN
+        album_name = track.album_name or UNKNOWN
+
+        song = self._code(self._song_codes, self.songs, track.id, (track.id, track.name or UNKNOWN, artist_name))
+        artist = self._code(self._artist_codes, self.artists, (artist_id, artist_name), (artist_id, artist_name))
+        album = self._code(self._album_codes, self.albums, (album_id, album_name), (album_id, album_name, artist_name))
+        self.song_counts[song] += 1
+        self.artist_counts[artist] += 1
+        self.album_counts[album] += 1
+
+        if playlist is not None:
+            playlist_code = self._code(self._playlist_codes, self.playlists, playlist, playlist)
+            self.song_playlist_counts[song, playlist_code] += 1
+            self.artist_playlist_counts[artist, playlist_code] += 1
+            self.album_playlist_counts[album, playlist_code] += 1
+
+    def add_rows(self, rows):
+        """Count an iterable of (playlist title, Track) rows."""
+        for playlist, track in rows:
+            self.add(track, playlist)
+
+    def _breakdowns(self, pair_counts, size):
+        breakdowns = [{} for _ in range(size)]
+        for (code, playlist_code), count in pair_counts.items():
+            breakdowns[code][self.playlists[playlist_code]] = count
+        return breakdowns
+
+    def song_rows(self):
+        """[{"count", "name", "artist", "id", "playlists": {title: count}}] in first-seen order."""
+        breakdowns = self._breakdowns(self.song_playlist_counts, len(self.songs))
+        return [
+            {"count": self.song_counts[code], "name": name, "artist": artist, "id": song_id, "playlists": breakdowns[code]}
+            for code, (song_id, name, artist) in enumerate(self.songs)
+        ]
+
+    def artist_rows(self):
+        """[{"count", "id", "name", "playlists": {title: count}}] in first-seen order."""
+        breakdowns = self._breakdowns(self.artist_playlist_counts, len(self.artists))
+        return [
+            {"count": self.artist_counts[code], "id": artist_id, "name": name, "playlists": breakdowns[code]}
+            for code, (artist_id, name) in enumerate(self.artists)
+        ]
+
+    def album_rows(self):
+        """[{"count", "id", "name", "artist", "playlists": {title: count}}] in first-seen order."""
+        breakdowns = self._breakdowns(self.album_playlist_counts, len(self.albums))
+        return [
+            {"count": self.album_counts[code], "id": album_id, "name": name, "artist": artist, "playlists": breakdowns[code]}
+            for code, (album_id, name, artist) in enumerate(self.albums)
+        ]
@@ -0,0 +1,56 @@
+from collections import Counter
+
+UNTAGGED = "(no genre)"
+
+
+class GenreIndex:
+    """
+    Genre distributions over Track records, from the artist genres synced into the library store.
+
+    A track's genres are the union of the genres of all of its artists, so a track counts once
+    toward each of its genres no matter how many of its artists share one. Tracks whose artists
+    have no genres count toward UNTAGGED. Genre sets are memoized per artist combination, which
+    repeats heavily across a library.
+    """
+
+    def __init__(self, artist_genres):
+        """
+        Args:
+            artist_genres: Dict of artist ID -> tuple of genres (LibraryStore.get_artist_genres)
+        """
+        self.artist_genres = artist_genres
+        self._track_genres = {}
+
+    def track_genres(self, track):
+        genres = self._track_genres.get(track.artist_ids)
+        if genres is None:
+            genres = tuple(dict.fromkeys(
+                genre for artist_id in track.artist_ids for genre in self.artist_genres.get(artist_id, ())
+            )) or (UNTAGGED,)
+            self._track_genres[track.artist_ids] = genres
+        return genres
+
+    def distribution(self, tracks, top_n=None):
+        """
+        Count tracks per genre.
+
+        Args:
+            tracks: Track records; None (removed/local) tracks and repeats of a track ID are skipped
+            top_n: Only return the top_n most common genres
+
+        Returns:
+            (list of (genre, track count, fraction of tracks) most common first, number of tracks counted)
+        """
+        counts = Counter()
+        seen = set()
+        for track in tracks:
+            if track is None or not track.id or track.id in seen:
+                continue
+            seen.add(track.id)
+            counts.update(self.track_genres(track))
+        total = len(seen)
+        return [(genre, count, count / total) for genre, count in counts.most_common(top_n)], total
+
+    def playlist_distributions(self, playlist_items, top_n=None):
+        """Genre distribution of each playlist: a list of distribution() results in playlist order."""
+        return [self.distribution((item.track for item in items), top_n) for items in playlist_items]
@@ -0,0 +1,208 @@
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import threading
+import time
+import tracemalloc
+import urllib.parse
+from datetime import datetime
+from stage_timer import timer
+
+# Upper bounds (ms) of the request latency histogram buckets; the last bucket is everything slower
+LATENCY_BUCKETS_MS = [50, 100, 250, 500, 1000, 2500, 5000]
+
+# Path segments after these are IDs, collapsed so every playlist/album/artist shares one endpoint name
+_ID_SEGMENTS = {"playlists", "albums", "artists", "tracks", "users"}
+_ID_PATTERN = re.compile(r"^[0-9A-Za-z]{16,}$")
+
+
+def endpoint_name(method, url):
+    """'GET /playlists/{id}/tracks' style name for a request, without host, version prefix or query."""
+    segments = urllib.parse.urlsplit(url).path.strip("/").split("/")
+    if segments and segments[0] == "v1":
+        segments = segments[1:]
+    named = []
+    for i, segment in enumerate(segments):
+        is_id = i > 0 and segments[i - 1] in _ID_SEGMENTS and _ID_PATTERN.match(segment)
+        named.append("{id}" if is_id else segment)
+    return f"{method} /{'/'.join(named)}"
+
+
+class EndpointMetrics:
+    """
+    Counters and latency histograms per API endpoint, shared by SpotifyWebApi and AsyncSpotifyWebApi.
+
+    Every attempt is recorded, so a request that was throttled twice before succeeding counts as
+    three requests, two of them throttled and retried. Bytes are response body sizes.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.endpoints = {}
+
+    def _endpoint(self, name):
+        endpoint = self.endpoints.get(name)
+        if endpoint is None:
+            endpoint = self.endpoints[name] = {
+                "requests": 0, "errors": 0, "throttled": 0, "retried": 0, "bytes": 0,
+                "latency_total": 0.0, "latency_max": 0.0, "histogram": [0] * (len(LATENCY_BUCKETS_MS) + 1),
+            }
+        return endpoint
+
+    def record(self, name, status, latency, size=0, retry=False):
+        """
+        Record one attempt.
+
+        Args:
+            name: Endpoint name from endpoint_name
+            status: HTTP status, or None when the connection failed
+            latency: Seconds from sending the request to having the response body
+            size: Response body size in bytes
+            retry: Whether this attempt repeats an earlier one
+        """
+        latency_ms = latency * 1000
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if latency_ms <= bound), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            endpoint = self._endpoint(name)
+            endpoint["requests"] += 1
+            endpoint["errors"] += status is None or status >= 400
+            endpoint["throttled"] += status == 429
+            endpoint["retried"] += retry
+            endpoint["bytes"] += size
+            endpoint["latency_total"] += latency
+            endpoint["latency_max"] = max(endpoint["latency_max"], latency)
+            endpoint["histogram"][bucket] += 1
+
+    def timed(self, name, send_request):
+        """Wrap a RequestScheduler send_request callable so every attempt it makes is recorded under name."""
+        attempts = 0
+
+        def send():
+            nonlocal attempts
+            start = time.perf_counter()
+            retry = attempts > 0
+            attempts += 1
+            try:
+                response = send_request()
+            except Exception:
+                self.record(name, None, time.perf_counter() - start, retry=retry)
+                raise
+            self.record(name, response.status_code, time.perf_counter() - start, len(response.content), retry)
+            return response
+
+        return send
+
+    def snapshot(self):
+        """Metrics per endpoint as plain dicts, with mean latency and labelled histogram buckets."""
+        labels = [f"<={bound}ms" for bound in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        with self._lock:
+            return {
+                name: dict(
+                    {key: value for key, value in endpoint.items() if key != "histogram"},
+                    latency_mean=endpoint["latency_total"] / endpoint["requests"] if endpoint["requests"] else 0.0,
+                    histogram=dict(zip(labels, endpoint["histogram"])),
+                )
+                for name, endpoint in sorted(self.endpoints.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self.endpoints = {}
+
+
+# Process-wide metrics every client records into unless given its own
+api_metrics = EndpointMetrics()
+
+
+class Profiler:
+    """
+    Opt-in cProfile and tracemalloc hooks, switched on with PROFILE=cprofile, PROFILE=tracemalloc or both
+    (comma-separated). Scripts start it with start_run() at the top of main(); importing this module
+    profiles nothing.
+    """
+
+    def __init__(self, modes):
+        self.modes = {mode.strip() for mode in modes.split(",") if mode.strip()}
+        self._profile = None
+
+    def start(self):
+        if "cprofile" in self.modes:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        if "tracemalloc" in self.modes and not tracemalloc.is_tracing():
+            tracemalloc.start(10)
+
+    def stop(self, profile_path, top=20):
+        """Stop profiling, dump cProfile stats to profile_path and return a summary of both profilers."""
+        summary = {}
+        if self._profile:
+            self._profile.disable()
+            self._profile.dump_stats(profile_path)
+            out = io.StringIO()
+            pstats.Stats(self._profile, stream=out).sort_stats("cumulative").print_stats(top)
+            summary["cprofile"] = {"stats_file": profile_path, "top_cumulative": out.getvalue().splitlines()}
+            self._profile = None
+        if tracemalloc.is_tracing() and "tracemalloc" in self.modes:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            summary["tracemalloc"] = {
+                "current_bytes": current,
+                "peak_bytes": peak,
+                "top_allocations": [str(stat) for stat in snapshot.statistics("lineno")[:top]],
+            }
+            tracemalloc.stop()
+        return summary
+
+
+profiler = Profiler(os.getenv("PROFILE", ""))
+_started = time.perf_counter()
+
+
+def start_run():
+    """Start a script's run: its total time counts from here and the profilers PROFILE asks for start."""
+    global _started
+    profiler.start()
+    _started = time.perf_counter()
+
+
+def write_run_summary(report_dir, script, metrics=None, clients=None):
+    """
+    Write script's run summary as <script name>.summary.json in report_dir, next to its reports.
+
+    The summary holds wall time, time and counters per stage (see stage_timer), metrics per API
+    endpoint and, with PROFILE set, the profiler results (cProfile stats go to a .prof file beside
+    it). API metrics come from metrics, the EndpointMetrics the script's clients record into
+    (api_metrics unless they were given their own); clients maps a name to a client's own request
+    stats (AsyncSpotifyWebApi.stats, RequestScheduler.stats) for the throttling and retries the
+    per-endpoint metrics do not show. The same JSON is also written to RUN_SUMMARY_FILE when that
+    is set (run-benchmarks.py reads it). Everything is reset afterwards, so several scripts run in
+    one process (run-reports.py workers) each get their own summary.
+    """
+    global _started
+    if metrics is None:
+        metrics = api_metrics
+    name = os.path.splitext(os.path.basename(script))[0]
+    os.makedirs(report_dir or ".", exist_ok=True)
+    path = os.path.join(report_dir, f"{name}.summary.json")
+    summary = {
+        "script": name,
+        "finished_at": datetime.now().isoformat(timespec="seconds"),
+        "total": time.perf_counter() - _started,
+        "stages": timer.stop(),
+        "counters": timer.counter_totals(),
+        "api": metrics.snapshot(),
+    }
+    if clients:
+        summary["clients"] = {name: dict(stats) for name, stats in clients.items()}
+    summary.update(profiler.stop(os.path.join(report_dir, f"{name}.prof")))
+    for output_path in filter(None, [path, os.getenv("RUN_SUMMARY_FILE")]):
+        with open(output_path, 'w') as f:
+            json.dump(summary, f, indent=2)
+
+    timer.reset()
+    metrics.reset()
+    _started = time.perf_counter()
+    return path
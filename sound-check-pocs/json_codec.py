@@ -0,0 +1,35 @@
+import json
+import os
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+# JSON_DECODER picks the library: "orjson", "msgspec" or "json"; by default the fastest one installed
+DECODER = os.getenv("JSON_DECODER") or ("orjson" if orjson else "msgspec" if msgspec else "json")
+if DECODER == "orjson" and orjson is None or DECODER == "msgspec" and msgspec is None:
+    raise ImportError(f"JSON_DECODER={DECODER} but the {DECODER} package is not installed")
+
+
+def loads(raw):
+    """Decode a JSON document from bytes or str with the configured decoder."""
+    if DECODER == "orjson":
+        return orjson.loads(raw)
+    if DECODER == "msgspec":
+        return msgspec.json.decode(raw)
+    return json.loads(raw)
+
+
+def dumps(value):
+    """Encode value as UTF-8 JSON bytes (non-ASCII characters kept as is)."""
+    if DECODER == "orjson":
+        return orjson.dumps(value)
+    if DECODER == "msgspec":
+        return msgspec.json.encode(value)
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
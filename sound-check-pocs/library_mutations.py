@@ -0,0 +1,61 @@
+# Spotify accepts at most 50 ids per /me/tracks request
+LIBRARY_BATCH_SIZE = 50
+
+
+def batches(ids, size=LIBRARY_BATCH_SIZE):
+    return [ids[i:i + size] for i in range(0, len(ids), size)]
+
+
+class MutationPlan:
+    """
+    What a save/unsave run will do, worked out before anything in the library changes.
+
+    Built from saved flags for every requested id (from /me/tracks/contains or a local saved
+    songs snapshot), so the run only sends the PUT/DELETE batches that change something. Ids
+    whose membership could not be checked are reported as failed, like the old per-batch check.
+    """
+
+    def __init__(self, save_ids, unsave_ids, saved_flags):
+        """
+        Args:
+            save_ids: Track IDs to save
+            unsave_ids: Track IDs to unsave
+            saved_flags: Dict of track ID -> True/False (saved or not), None or missing when unknown
+        """
+        self.save_ids = list(dict.fromkeys(save_ids))
+        self.unsave_ids = list(dict.fromkeys(unsave_ids))
+        self.to_save = [track_id for track_id in self.save_ids if saved_flags.get(track_id) is False]
+        self.already_saved = [track_id for track_id in self.save_ids if saved_flags.get(track_id)]
+        self.to_unsave = [track_id for track_id in self.unsave_ids if saved_flags.get(track_id)]
+        self.not_saved = [track_id for track_id in self.unsave_ids if saved_flags.get(track_id) is False]
+        self.unchecked = {
+            track_id for track_id in self.save_ids + self.unsave_ids if saved_flags.get(track_id) is None
+        }
+
+    def save_batches(self):
+        return batches(self.to_save)
+
+    def unsave_batches(self):
+        return batches(self.to_unsave)
+
+    def empty_results(self):
+        """Result dicts (same shape as save_songs/unsave_songs) holding everything decided without a request."""
+        save_result = {
+            "saved": [],
+            "already_saved": list(self.already_saved),
+            "failed": [track_id for track_id in self.save_ids if track_id in self.unchecked],
+        }
+        unsave_result = {
+            "unsaved": [],
+            "not_saved": list(self.not_saved),
+            "failed": [track_id for track_id in self.unsave_ids if track_id in self.unchecked],
+        }
+        return save_result, unsave_result
+
+    def summary(self):
+        return (
+            f"save {len(self.to_save)} songs in {len(self.save_batches())} requests "
+            f"({len(self.already_saved)} already saved), "
+            f"unsave {len(self.to_unsave)} songs in {len(self.unsave_batches())} requests "
+            f"({len(self.not_saved)} not saved), {len(self.unchecked)} unchecked"
+        )
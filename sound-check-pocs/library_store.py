@@ -0,0 +1,513 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+from datetime import date, datetime, timedelta
+from spotify_web_api import TIME_RANGES, SpotifyWebApi
+from async_spotify_web_api import AsyncSpotifyWebApi
+from metadata_cache import MetadataCache
+from playlist_cache import PlaylistCache
+from saved_songs_store import SavedSongsStore
+from stage_timer import count, mark
+from token_manager import create_token_manager
+from track_model import Track, TrackItem
+
+# Scope needed to sync every part of the library
+SYNC_SCOPE = "playlist-read-private playlist-read-collaborative user-library-read user-top-read"
+# Every track item field the store keeps (see LibraryStore.replace); playlist pages are fetched with only these
+LIBRARY_ITEM_FIELDS = "added_at,track(id,name,popularity,duration_ms,album(id,name,release_date),artists(id,name))"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sync_info (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS artists (
+    id TEXT PRIMARY KEY, name TEXT, popularity INTEGER, followers INTEGER, genres TEXT
+);
+CREATE TABLE IF NOT EXISTS artist_genres (
+    artist_id TEXT, genre TEXT, PRIMARY KEY (artist_id, genre)
+);
+CREATE INDEX IF NOT EXISTS artist_genres_genre ON artist_genres (genre);
+CREATE TABLE IF NOT EXISTS albums (
+    id TEXT PRIMARY KEY, name TEXT, release_date TEXT, total_tracks INTEGER, popularity INTEGER
+);
+CREATE TABLE IF NOT EXISTS tracks (
+    id TEXT PRIMARY KEY, name TEXT, popularity INTEGER, duration_ms INTEGER, album_id TEXT
+);
+CREATE TABLE IF NOT EXISTS track_artists (
+    track_id TEXT, position INTEGER, artist_id TEXT, PRIMARY KEY (track_id, position)
+);
+CREATE TABLE IF NOT EXISTS playlists (
+    id TEXT PRIMARY KEY, position INTEGER, name TEXT, snapshot_id TEXT, total INTEGER
+);
+CREATE TABLE IF NOT EXISTS playlist_tracks (
+    playlist_id TEXT, position INTEGER, track_id TEXT, added_at TEXT, PRIMARY KEY (playlist_id, position)
+);
+CREATE TABLE IF NOT EXISTS saved_tracks (position INTEGER PRIMARY KEY, track_id TEXT, added_at TEXT);
+CREATE TABLE IF NOT EXISTS top_tracks (
+    time_range TEXT, rank INTEGER, track_id TEXT, PRIMARY KEY (time_range, rank)
+);
+CREATE TABLE IF NOT EXISTS top_track_snapshots (
+    taken_on TEXT, time_range TEXT, rank INTEGER, track_id TEXT, name TEXT, artist TEXT,
+    PRIMARY KEY (taken_on, time_range, rank)
+);
+"""
+
+
+class LibraryStore:
+    """
+    SQLite snapshot of a user's library: normalized tracks, artists and albums plus playlist
+    memberships, saved songs and top songs.
+
+    Top songs are also kept as dated snapshots that replace() never clears (one per day and time
+    range, only stored when the ranking changed), for rank history across syncs.
+
+    Populated by sync_library and read back as compact Track/TrackItem records (playlists, albums
+    and artists keep the Spotify JSON shape), so report generators never touch the network.
+    """
+
+    def __init__(self, db_path):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+        self._track_map = None
+
+    def close(self):
+        self.conn.close()
+
+    def last_synced(self):
+        row = self.conn.execute("SELECT value FROM sync_info WHERE key = 'last_synced'").fetchone()
+        return datetime.fromisoformat(row[0]) if row else None
+
+    def fingerprint(self):
+        """Hash of the library contents (every table but sync_info), unchanged by a sync that found nothing new."""
+        digest = hashlib.sha256()
+        for table in ("artists", "artist_genres", "albums", "tracks", "track_artists", "playlists", "playlist_tracks",
+                      "saved_tracks", "top_tracks", "top_track_snapshots"):
+            for row in self.conn.execute(f"SELECT * FROM {table} ORDER BY 1, 2"):
+                digest.update(repr(row).encode('utf-8'))
+        return digest.hexdigest()
+
+    # ----- Writing -----
+
+    def replace(self, playlists, playlists_data, saved_songs, top_songs, albums, artists):
+        """
+        Replace the whole snapshot in one transaction.
+
+        Args:
+            playlists: Playlist objects from get_playlists
+            playlists_data: Full playlist objects from get_playlists_data, same order as playlists
+            saved_songs: Saved track items from get_saved_songs
+            top_songs: Dict of time_range -> track objects from get_top_songs
+            albums: Full album objects from get_albums
+            artists: Full artist objects from get_artists (every artist in the library)
+        """
+        with self.conn:
+            for table in ["artists", "artist_genres", "albums", "tracks", "track_artists", "playlists",
+                          "playlist_tracks", "saved_tracks", "top_tracks"]:
+                self.conn.execute(f"DELETE FROM {table}")
+
+            for position, (playlist, playlist_data) in enumerate(zip(playlists, playlists_data)):
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO playlists VALUES (?, ?, ?, ?, ?)",
+                    (playlist["id"], position, playlist["name"], playlist.get("snapshot_id"), playlist["tracks"]["total"])
+                )
+                for item_position, item in enumerate(playlist_data["tracks"]["items"]):
+                    track_id = self._insert_track(item.get("track"))
+                    self.conn.execute(
+                        "INSERT INTO playlist_tracks VALUES (?, ?, ?, ?)",
+                        (playlist["id"], item_position, track_id, item.get("added_at"))
+                    )
+
+            for position, item in enumerate(saved_songs):
+                track_id = self._insert_track(item.get("track"))
+                if track_id:
+                    self.conn.execute("INSERT INTO saved_tracks VALUES (?, ?, ?)", (position, track_id, item.get("added_at")))
+
+            for time_range, tracks in top_songs.items():
+                for rank, track in enumerate(tracks, start=1):
+                    track_id = self._insert_track(track)
+                    if track_id:
+                        self.conn.execute("INSERT INTO top_tracks VALUES (?, ?, ?)", (time_range, rank, track_id))
+                self._snapshot_top_tracks(time_range, tracks)
+
+            for album in albums:
+                if album and album.get("id"):
+                    self.conn.execute(
+                        "UPDATE albums SET total_tracks = ?, popularity = ? WHERE id = ?",
+                        (album.get("total_tracks"), album.get("popularity"), album["id"])
+                    )
+            for artist in artists:
+                if artist and artist.get("id"):
+                    self.conn.execute(
+                        "UPDATE artists SET popularity = ?, followers = ?, genres = ? WHERE id = ?",
+                        (artist.get("popularity"), (artist.get("followers") or {}).get("total"),
+                         json.dumps(artist.get("genres", [])), artist["id"])
+                    )
+                    self.conn.executemany(
+                        "INSERT OR IGNORE INTO artist_genres VALUES (?, ?)",
+                        [(artist["id"], genre) for genre in artist.get("genres") or []]
+                    )
+
+            self.conn.execute(
+                "INSERT OR REPLACE INTO sync_info VALUES ('last_synced', ?)", (datetime.now().isoformat(),)
+            )
+        self._track_map = None
+
+    def _snapshot_top_tracks(self, time_range, tracks, taken_on=None):
+        """Store today's ranking for time_range, unless it is the same as the latest earlier snapshot."""
+        taken_on = (taken_on or date.today()).isoformat()
+        self.conn.execute("DELETE FROM top_track_snapshots WHERE taken_on = ? AND time_range = ?", (taken_on, time_range))
+        # Ranks are API positions, like top_tracks: a track without an ID leaves a gap rather than
+        # moving everything below it up one place
+        rows = [
+            (taken_on, time_range, rank, track["id"], track.get("name"), ((track.get("artists") or [{}])[0]).get("name"))
+            for rank, track in enumerate(tracks, start=1) if track and track.get("id")
+        ]
+        latest = self._latest_snapshot_date(time_range)
+        if latest and [(row[3], row[2]) for row in rows] == [(track_id, rank) for track_id, rank, *_ in self._snapshot_rows(time_range, latest)]:
+            return
+        self.conn.executemany("INSERT INTO top_track_snapshots VALUES (?, ?, ?, ?, ?, ?)", rows)
+
+    def _insert_track(self, track):
+        if not track or not track.get("id"):
+            return None
+        album = track.get("album") or {}
+        if album.get("id"):
+            self.conn.execute(
+                "INSERT OR IGNORE INTO albums (id, name, release_date) VALUES (?, ?, ?)",
+                (album["id"], album.get("name"), album.get("release_date"))
+            )
+        self.conn.execute(
+            "INSERT OR IGNORE INTO tracks VALUES (?, ?, ?, ?, ?)",
+            (track["id"], track.get("name"), track.get("popularity"), track.get("duration_ms"), album.get("id"))
+        )
+        for position, artist in enumerate(track.get("artists") or []):
+            self.conn.execute("INSERT OR IGNORE INTO artists (id, name) VALUES (?, ?)", (artist.get("id"), artist.get("name")))
+            self.conn.execute("INSERT OR IGNORE INTO track_artists VALUES (?, ?, ?)", (track["id"], position, artist.get("id")))
+        return track["id"]
+
+    # ----- Reading -----
+
+    def _tracks(self):
+        if self._track_map is None:
+            artist_rows = self.conn.execute(
+                "SELECT ta.track_id, ar.id, ar.name FROM track_artists ta "
+                "JOIN artists ar ON ar.id = ta.artist_id ORDER BY ta.track_id, ta.position"
+            )
+            track_artists = {}
+            for track_id, artist_id, artist_name in artist_rows:
+                track_artists.setdefault(track_id, []).append((artist_id, artist_name))
+
+            track_map = {}
+            rows = self.conn.execute(
+                "SELECT t.id, t.name, t.popularity, t.duration_ms, a.id, a.name, a.release_date "
+                "FROM tracks t LEFT JOIN albums a ON a.id = t.album_id"
+            )
+            for track_id, name, popularity, duration_ms, album_id, album_name, release_date in rows:
+                artists = track_artists.get(track_id, [])
+                track_map[track_id] = Track(
+                    track_id,
+                    name,
+                    artists[0][0] if artists else None,
+                    artists[0][1] if artists else None,
+                    album_id,
+                    album_name,
+                    release_date,
+                    popularity,
+                    duration_ms,
+                    [artist_id for artist_id, _ in artists]
+                )
+            self._track_map = track_map
+        return self._track_map
+
+    def get_playlists(self):
+        rows = self.conn.execute("SELECT id, name, snapshot_id, total FROM playlists ORDER BY position")
+        return [
+            {"id": playlist_id, "name": name, "snapshot_id": snapshot_id, "tracks": {"total": total}}
+            for playlist_id, name, snapshot_id, total in rows
+        ]
+
+    def get_playlist_items(self, playlist_ids):
+        """Return a list of TrackItems per playlist (track is None for local/removed tracks)."""
+        tracks = self._tracks()
+        playlist_items = []
+        for playlist_id in playlist_ids:
+            rows = self.conn.execute(
+                "SELECT track_id, added_at FROM playlist_tracks WHERE playlist_id = ? ORDER BY position", (playlist_id,)
+            )
+            playlist_items.append([TrackItem(tracks.get(track_id), added_at) for track_id, added_at in rows])
+        return playlist_items
+
+    def get_saved_items(self):
+        tracks = self._tracks()
+        rows = self.conn.execute("SELECT track_id, added_at FROM saved_tracks ORDER BY position")
+        return [TrackItem(tracks[track_id], added_at) for track_id, added_at in rows]
+
+    def get_top_tracks(self, time_range="medium_term"):
+        tracks = self._tracks()
+        rows = self.conn.execute("SELECT track_id FROM top_tracks WHERE time_range = ? ORDER BY rank", (time_range,))
+        return [tracks[track_id] for (track_id,) in rows]
+
+    def _latest_snapshot_date(self, time_range):
+        row = self.conn.execute("SELECT MAX(taken_on) FROM top_track_snapshots WHERE time_range = ?", (time_range,)).fetchone()
+        return row[0]
+
+    def _snapshot_rows(self, time_range, taken_on):
+        return self.conn.execute(
+            "SELECT track_id, rank, name, artist FROM top_track_snapshots WHERE time_range = ? AND taken_on = ? ORDER BY rank",
+            (time_range, taken_on)
+        ).fetchall()
+
+    def get_top_snapshot_dates(self, time_range="medium_term"):
+        """ISO dates of the stored top song snapshots for time_range, oldest first."""
+        rows = self.conn.execute(
+            "SELECT DISTINCT taken_on FROM top_track_snapshots WHERE time_range = ? ORDER BY taken_on", (time_range,)
+        )
+        return [taken_on for (taken_on,) in rows]
+
+    def get_rank_history(self, time_range="medium_term", track_ids=None):
+        """
+        Rank of each track in every snapshot of time_range.
+
+        Args:
+            time_range: short_term, medium_term or long_term
+            track_ids: Tracks to report (default: every track in any snapshot)
+
+        Returns:
+            Dict of track ID -> list of (ISO date, rank or None when it was not in that snapshot), oldest first
+        """
+        dates = self.get_top_snapshot_dates(time_range)
+        ranks = {}
+        rows = self.conn.execute("SELECT track_id, taken_on, rank FROM top_track_snapshots WHERE time_range = ?", (time_range,))
+        for track_id, taken_on, rank in rows:
+            ranks.setdefault(track_id, {})[taken_on] = rank
+        track_ids = ranks if track_ids is None else track_ids
+        return {track_id: [(taken_on, ranks.get(track_id, {}).get(taken_on)) for taken_on in dates] for track_id in track_ids}
+
+    def get_rank_changes(self, time_range="medium_term"):
+        """
+        How the latest snapshot of time_range differs from the one before it.
+
+        Returns:
+            List of dicts (id, name, artist, rank, previous_rank) in current rank order, followed by
+            the tracks that dropped out (rank None); previous_rank is None for new entries and for
+            every track when there is only one snapshot
+        """
+        dates = self.get_top_snapshot_dates(time_range)
+        if not dates:
+            return []
+        previous = {track_id: (rank, name, artist) for track_id, rank, name, artist in
+                    (self._snapshot_rows(time_range, dates[-2]) if len(dates) > 1 else [])}
+        changes = []
+        for track_id, rank, name, artist in self._snapshot_rows(time_range, dates[-1]):
+            previous_rank = previous.pop(track_id, (None,))[0]
+            changes.append({"id": track_id, "name": name, "artist": artist, "rank": rank, "previous_rank": previous_rank})
+        for track_id, (previous_rank, name, artist) in sorted(previous.items(), key=lambda entry: entry[1][0]):
+            changes.append({"id": track_id, "name": name, "artist": artist, "rank": None, "previous_rank": previous_rank})
+        return changes
+
+    def get_albums(self, album_ids):
+        albums = []
+        for album_id in album_ids:
+            row = self.conn.execute(
+                "SELECT name, release_date, total_tracks, popularity FROM albums WHERE id = ?", (album_id,)
+            ).fetchone()
+            if row:
+                name, release_date, total_tracks, popularity = row
+                albums.append({
+                    "id": album_id,
+                    "name": name,
+                    "release_date": release_date,
+                    "total_tracks": total_tracks or 0,
+                    "popularity": popularity or 0
+                })
+        return albums
+
+    def get_artists(self, artist_ids):
+        artists = []
+        for artist_id in artist_ids:
+            row = self.conn.execute(
+                "SELECT name, popularity, followers, genres FROM artists WHERE id = ?", (artist_id,)
+            ).fetchone()
+            if row:
+                name, popularity, followers, genres = row
+                artists.append({
+                    "id": artist_id,
+                    "name": name,
+                    "popularity": popularity or 0,
+                    "followers": {"total": followers or 0},
+                    "genres": json.loads(genres) if genres else []
+                })
+        return artists
+
+    def get_artist_genres(self):
+        """Genres of every enriched artist as a dict of artist ID -> tuple of genres, read in one query."""
+        artist_genres = {}
+        for artist_id, genre in self.conn.execute("SELECT artist_id, genre FROM artist_genres ORDER BY artist_id, genre"):
+            artist_genres.setdefault(artist_id, []).append(genre)
+        return {artist_id: tuple(genres) for artist_id, genres in artist_genres.items()}
+
+    def artists_with_genres(self, genre):
+        """IDs of the artists tagged with genre."""
+        return [artist_id for (artist_id,) in self.conn.execute(
+            "SELECT artist_id FROM artist_genres WHERE genre = ? ORDER BY artist_id", (genre,)
+        )]
+
+
+def sync_library(api, store):
+    """Fetch playlists, saved songs, top songs, saved-song album details and every artist's details into the store."""
+    mark("fetch")
+    print("Fetching playlists...")
+    playlists = api.get_playlists()
+    print(f"Found {len(playlists)} playlists.")
+    if api.playlist_cache:
+        api.playlist_cache.evict_missing(playlist["id"] for playlist in playlists)
+    playlists_data = api.get_playlists_data(
+        [playlist["id"] for playlist in playlists],
+        [playlist["snapshot_id"] for playlist in playlists],
+        LIBRARY_ITEM_FIELDS
+    )
+
+    print("Fetching saved songs...")
+    saved_songs = api.get_saved_songs()
+    print(f"Found {len(saved_songs)} saved songs.")
+
+    print("Fetching top songs (all time ranges)...")
+    top_songs = api.get_top_songs_by_range(TIME_RANGES)
+
+    album_ids, artist_ids = detail_ids(saved_songs, playlists_data, top_songs)
+    print(f"Fetching details for {len(album_ids)} albums and {len(artist_ids)} artists...")
+    albums = api.get_albums(album_ids)
+    artists = api.get_artists(artist_ids)
+
+    _count_fetched(playlists_data, saved_songs, top_songs, albums, artists)
+    mark("write")
+    store.replace(playlists, playlists_data, saved_songs, top_songs, albums, artists)
+
+
+async def fetch_library_async(api):
+    """
+    Fetch playlists (with their tracks), saved songs and all three top song ranges at the same time
+    with an open AsyncSpotifyWebApi, so the fetch takes about as long as the slowest of them.
+
+    Returns:
+        (playlists, playlists_data, saved_songs, top_songs by time range)
+    """
+    async def fetch_playlists():
+        playlists = await api.get_playlists()
+        if api.playlist_cache:
+            api.playlist_cache.evict_missing(playlist["id"] for playlist in playlists)
+        playlists_data = await api.get_playlists_data(
+            [playlist["id"] for playlist in playlists],
+            [playlist["snapshot_id"] for playlist in playlists],
+            LIBRARY_ITEM_FIELDS
+        )
+        return playlists, playlists_data
+
+    (playlists, playlists_data), saved_songs, top_songs = await asyncio.gather(
+        fetch_playlists(),
+        api.get_saved_songs(),
+        api.get_top_songs_by_range(TIME_RANGES)
+    )
+    return playlists, playlists_data, saved_songs, top_songs
+
+
+async def sync_library_async(api, store):
+    """
+    Same as sync_library with an AsyncSpotifyWebApi, fetching with fetch_library_async and then
+    album and artist details concurrently. Closes the async client when done.
+    """
+    mark("fetch")
+    async with api:
+        print("Fetching playlists, saved songs and top songs...")
+        playlists, playlists_data, saved_songs, top_songs = await fetch_library_async(api)
+        print(f"Found {len(playlists)} playlists and {len(saved_songs)} saved songs.")
+
+        album_ids, artist_ids = detail_ids(saved_songs, playlists_data, top_songs)
+        print(f"Fetching details for {len(album_ids)} albums and {len(artist_ids)} artists...")
+        albums, artists = await asyncio.gather(api.get_albums(album_ids), api.get_artists(artist_ids))
+
+    _count_fetched(playlists_data, saved_songs, top_songs, albums, artists)
+    mark("write")
+    store.replace(playlists, playlists_data, saved_songs, top_songs, albums, artists)
+
+
+def _count_fetched(playlists_data, saved_songs, top_songs, albums, artists):
+    count("playlists", len(playlists_data))
+    count("playlist items", sum(len(playlist_data["tracks"]["items"]) for playlist_data in playlists_data))
+    count("saved songs", len(saved_songs))
+    count("top songs", sum(len(tracks) for tracks in top_songs.values()))
+    count("albums", len(albums))
+    count("artists", len(artists))
+
+
+def detail_ids(saved_songs, playlists_data, top_songs):
+    """
+    IDs whose details are synced: albums of saved songs (track counts, popularity) and every artist
+    on any saved, playlist or top song (genres, popularity, followers), each listed once.
+    """
+    album_ids, artist_ids = {}, {}
+    tracks = [item.get("track") for item in saved_songs]
+    for track in tracks:
+        if ((track or {}).get("album") or {}).get("id"):
+            album_ids[track["album"]["id"]] = True
+    tracks += [item.get("track") for playlist_data in playlists_data for item in playlist_data["tracks"]["items"]]
+    tracks += [track for range_tracks in top_songs.values() for track in range_tracks]
+    for track in tracks:
+        for artist in (track or {}).get("artists") or []:
+            if artist.get("id"):
+                artist_ids[artist["id"]] = True
+    return list(album_ids), list(artist_ids)
+
+
+def create_sync_api(file_path, metadata_cache=None, playlist_filter=None, scheduler=None):
+    """
+    Authorize a SpotifyWebApi with the full sync scope and the on-disk playlist/saved songs caches.
+
+    Tokens are stored under file_path/cache, so only the first run (or one after the refresh token
+    is revoked) asks for an authorization code. Album and artist details are cached in
+    file_path/cache/metadata.db unless a metadata_cache is passed in (batch-reports.py shares one
+    between users, along with one scheduler so they share the app's request budget);
+    playlist_filter defaults to PLAYLIST_OWNERS / EXCLUDED_PLAYLISTS.
+    """
+    api = SpotifyWebApi(
+        scope=SYNC_SCOPE,
+        playlist_cache=PlaylistCache(os.path.join(file_path, "cache", "playlists")),
+        saved_songs_store=SavedSongsStore(os.path.join(file_path, "cache", "saved-songs.json")),
+        token_manager=create_token_manager(file_path),
+        metadata_cache=metadata_cache or MetadataCache(os.path.join(file_path, "cache", "metadata.db")),
+        playlist_filter=playlist_filter,
+        scheduler=scheduler
+    )
+    api.authorize()
+    return api
+
+
+def open_library(file_path, max_age_hours=24):
+    """Open the library store under file_path if it was synced within max_age_hours, otherwise None (never syncs)."""
+    db_path = os.path.join(file_path, "library.db")
+    if not os.path.exists(db_path):
+        return None
+    store = LibraryStore(db_path)
+    last_synced = store.last_synced()
+    if last_synced is None or datetime.now() - last_synced > timedelta(hours=max_age_hours):
+        store.close()
+        return None
+    return store
+
+
+def load_library(file_path, max_age_hours=24):
+    """Open the library store under file_path, syncing it first if it is missing or older than max_age_hours."""
+    store = LibraryStore(os.path.join(file_path, "library.db"))
+    last_synced = store.last_synced()
+    if last_synced is None or datetime.now() - last_synced > timedelta(hours=max_age_hours):
+        print("Library store is missing or stale, syncing...")
+        api = create_sync_api(file_path)
+        asyncio.run(sync_library_async(AsyncSpotifyWebApi.from_api(api), store))
+        api.close()
+    else:
+        print(f"Using library store synced at {last_synced:%m/%d/%Y %H:%M}")
+    return store
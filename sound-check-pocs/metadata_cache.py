@@ -0,0 +1,78 @@
+import os
+import sqlite3
+import time
+from json_codec import dumps, loads
+
+# Album track counts and release dates almost never change; artist popularity and followers drift
+DEFAULT_TTLS = {"album": 30 * 24 * 3600, "artist": 7 * 24 * 3600}
+
+
+class MetadataCache:
+    """
+    SQLite cache of album and artist objects with a time-to-live per entity kind.
+
+    get_many splits the requested IDs into cached objects still within their TTL and IDs that
+    have to be fetched (never seen or stale). Album objects are stored without their embedded
+    track page, which is most of their size and which nothing here reads.
+    """
+
+    def __init__(self, db_path, ttls=None):
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.db_path = db_path
+        self.ttls = dict(DEFAULT_TTLS, **(ttls or {}))
+        self.conn = sqlite3.connect(db_path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS entities ("
+            "kind TEXT, id TEXT, fetched_at REAL, data TEXT, PRIMARY KEY (kind, id))"
+        )
+        self.stats = {"hits": 0, "misses": 0, "stale": 0}
+
+    def close(self):
+        self.conn.close()
+
+    def get_many(self, kind, ids):
+        """
+        Args:
+            kind: "album" or "artist"
+            ids: Spotify IDs to look up
+
+        Returns:
+            (dict of ID -> cached object for fresh entries, list of IDs to fetch in request order)
+        """
+        ids = list(dict.fromkeys(ids))
+        cutoff = time.time() - self.ttls[kind]
+        found, stale = {}, set()
+        # SQLite caps bound parameters per statement, so look IDs up in chunks
+        for i in range(0, len(ids), 500):
+            chunk = ids[i:i + 500]
+            rows = self.conn.execute(
+                f"SELECT id, fetched_at, data FROM entities WHERE kind = ? AND id IN ({','.join('?' * len(chunk))})",
+                [kind, *chunk]
+            )
+            for entity_id, fetched_at, data in rows:
+                if fetched_at >= cutoff:
+                    found[entity_id] = loads(data)
+                else:
+                    stale.add(entity_id)
+        missing = [entity_id for entity_id in ids if entity_id not in found]
+        self.stats["hits"] += len(found)
+        self.stats["stale"] += len(stale)
+        self.stats["misses"] += len(missing) - len(stale)
+        return found, missing
+
+    def put_many(self, kind, entities):
+        """Store fetched objects (None entries, which the API returns for unknown IDs, are skipped)."""
+        now = time.time()
+        rows = []
+        for entity in entities:
+            if entity and entity.get("id"):
+                if kind == "album":
+                    entity = {key: value for key, value in entity.items() if key != "tracks"}
+                rows.append((kind, entity["id"], now, dumps(entity).decode('utf-8')))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO entities VALUES (?, ?, ?, ?)", rows)
+
+    def summary(self):
+        return f"{self.stats['hits']} hits, {self.stats['stale']} stale, {self.stats['misses']} misses"
@@ -0,0 +1,71 @@
+import os
+from json_codec import dumps, loads
+
+
+class PlaylistCache:
+    """
+    Disk cache of full playlist objects keyed on playlist ID + snapshot_id.
+
+    Spotify changes a playlist's snapshot_id every time its tracks change, so a cached entry is
+    only served while the snapshot it was stored with is still current, and only to callers asking
+    for the same item_fields projection it was fetched with.
+    """
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+        self.stats = {"hits": 0, "misses": 0, "bytes_read": 0, "bytes_written": 0, "evictions": 0}
+
+    def _path(self, playlist_id):
+        return os.path.join(self.cache_dir, f"{playlist_id}.json")
+
+    def get(self, playlist_id, snapshot_id, item_fields=None):
+        """Return the cached playlist object if it was stored with snapshot_id and item_fields, otherwise None."""
+        path = self._path(playlist_id)
+        if snapshot_id and os.path.exists(path):
+            with open(path, 'rb') as f:
+                raw = f.read()
+            entry = loads(raw)
+            if entry.get("snapshot_id") == snapshot_id and entry.get("item_fields") == item_fields:
+                self.stats["hits"] += 1
+                self.stats["bytes_read"] += len(raw)
+                return entry["playlist"]
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, playlist_data, item_fields=None):
+        """Store a full playlist object (or its item_fields projection) under its ID and snapshot_id."""
+        snapshot_id = playlist_data.get("snapshot_id")
+        if not snapshot_id:
+            return
+        raw = dumps({"snapshot_id": snapshot_id, "item_fields": item_fields, "playlist": playlist_data})
+        path = self._path(playlist_data["id"])
+        # Write to a temp file first so an interrupted run never leaves a truncated entry
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(raw)
+        os.replace(tmp_path, path)
+        self.stats["bytes_written"] += len(raw)
+
+    def evict_missing(self, playlist_ids):
+        """Remove cached playlists that are no longer in playlist_ids (deleted or unfollowed)."""
+        active_ids = set(playlist_ids)
+        for file_name in os.listdir(self.cache_dir):
+            playlist_id, ext = os.path.splitext(file_name)
+            if ext == ".json" and playlist_id not in active_ids:
+                os.remove(os.path.join(self.cache_dir, file_name))
+                self.stats["evictions"] += 1
+
+    def size_bytes(self):
+        return sum(
+            os.path.getsize(os.path.join(self.cache_dir, file_name))
+            for file_name in os.listdir(self.cache_dir)
+            if file_name.endswith(".json")
+        )
+
+    def summary(self):
+        return (
+            f"{self.stats['hits']} hits, {self.stats['misses']} misses, "
+            f"{self.stats['bytes_read']:,} bytes read, {self.stats['bytes_written']:,} bytes written, "
+            f"{self.stats['evictions']} evicted, {self.size_bytes():,} bytes on disk"
+        )
@@ -0,0 +1,104 @@
+import numpy as np
+from scipy import sparse
+
+
+class PlaylistOverlap:
+    """
+    Pairwise playlist overlaps from a sparse playlist x track incidence matrix.
+
+    Row i is playlist title i and column j is track j; an entry is 1 when the track is in the
+    playlist (repeats within a playlist count once). Shared-song counts for every pair come
+    from one sparse product A @ A.T, which only stores pairs that actually share a song, so
+    nothing is enumerated per song however many playlists it sits in.
+    """
+
+    def __init__(self, playlists, tracks, incidence):
+        self.playlists = playlists
+        self.tracks = tracks
+        self.incidence = incidence.tocsr()
+        self.incidence.sort_indices()
+        self.sizes = np.diff(self.incidence.indptr)
+        self._playlist_codes = {title: i for i, title in enumerate(playlists)}
+        self._pairs = None
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Build from (playlist title, Track) rows; playlists sharing a title are merged, as in poc1."""
+        playlists, tracks = [], []
+        playlist_codes, track_codes = {}, {}
+        row_codes, col_codes = [], []
+        for title, track in rows:
+            if not track or not track.id:
+                continue
+            row = playlist_codes.get(title)
+            if row is None:
+                row = playlist_codes[title] = len(playlists)
+                playlists.append(title)
+            col = track_codes.get(track.id)
+            if col is None:
+                col = track_codes[track.id] = len(tracks)
+                tracks.append(track)
+            row_codes.append(row)
+            col_codes.append(col)
+
+        incidence = sparse.coo_matrix(
+            (np.ones(len(row_codes), dtype=np.int32), (row_codes, col_codes)),
+            shape=(len(playlists), len(tracks))
+        ).tocsr()
+        # Duplicate (playlist, track) entries were summed by tocsr; membership is binary
+        incidence.data[:] = 1
+        return cls(playlists, tracks, incidence)
+
+    def overlap_counts(self):
+        """Upper-triangular COO matrix of shared-song counts for every overlapping playlist pair."""
+        if self._pairs is None:
+            product = self.incidence @ self.incidence.T
+            self._pairs = sparse.triu(product, k=1, format="coo")
+        return self._pairs
+
+    def _scores(self, rows, cols, counts, metric):
+        if metric == "count":
+            return counts.astype(np.float64)
+        if metric == "jaccard":
+            return counts / (self.sizes[rows] + self.sizes[cols] - counts)
+        if metric == "containment":
+            return counts / np.minimum(self.sizes[rows], self.sizes[cols])
+        raise ValueError(f"Unknown overlap metric: {metric}")
+
+    def pairs(self, min_overlap=1, metric="count", top_k=None):
+        """
+        Playlist pairs sharing at least min_overlap songs, best first.
+
+        Args:
+            min_overlap: Minimum number of shared songs for a pair to be returned
+            metric: "count", "jaccard" (shared / union) or "containment" (shared / smaller playlist)
+            top_k: Only return the k best pairs; selected with a partition over the sparse data
+
+        Returns:
+            List of (playlist1, playlist2, shared count, score) ordered by score descending,
+            then by playlist titles
+        """
+        pairs = self.overlap_counts()
+        keep = pairs.data >= min_overlap
+        rows, cols, counts = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+        scores = self._scores(rows, cols, counts, metric)
+
+        if top_k is not None and top_k < len(scores):
+            # Take every pair tied with the k-th score so the title tie-break stays stable
+            kth = np.partition(scores, len(scores) - top_k)[len(scores) - top_k]
+            candidates = np.flatnonzero(scores >= kth)
+        else:
+            candidates = np.arange(len(scores))
+
+        result = []
+        for i in candidates:
+            first, second = sorted((self.playlists[rows[i]], self.playlists[cols[i]]))
+            result.append((first, second, int(counts[i]), float(scores[i])))
+        result.sort(key=lambda pair: (-pair[3], pair[0], pair[1]))
+        return result[:top_k] if top_k is not None else result
+
+    def shared_tracks(self, playlist1, playlist2):
+        """Tracks in both playlists (by title), in first-seen order."""
+        first = self.incidence[self._playlist_codes[playlist1]].indices
+        second = self.incidence[self._playlist_codes[playlist2]].indices
+        return [self.tracks[j] for j in np.intersect1d(first, second, assume_unique=True)]
@@ -0,0 +1,34 @@
+import numpy as np
+
+
+def added_at_dates(items):
+    """Parse TrackItem added_at timestamps into a datetime64[D] array (NaT when missing)."""
+    return np.array([item.added_at[:10] if item.added_at else "NaT" for item in items], dtype="datetime64[D]")
+
+
+def bucket_fractions(playlist_items, edges):
+    """
+    Fraction of each playlist's songs added in each date bucket, for the whole library in one pass.
+
+    Bucket i holds songs added on a date d with edges[i] < d <= edges[i + 1], the same half-open
+    comparison calcPlaylistSongsAddedInRangePercentage used on the YYYY-MM-DD strings. Songs
+    outside every bucket only count toward the playlist's total.
+
+    Args:
+        playlist_items: List of TrackItem lists, one per playlist
+        edges: Ascending bucket edges (YYYY-MM-DD strings, dates or datetime64)
+
+    Returns:
+        Array of shape (len(playlist_items), len(edges) - 1); rows for empty playlists are all 0
+    """
+    edges = np.asarray(edges, dtype="datetime64[D]")
+    num_buckets = len(edges) + 1
+    sizes = np.array([len(items) for items in playlist_items], dtype=np.int64)
+    dates = added_at_dates([item for items in playlist_items for item in items])
+    playlist_codes = np.repeat(np.arange(len(playlist_items)), sizes)
+
+    # searchsorted 'left' gives the index with edges[idx - 1] < d <= edges[idx]; NaT sorts past the end
+    bucket_codes = np.searchsorted(edges, dates, side="left")
+    counts = np.bincount(playlist_codes * num_buckets + bucket_codes, minlength=len(playlist_items) * num_buckets)
+    counts = counts.reshape(len(playlist_items), num_buckets)[:, 1:len(edges)]
+    return np.divide(counts, sizes[:, None], out=np.zeros(counts.shape), where=sizes[:, None] > 0)
@@ -7,7 +7,12 @@ import time
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
-from spotify_web_api import SpotifyWebApi
+from library_store import load_library
+from frequency_engine import FrequencyEngine
+from playlist_stats import bucket_fractions
+from report_records import playlist_counts, write_records
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
 
 load_dotenv()
 filePath = os.getenv("FILE_PATH")
@@ -21,33 +26,17 @@ class PlaylistStats:
         self.recent = recent
         self.somewhat_recent = somewhat_recent
 
-# Calculate percentage of songs added in a date range
-def calcPlaylistSongsAddedInRangePercentage(playlist, startDate, endDate):
-    playlistSongs = playlist["tracks"]["items"]
-    outdated = 0
-    for i in range(len(playlistSongs)):
-        dateAdded = playlistSongs[i]["added_at"]
-        if startDate < dateAdded[:10] and dateAdded[:10] <= endDate:
-            outdated += 1
-    percentage = outdated / len(playlistSongs) if len(playlistSongs) > 0 else 0
-    return percentage
-
 def main():
+    start_run()
     start_time = time.time()
     
-    # Initialize Spotify API
-    scope = "playlist-read-private playlist-read-collaborative"
-    api = SpotifyWebApi(scope=scope)
-    code_verifier = api.generate_code_verifier()
-    code_challenge = api.generate_code_challenge(code_verifier)
-    authorization_url = api.get_authorization_url(code_challenge)
-    print("Go to this URL and authorize the app:\n", authorization_url)
-    authorization_code = input("Enter the code from the redirect URL: ").strip()
-    api.get_token_pkce(authorization_code, code_verifier)
+    mark("parse")
+    # Read from the local library store (synced at most once a day)
+    library = load_library(filePath)
 
     # Fetch playlists
     print("Fetching playlists...")
-    playlists = api.get_playlists()
+    playlists = library.get_playlists()
     print(f"Found {len(playlists)} playlists.")
     
     playlistStats = []
@@ -62,84 +51,36 @@ def main():
     # Human-friendly generated date for output files
     current_date = today.strftime("%m/%d/%Y")
 
-    # Data structures for frequency analysis
-    song_freq = {}
-    artist_freq = {}
-    album_freq = {}
+    # Song, artist and album counts (with per-playlist breakdowns) in one pass
+    frequencies = FrequencyEngine()
 
     # Calculate stats for each playlist based on songs
+    print("Fetching playlist tracks...")
+    playlist_items = library.get_playlist_items([playlist["id"] for playlist in playlists])
+    library.close()
+
+    mark("aggregate")
+    # Fraction of each playlist added in (2000, >2 years], (2 years, 6 months], (6 months, today]
+    freshness = bucket_fractions(
+        playlist_items,
+        ["2000-01-01", twoYearsAgoFormatted, sixMonthsAgoFormatted, todayFormatted]
+    )
+
     print("Processing playlists...")
-    for playlist in playlists:
+    for playlist, items, (outdated, somewhatRecent, recent) in zip(playlists, playlist_items, freshness.tolist()):
         title = playlist['name']
         tracks = playlist['tracks']['total']
         print(f"Processing: {title}, Tracks: {tracks}")
-        playlist_id = playlist["id"]
-
-        # Fetch full playlist data
-        playlist_data = api.get_playlist(playlist_id)
 
         # Calculate percentages for basic stats
-        outdatedPercentage = (round(calcPlaylistSongsAddedInRangePercentage(playlist_data, "2000-01-01", twoYearsAgoFormatted), 4)) * 100
-        recentPercentage = (round(calcPlaylistSongsAddedInRangePercentage(playlist_data, sixMonthsAgoFormatted, todayFormatted), 4)) * 100
-        somewhatRecentPercentage = (round(calcPlaylistSongsAddedInRangePercentage(playlist_data, twoYearsAgoFormatted, sixMonthsAgoFormatted), 4)) * 100
+        outdatedPercentage = (round(outdated, 4)) * 100
+        recentPercentage = (round(recent, 4)) * 100
+        somewhatRecentPercentage = (round(somewhatRecent, 4)) * 100
         playlistStats.append(PlaylistStats(title, tracks, outdatedPercentage, recentPercentage, somewhatRecentPercentage))
 
         # Process songs for frequency analysis
-        for item in playlist_data["tracks"]["items"]:
-            track = item.get("track")
-            if not track or not track.get("id"):
-                continue
-            
-            # Song frequency
-            song_id = track["id"]
-            song_name = track["name"]
-            artist_name = track["artists"][0]["name"] if track["artists"] else "Unknown"
-            artist_id = track["artists"][0]["id"] if track["artists"] else "Unknown"
-            album_name = track["album"]["name"] if track.get("album") else "Unknown"
-            album_id = track["album"]["id"] if track.get("album") else "Unknown"
-            
-            if song_id in song_freq:
-                song_freq[song_id]["count"] += 1
-                song_freq[song_id]["playlists"].add(title)
-            else:
-                song_freq[song_id] = {
-                    "count": 1,
-                    "name": song_name,
-                    "artist": artist_name,
-                    "id": song_id,
-                    "playlists": set([title])
-                }
-            
-            # Artist frequency (by artist ID)
-            artist_key = (artist_id, artist_name)
-            if artist_key in artist_freq:
-                artist_freq[artist_key]["count"] += 1
-                if title not in artist_freq[artist_key]["playlists"]:
-                    artist_freq[artist_key]["playlists"][title] = 0
-                artist_freq[artist_key]["playlists"][title] += 1
-            else:
-                artist_freq[artist_key] = {
-                    "count": 1,
-                    "id": artist_id,
-                    "name": artist_name,
-                    "playlists": {title: 1}
-                }
-            
-            # Album frequency (by album ID)
-            album_key = (album_id, album_name)
-            if album_key in album_freq:
-                album_freq[album_key]["count"] += 1
-                if title not in album_freq[album_key]["playlists"]:
-                    album_freq[album_key]["playlists"][title] = 0
-                album_freq[album_key]["playlists"][title] += 1
-            else:
-                album_freq[album_key] = {
-                    "count": 1,
-                    "id": album_id,
-                    "name": album_name,
-                    "artist": artist_name,
-                    "playlists": {title: 1}
-                }
+        for item in items:
+            frequencies.add(item.track, title)
 
     # Write basic playlist stats
     print("Writing basic playlist stats...")
@@ -148,6 +89,7 @@ def main():
     sortedByRecent = sorted(playlistStats, key=lambda playlist: playlist.recent, reverse=True)
     sortedBySomewhatRecent = sorted(playlistStats, key=lambda playlist: playlist.somewhat_recent, reverse=True)
 
+    mark("write")
     with open(filePath + 'playlist-songs/basicPlaylistStats.txt', 'w') as file:
         file.write(f"Generated on {current_date}\n")
         file.write("Playlists Ordered by # of Tracks:\n")
@@ -168,36 +110,48 @@ def main():
 
     # Write most frequent songs
     print("Writing most frequent songs...")
-    song_freq_list = list(song_freq.values())
+    mark("aggregate")
+    song_freq_list = frequencies.song_rows()
     song_freq_list.sort(key=lambda x: (-x["count"], x["name"]))
 
-    with open(filePath + 'playlist-songs/mostFrequentPlaylistSongs.txt', 'w') as file:
+    mark("write")
+    report_path = filePath + 'playlist-songs/mostFrequentPlaylistSongs.txt'
+    with open(report_path, 'w') as file:
         file.write(f"Generated on {current_date}\n")
         for entry in song_freq_list:
             playlists_str = ", ".join(sorted(entry["playlists"]))
             file.write(f"{entry['count']}: {entry['name']} | {entry['artist']} | {entry['id']} | Playlists: {playlists_str}\n")
+    write_records(report_path, [dict(entry, playlists=playlist_counts(entry["playlists"])) for entry in song_freq_list])
 
     # Write most frequent artists
     print("Writing most frequent artists...")
-    artist_freq_list = list(artist_freq.values())
+    mark("aggregate")
+    artist_freq_list = frequencies.artist_rows()
     artist_freq_list.sort(key=lambda x: (-x["count"], x["name"]))
 
-    with open(filePath + 'playlist-songs/mostFrequentPlaylistSongArtists.txt', 'w') as file:
+    mark("write")
+    report_path = filePath + 'playlist-songs/mostFrequentPlaylistSongArtists.txt'
+    with open(report_path, 'w') as file:
         file.write(f"Generated on {current_date}\n")
         for entry in artist_freq_list:
             playlists_str = ", ".join([f"{name} ({count})" for name, count in sorted(entry["playlists"].items(), key=lambda x: -x[1])])
             file.write(f"{entry['count']}: {entry['name']} | {entry['id']} | Playlists: {playlists_str}\n")
+    write_records(report_path, [dict(entry, playlists=playlist_counts(entry["playlists"])) for entry in artist_freq_list])
 
     # Write most frequent albums
     print("Writing most frequent albums...")
-    album_freq_list = list(album_freq.values())
+    mark("aggregate")
+    album_freq_list = frequencies.album_rows()
     album_freq_list.sort(key=lambda x: (-x["count"], x["name"]))
 
-    with open(filePath + 'playlist-songs/mostFrequentPlaylistSongAlbums.txt', 'w') as file:
+    mark("write")
+    report_path = filePath + 'playlist-songs/mostFrequentPlaylistSongAlbums.txt'
+    with open(report_path, 'w') as file:
         file.write(f"Generated on {current_date}\n")
         for entry in album_freq_list:
             playlists_str = ", ".join([f"{name} ({count})" for name, count in sorted(entry["playlists"].items(), key=lambda x: -x[1])])
             file.write(f"{entry['count']}: {entry['name']} | {entry['artist']} | {entry['id']} | Playlists: {playlists_str}\n")
+    write_records(report_path, [dict(entry, playlists=playlist_counts(entry["playlists"])) for entry in album_freq_list])
 
     end_time = time.time()
     total_time = end_time - start_time
@@ -206,6 +160,7 @@ def main():
     print(f"Wrote {len(artist_freq_list)} unique artists to mostFrequentPlaylistSongArtists.txt")
     print(f"Wrote {len(album_freq_list)} unique albums to mostFrequentPlaylistSongAlbums.txt")
     print(f"Total time: {total_time:.2f} seconds")
+    print(f"Run summary: {write_run_summary(filePath + 'playlist-songs', __file__)}")
 
 if __name__ == "__main__":
     main()
@@ -6,11 +6,18 @@ import os
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from spotify_web_api import SpotifyWebApi
+from frequency_engine import UNKNOWN, FrequencyEngine
+from library_store import load_library
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
 
 load_dotenv()
 filePath = os.getenv("FILE_PATH")
-scope = "user-library-read"
+
+# Minimum saved songs for an album/artist to get the extended (full details) analysis. Details for
+# every saved album and artist are synced into the library store, so these can go as low as 1.
+ALBUM_DETAILS_MIN_SAVED = 3
+ARTIST_DETAILS_MIN_SAVED = 5
 
 def format_duration_short(ms):
     """Convert milliseconds to MM:SS.### format"""
@@ -26,76 +33,75 @@ def format_duration_long(ms):
     seconds = total_seconds % 60
     return f"{minutes} minutes and {seconds:06.3f} seconds"
 
+def counts_by_id(rows):
+    """
+    Collapse FrequencyEngine rows, which are keyed by (id, name), into one row per ID. An artist or
+    album that shows up under two names sums its counts and keeps the first name seen.
+    """
+    collapsed = {}
+    for row in rows:
+        if row["id"] == UNKNOWN:
+            continue
+        if row["id"] in collapsed:
+            collapsed[row["id"]]["count"] += row["count"]
+        else:
+            collapsed[row["id"]] = dict(row)
+    return collapsed
+
 def main():
+    start_run()
     start_time = time.time()
     
-    api = SpotifyWebApi(scope=scope)
-    code_verifier = api.generate_code_verifier()
-    code_challenge = api.generate_code_challenge(code_verifier)
-    authorization_url = api.get_authorization_url(code_challenge)
-    print("Go to this URL and authorize the app:\n", authorization_url)
-    authorization_code = input("Enter the code from the redirect URL: ").strip()
-    api.get_token_pkce(authorization_code, code_verifier)
+    mark("parse")
+    # Read from the local library store (synced at most once a day)
+    library = load_library(filePath)
 
     print("Fetching saved songs...")
-    saved_songs = api.get_saved_songs()
+    saved_songs = library.get_saved_items()
     print(f"Found {len(saved_songs)} saved songs.")
 
     # Human-friendly generated date for output files
     current_date = datetime.now().strftime("%m/%d/%Y")
 
     # Data structures for analysis
-    artist_freq = {}
-    album_freq = {}
+    frequencies = FrequencyEngine()
     songs_list = []
     seen_songs = {}
     duplicates = []
 
+    mark("aggregate")
     # Process all saved songs
     print("Processing saved songs...")
     for song in saved_songs:
-        track = song.get("track")
+        track = song.track
         if not track:
             continue
         
-        track_id = track.get("id")
-        track_name = track.get("name", "Unknown")
-        popularity = track.get("popularity", 0)
-        duration_ms = track.get("duration_ms", 0)
-        artists = track.get("artists", [])
-        album = track.get("album", {})
+        track_id = track.id
+        track_name = track.name or "Unknown"
+        popularity = track.popularity or 0
+        duration_ms = track.duration_ms or 0
         
         # Get first artist info
-        if artists and artists[0].get("id"):
-            artist_id = artists[0]["id"]
-            artist_name = artists[0].get("name", "Unknown")
+        if track.artist_id:
+            artist_id = track.artist_id
+            artist_name = track.artist_name or "Unknown"
         else:
             artist_id = None
             artist_name = "Unknown"
         
         # Get album info
-        if album and album.get("id"):
-            album_id = album["id"]
-            album_name = album.get("name", "Unknown")
-            release_date = album.get("release_date", "Unknown")
+        if track.album_id:
+            album_id = track.album_id
+            album_name = track.album_name or "Unknown"
+            release_date = track.release_date or "Unknown"
         else:
             album_id = None
             album_name = "Unknown"
             release_date = "Unknown"
         
-        # Track artist frequency
-        if artist_id:
-            if artist_id in artist_freq:
-                artist_freq[artist_id]["count"] += 1
-            else:
-                artist_freq[artist_id] = {"name": artist_name, "count": 1}
-        
-        # Track album frequency
-        if album_id:
-            if album_id in album_freq:
-                album_freq[album_id]["count"] += 1
-            else:
-                album_freq[album_id] = {"name": album_name, "album_artist": artist_name, "count": 1}
+        # Track artist and album frequency
+        frequencies.add(track)
         
         # Track songs for popularity and duration analysis
         songs_list.append({
@@ -132,6 +138,10 @@ def main():
                     "duplicate_type": "Artist+Name"
                 })
     
+    artist_freq = counts_by_id(frequencies.artist_rows())
+    album_freq = counts_by_id(frequencies.album_rows())
+
+    mark("write")
     # Ensure output directories exist in saved-data
     base_output_dir = os.path.join(filePath, 'saved-data')
     os.makedirs(os.path.join(base_output_dir, 'songs'), exist_ok=True)
@@ -150,7 +160,7 @@ def main():
 
     # Write most frequent albums
     print("Writing most frequent albums in saved data...")
-    album_list = [(album_id, v["name"], v["album_artist"], v["count"]) for album_id, v in album_freq.items()]
+    album_list = [(album_id, v["name"], v["artist"], v["count"]) for album_id, v in album_freq.items()]
     sorted_albums = sorted(album_list, key=lambda x: (-x[3], x[1]))
     
     with open(os.path.join(base_output_dir, 'albums', 'mostFrequentAlbumsInSavedSongs.txt'), 'w') as file:
@@ -196,12 +206,13 @@ def main():
         else:
             file.write("No duplicates found.\n")
 
-    # Extended album analysis for albums with 3+ saved tracks
-    print("Fetching full album details for albums with >=3 saved songs...")
-    high_freq_album_ids = [album_id for album_id, v in album_freq.items() if v["count"] >= 3]
+    mark("aggregate")
+    # Extended album analysis for albums with ALBUM_DETAILS_MIN_SAVED+ saved tracks
+    print(f"Fetching full album details for albums with >={ALBUM_DETAILS_MIN_SAVED} saved songs...")
+    high_freq_album_ids = [album_id for album_id, v in album_freq.items() if v["count"] >= ALBUM_DETAILS_MIN_SAVED]
     album_stats = []
     if high_freq_album_ids:
-        album_details = api.get_albums(high_freq_album_ids)
+        album_details = library.get_albums(high_freq_album_ids)
         album_map = {a.get('id'): a for a in album_details if a and a.get('id')}
 
         def parse_release_date(date_str):
@@ -215,7 +226,7 @@ def main():
         for album_id in high_freq_album_ids:
             saved_count = album_freq[album_id]["count"]
             album_name = album_freq[album_id]["name"]
-            artist_name = album_freq[album_id].get("album_artist", "Unknown")
+            artist_name = album_freq[album_id]["artist"]
             detail = album_map.get(album_id, {})
             total_tracks = detail.get("total_tracks", 0)
             popularity = detail.get("popularity", 0)
@@ -234,6 +245,7 @@ def main():
                 "release_date_parsed": release_date_parsed
             })
 
+    mark("write")
     # Write saved albums ordered by # of tracks
     print("Writing saved albums ordered by # of tracks...")
     with open(os.path.join(base_output_dir, 'albums', 'savedAlbumsOrderedByTracks.txt'), 'w') as file:
@@ -264,12 +276,13 @@ def main():
             file.write(f"{album['release_date']} | {album['name']} | {album['artist_name']} | {album['id']}\n")
 
 
-    # Extended artist analysis for artists with 5+ saved songs
-    print("Fetching full artist details for artists with >=5 saved songs...")
-    high_freq_artist_ids = [artist_id for artist_id, v in artist_freq.items() if v["count"] >= 5]
+    mark("aggregate")
+    # Extended artist analysis for artists with ARTIST_DETAILS_MIN_SAVED+ saved songs
+    print(f"Fetching full artist details for artists with >={ARTIST_DETAILS_MIN_SAVED} saved songs...")
+    high_freq_artist_ids = [artist_id for artist_id, v in artist_freq.items() if v["count"] >= ARTIST_DETAILS_MIN_SAVED]
     artist_stats = []
     if high_freq_artist_ids:
-        artist_details = api.get_artists(high_freq_artist_ids)
+        artist_details = library.get_artists(high_freq_artist_ids)
         artist_map = {a.get('id'): a for a in artist_details if a and a.get('id')}
 
         for artist_id in high_freq_artist_ids:
@@ -288,12 +301,14 @@ def main():
                 "genres": genres
             })
 
+        mark("write")
         # Write saved artists ordered by popularity
         print("Writing saved artists ordered by popularity...")
         with open(os.path.join(base_output_dir, 'artists', 'savedArtistsOrderedByPopularity.txt'), 'w') as file:
             file.write(f"Generated on {current_date}\n")
             for artist in sorted(artist_stats, key=lambda x: (-x["popularity"], -x["followers"])):
                 file.write(f"{artist['popularity']} | {artist['followers']:,} followers | {artist['name']} | {artist['saved_count']} saved | {artist['id']}\n")
+    library.close()
 
     end_time = time.time()
     total_time = end_time - start_time
@@ -301,11 +316,12 @@ def main():
     print(f"\nComplete!")
     print(f"Wrote {len(sorted_by_popularity)} unqiue songs to songs folder")
     print(f"Wrote {len(sorted_albums)} unique albums to albums folder")
-    print(f"Wrote {len(album_stats)} unique saved albums (3+ saved songs) to albums folder")
+    print(f"Wrote {len(album_stats)} unique saved albums ({ALBUM_DETAILS_MIN_SAVED}+ saved songs) to albums folder")
     print(f"Wrote {len(sorted_artists)} unique artists to artists folder")
-    print(f"Wrote {len(high_freq_artist_ids)} unique saved artists (5+ saved songs) to artists folder")
+    print(f"Wrote {len(high_freq_artist_ids)} unique saved artists ({ARTIST_DETAILS_MIN_SAVED}+ saved songs) to artists folder")
     print(f"Wrote {len(duplicates)} duplicates to repeats.txt")
     print(f"Total time: {total_time:.2f} seconds")
+    print(f"Run summary: {write_run_summary(base_output_dir, __file__)}")
 
 if __name__ == "__main__":
     main()
@@ -6,294 +6,182 @@ import os
 import time
 from datetime import datetime
 from dotenv import load_dotenv
-from spotify_web_api import SpotifyWebApi
+from frequency_engine import FrequencyEngine
+from library_store import TIME_RANGES, load_library
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
+from report_records import playlist_counts, write_records
+from track_sets import TrackSets
 
 load_dotenv()
 filePath = os.getenv("FILE_PATH")
 
+def song_name_artist(track):
+    return (track.name or "Unknown", track.artist_name or "Unknown")
+
 def main():
+    start_run()
     start_time = time.time()
     
-    # Initialize Spotify API with all necessary scopes
-    scope = "playlist-read-private playlist-read-collaborative user-library-read user-top-read"
-    
-    api = SpotifyWebApi(scope=scope)
-    code_verifier = api.generate_code_verifier()
-    code_challenge = api.generate_code_challenge(code_verifier)
-    authorization_url = api.get_authorization_url(code_challenge)
-    print("Go to this URL and authorize the app:\n", authorization_url)
-    authorization_code = input("Enter the code from the redirect URL: ").strip()
-    api.get_token_pkce(authorization_code, code_verifier)
+    mark("parse")
+    # Read from the local library store (synced at most once a day)
+    library = load_library(filePath)
     
     # Fetch all data
     print("Fetching playlists...")
-    playlists = api.get_playlists()
+    playlists = library.get_playlists()
     print(f"Found {len(playlists)} playlists.")
     
     print("Fetching saved songs...")
-    saved_songs = api.get_saved_songs()
+    saved_songs = library.get_saved_items()
     print(f"Found {len(saved_songs)} saved songs.")
     
-    print("Fetching top songs (long_term)...")
-    top_songs = api.get_top_songs(time_range="long_term")
+    print("Fetching top songs (all time ranges)...")
+    top_songs_by_range = {time_range: library.get_top_tracks(time_range=time_range) for time_range in TIME_RANGES}
+    # Rank of each track in the previous (different) top songs snapshot, per time range
+    previous_ranks = {
+        time_range: {change["id"]: change["previous_rank"] for change in library.get_rank_changes(time_range)}
+        for time_range in TIME_RANGES
+    }
+    # The intersection reports compare against long-term top songs
+    top_songs = top_songs_by_range["long_term"]
     print(f"Found {len(top_songs)} top songs.")
 
     # Human-friendly generated date for output files
     current_date = datetime.now().strftime("%m/%d/%Y")
     
-    # Process saved songs
-    print("Processing saved songs...")
-    saved_songs_dict = {}  # id -> full info
-    saved_songs_list = []  # for maintaining order
-    saved_songs_name_artist_set = set()  # (name, artist) tuples for matching
-    
-    for song in saved_songs:
-        track = song.get("track")
-        if not track or not track.get("id"):
-            continue
-        track_id = track["id"]
-        song_name = track.get("name", "Unknown")
-        artist_name = track["artists"][0]["name"] if track.get("artists") else "Unknown"
-        
-        saved_songs_dict[track_id] = {
-            "name": song_name,
-            "artist": artist_name,
-            "id": track_id
-        }
-        saved_songs_list.append(track_id)
-        saved_songs_name_artist_set.add((song_name, artist_name))
-    
-    # Process top songs
-    print("Processing top songs...")
-    top_songs_dict = {}  # id -> full info
-    top_songs_list = []  # for maintaining order
-    
-    for track in top_songs:
-        if not track or not track.get("id"):
-            continue
-        track_id = track["id"]
-        song_name = track.get("name", "Unknown")
-        artist_name = track["artists"][0]["name"] if track.get("artists") else "Unknown"
-        
-        top_songs_dict[track_id] = {
-            "name": song_name,
-            "artist": artist_name,
-            "id": track_id
-        }
-        top_songs_list.append(track_id)
-    
-    # Process playlist songs
-    print("Processing playlist songs...")
-    playlist_songs_dict = {}  # id -> {count, name, artist}
-    playlist_song_playlists = {}  # id -> {name -> count}
-    
-    for playlist in playlists:
-        playlist_id = playlist["id"]
-        playlist_name = playlist["name"]
-        playlist_data = api.get_playlist(playlist_id)
-        
-        for item in playlist_data["tracks"]["items"]:
-            track = item.get("track")
-            if not track or not track.get("id"):
-                continue
-            track_id = track["id"]
-            song_name = track.get("name", "Unknown")
-            artist_name = track["artists"][0]["name"] if track.get("artists") else "Unknown"
-            
-            if track_id not in playlist_songs_dict:
-                playlist_songs_dict[track_id] = {
-                    "count": 0,
-                    "name": song_name,
-                    "artist": artist_name,
-                    "id": track_id,
-                    "playlists": {}
-                }
-            
-            playlist_songs_dict[track_id]["count"] += 1
-            if playlist_name not in playlist_songs_dict[track_id]["playlists"]:
-                playlist_songs_dict[track_id]["playlists"][playlist_name] = 0
-            playlist_songs_dict[track_id]["playlists"][playlist_name] += 1
+    # Index saved, top and playlist songs once; each report below is a mask expression
+    print("Processing songs...")
+    frequencies = FrequencyEngine()
+    
+    playlist_items = library.get_playlist_items([playlist["id"] for playlist in playlists])
+    library.close()
+    mark("aggregate")
+    for playlist, items in zip(playlists, playlist_items):
+        for item in items:
+            frequencies.add(item.track, playlist["name"])
+    
+    # id -> {count, name, artist, id, playlists: {name -> count}}
+    playlist_songs_dict = {song["id"]: song for song in frequencies.song_rows()}
+    
+    track_sets = TrackSets({
+        "saved": [song.track for song in saved_songs],
+        "top": top_songs,
+        "playlists": [item.track for items in playlist_items for item in items],
+    })
+    saved = track_sets["saved"]
+    top = track_sets["top"]
+    in_playlists = track_sets["playlists"]
+    
+    # Top songs whose name and artist match a saved song under a different ID
+    saved_name_artist_set = {song_name_artist(track) for track in track_sets.select("saved")}
+    resaved = track_sets.mask_where(lambda track: song_name_artist(track) in saved_name_artist_set)
+    
+    # Typed record for each report line, written next to the text file for later steps to load
+    def song_record(track):
+        name, artist = song_name_artist(track)
+        return {"name": name, "artist": artist, "id": track.id}
+    
+    def playlist_song_record(track):
+        song_info = playlist_songs_dict[track.id]
+        return dict(song_record(track), count=song_info["count"], playlists=playlist_counts(song_info["playlists"]))
     
     # Helper function to format song line
-    def format_song_line(song_info):
-        return f"{song_info['name']} | {song_info['artist']} | {song_info['id']}"
+    def format_song_line(record):
+        return f"{record['name']} | {record['artist']} | {record['id']}"
     
     # Helper function to format playlist song line
-    def format_playlist_song_line(song_info):
-        playlists_str = ", ".join(sorted(song_info["playlists"].keys()))
-        return f"{song_info['count']}: {song_info['name']} | {song_info['artist']} | {song_info['id']} | Playlists: {playlists_str}"
-    
-    # Write savedSongs.txt
-    print("Writing savedSongs.txt...")
-    with open(filePath + 'intersections/savedSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_id in saved_songs_list:
-            if song_id in saved_songs_dict:
-                file.write(format_song_line(saved_songs_dict[song_id]) + "\n")
-    
-    # Write topSongs.txt
-    print("Writing topSongs.txt...")
-    with open(filePath + 'intersections/topSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_id in top_songs_list:
-            if song_id in top_songs_dict:
-                file.write(format_song_line(top_songs_dict[song_id]) + "\n")
-    
-    # Write savedSongsInTopSongs.txt (in order of topSongs)
-    print("Writing savedSongsInTopSongs.txt...")
-    with open(filePath + 'intersections/savedSongsInTopSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_id in top_songs_list:
-            if song_id in saved_songs_dict:
-                file.write(format_song_line(saved_songs_dict[song_id]) + "\n")
-    
-    # Write savedSongsNotInTopSongs.txt (in order of savedSongs)
-    print("Writing savedSongsNotInTopSongs.txt...")
-    with open(filePath + 'intersections/savedSongsNotInTopSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_id in saved_songs_list:
-            if song_id not in top_songs_dict and song_id in saved_songs_dict:
-                file.write(format_song_line(saved_songs_dict[song_id]) + "\n")
-    
-    # Write topSongsNotInSavedSongs.txt (in order of topSongs)
+    def format_playlist_song_line(record):
+        playlists_str = ", ".join(sorted(entry["playlist"] for entry in record["playlists"]))
+        return f"{record['count']}: {format_song_line(record)} | Playlists: {playlists_str}"
+    
+    # Helper function to order playlist songs by frequency in playlists, descending
+    def by_playlist_frequency(tracks):
+        return sorted(tracks, key=lambda track: (-playlist_songs_dict[track.id]["count"], song_name_artist(track)[0]))
+    
+    def write_songs(file_name, tracks, playlist_songs=False):
+        print(f"Writing {file_name}...")
+        records = [playlist_song_record(track) if playlist_songs else song_record(track) for track in tracks]
+        format_line = format_playlist_song_line if playlist_songs else format_song_line
+        report_path = filePath + 'intersections/' + file_name
+        with open(report_path, 'w') as file:
+            file.write(f"Generated on {current_date}\n")
+            for record in records:
+                file.write(format_line(record) + "\n")
+        write_records(report_path, records)
+    
+    saved_songs_list = track_sets.select("saved")
+    top_songs_list = track_sets.select("top")
+    saved_in_top = track_sets.select("top", saved)
+    saved_not_in_top = track_sets.select("saved", ~top)
+    top_not_in_saved = track_sets.select("top", ~saved)
+    saved_in_playlists = by_playlist_frequency(track_sets.select("saved", in_playlists))
+    saved_not_in_playlists = track_sets.select("saved", ~in_playlists)
+    playlist_not_in_saved = by_playlist_frequency(track_sets.select("playlists", ~saved, unique=True))
+    not_in_top_or_playlists = track_sets.select("saved", ~top & ~in_playlists)
+    not_in_top_but_in_playlists = by_playlist_frequency(track_sets.select("saved", ~top & in_playlists))
+    saved_in_top_not_playlists = track_sets.select("top", saved & ~in_playlists)
+    # Unsaved top songs (not saved under another ID either) that are in 2+ playlists
+    add_mask = top & ~saved & ~resaved & (track_sets.counts("playlists") >= 2)
+    add_songs = [track for track in playlist_not_in_saved if add_mask[track_sets.code(track.id)]]
+    
+    # Every track in any time range with its rank in each and the previous snapshot's rank
+    ranked_tracks = {}
+    for time_range in reversed(TIME_RANGES):
+        for rank, track in enumerate(top_songs_by_range[time_range], start=1):
+            ranked_tracks.setdefault(track.id, (track, {}))[1][time_range] = rank
+    rank_records = []
+    for track, ranks in ranked_tracks.values():
+        record = song_record(track)
+        for time_range in TIME_RANGES:
+            record[time_range] = ranks.get(time_range)
+            record[f"previous_{time_range}"] = previous_ranks[time_range].get(track.id)
+        rank_records.append(record)
+    rank_records.sort(key=lambda record: (-sum(record[r] is not None for r in TIME_RANGES),
+                                          sum(record[r] or 0 for r in TIME_RANGES)))
+    
+    mark("write")
+    write_songs('savedSongs.txt', saved_songs_list)
+    write_songs('topSongs.txt', top_songs_list)
+    # In order of topSongs
+    write_songs('savedSongsInTopSongs.txt', saved_in_top)
+    # In order of savedSongs
+    write_songs('savedSongsNotInTopSongs.txt', saved_not_in_top)
+    
+    # (R) marks top songs saved under another ID with the same name and artist
     print("Writing topSongsNotInSavedSongs.txt...")
-    with open(filePath + 'intersections/topSongsNotInSavedSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_id in top_songs_list:
-            if song_id not in saved_songs_dict and song_id in top_songs_dict:
-                song_info = top_songs_dict[song_id]
-                name_artist_match = (song_info["name"], song_info["artist"]) in saved_songs_name_artist_set
-                prefix = "(R) " if name_artist_match else ""
-                file.write(prefix + format_song_line(song_info) + "\n")
-    
-    # Write savedSongsInPlaylists.txt (ordered by frequency in playlists, descending)
-    print("Writing savedSongsInPlaylists.txt...")
-    saved_in_playlists = []
-    for song_id in saved_songs_list:
-        if song_id in playlist_songs_dict and song_id in saved_songs_dict:
-            song_info = playlist_songs_dict[song_id].copy()
-            song_info.update(saved_songs_dict[song_id])
-            saved_in_playlists.append(song_info)
-    
-    saved_in_playlists.sort(key=lambda x: (-x["count"], x["name"]))
-    with open(filePath + 'intersections/savedSongsInPlaylists.txt', 'w') as file:
+    report_path = filePath + 'intersections/topSongsNotInSavedSongs.txt'
+    records = [dict(song_record(track), resaved=bool(resaved[track_sets.code(track.id)])) for track in top_not_in_saved]
+    with open(report_path, 'w') as file:
         file.write(f"Generated on {current_date}\n")
-        for song_info in saved_in_playlists:
-            file.write(format_playlist_song_line(song_info) + "\n")
-    
-    # Write savedSongsNotInPlaylists.txt
-    print("Writing savedSongsNotInPlaylists.txt...")
-    saved_not_in_playlists = []
-    for song_id in saved_songs_list:
-        if song_id not in playlist_songs_dict and song_id in saved_songs_dict:
-            saved_not_in_playlists.append(saved_songs_dict[song_id])
-    
-    with open(filePath + 'intersections/savedSongsNotInPlaylists.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_info in saved_not_in_playlists:
-            file.write(format_song_line(song_info) + "\n")
-    
-    # Write playlistSongsNotInSavedSongs.txt (ordered by frequency, descending)
-    print("Writing playlistSongsNotInSavedSongs.txt...")
-    playlist_not_in_saved = []
-    for song_id, song_info in playlist_songs_dict.items():
-        if song_id not in saved_songs_dict:
-            playlist_not_in_saved.append(song_info)
-    
-    playlist_not_in_saved.sort(key=lambda x: (-x["count"], x["name"]))
-    with open(filePath + 'intersections/playlistSongsNotInSavedSongs.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_info in playlist_not_in_saved:
-            file.write(format_playlist_song_line(song_info) + "\n")
-    
-    # Write remove-savedSongsNotInTopSongsOrPlaylists.txt
-    # (intersection of savedSongsNotInTopSongs and savedSongsNotInPlaylists)
-    print("Writing remove-savedSongsNotInTopSongsOrPlaylists.txt...")
-    not_in_top_or_playlists = []
-    for song_id in saved_songs_list:
-        if song_id not in top_songs_dict and song_id not in playlist_songs_dict and song_id in saved_songs_dict:
-            not_in_top_or_playlists.append(saved_songs_dict[song_id])
-    
-    with open(filePath + 'intersections/remove-savedSongsNotInTopSongsOrPlaylists.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_info in not_in_top_or_playlists:
-            file.write(format_song_line(song_info) + "\n")
+        for record in records:
+            file.write(("(R) " if record["resaved"] else "") + format_song_line(record) + "\n")
+    write_records(report_path, records)
+    
+    write_songs('savedSongsInPlaylists.txt', saved_in_playlists, playlist_songs=True)
+    write_songs('savedSongsNotInPlaylists.txt', saved_not_in_playlists)
+    write_songs('playlistSongsNotInSavedSongs.txt', playlist_not_in_saved, playlist_songs=True)
+    # Intersection of savedSongsNotInTopSongs and savedSongsNotInPlaylists
+    write_songs('remove-savedSongsNotInTopSongsOrPlaylists.txt', not_in_top_or_playlists)
+    write_songs('savedSongsNotInTopSongsButInPlaylists.txt', not_in_top_but_in_playlists, playlist_songs=True)
+    write_songs('savedSongsInTopSongsButNotInPlaylists.txt', saved_in_top_not_playlists)
+    print(f"Wrote {len(saved_in_top_not_playlists)} songs to savedSongsInTopSongsButNotInPlaylists.txt")
+    write_songs('add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt', add_songs, playlist_songs=True)
     
-    # Write savedSongsNotInTopSongsButInPlaylists.txt
-    # (saved songs not in top songs but in playlists)
-    print("Writing savedSongsNotInTopSongsButInPlaylists.txt...")
-    not_in_top_but_in_playlists = []
-    for song_id in saved_songs_list:
-        if song_id not in top_songs_dict and song_id in playlist_songs_dict and song_id in saved_songs_dict:
-            song_info = playlist_songs_dict[song_id].copy()
-            song_info.update(saved_songs_dict[song_id])
-            not_in_top_but_in_playlists.append(song_info)
+    # Ranks as S(hort)/M(edium)/L(ong), each with its movement since the previous snapshot, e.g. "S3(+2) M- L10(-1)"
+    def format_rank(label, rank, previous_rank):
+        movement = f"({previous_rank - rank:+d})" if rank and previous_rank and previous_rank != rank else ""
+        return f"{label}{rank or '-'}{movement}"
     
-    not_in_top_but_in_playlists.sort(key=lambda x: (-x["count"], x["name"]))
-    with open(filePath + 'intersections/savedSongsNotInTopSongsButInPlaylists.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_info in not_in_top_but_in_playlists:
-            file.write(format_playlist_song_line(song_info) + "\n")
-
-    # Write savedSongsInTopSongsButNotInPlaylists.txt
-    print("Writing savedSongsInTopSongsButNotInPlaylists.txt...")
-    saved_in_top_not_playlists = []
-    for song_id in top_songs_list:
-        # Song must be saved, in top songs, and NOT in any playlist
-        if song_id in saved_songs_dict and song_id not in playlist_songs_dict:
-            saved_in_top_not_playlists.append(saved_songs_dict[song_id])
-
-    with open(filePath + 'intersections/savedSongsInTopSongsButNotInPlaylists.txt', 'w') as file:
-        file.write(f"Generated on {current_date}\n")
-        for song_info in saved_in_top_not_playlists:
-            file.write(format_song_line(song_info) + "\n")
-    print(f"Wrote {len(saved_in_top_not_playlists)} songs to savedSongsInTopSongsButNotInPlaylists.txt")
-
-    # Write add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt
-    print("Writing add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt...")
-    # Load topSongsNotInSavedSongs.txt ids, ignoring lines starting with (R)
-    top_songs_not_in_saved_ids = set()
-    try:
-        with open(filePath + 'intersections/topSongsNotInSavedSongs.txt', 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("Generated on"):
-                    continue
-                if line.startswith("(R)"):
-                    continue
-                parts = line.split("|")
-                if len(parts) >= 3:
-                    track_id = parts[2].strip()
-                    top_songs_not_in_saved_ids.add(track_id)
-    except Exception as e:
-        print(f"Error reading topSongsNotInSavedSongs.txt: {e}")
-
-    # Find playlistSongsNotInSavedSongs.txt songs in 2+ playlists and in topSongsNotInSavedSongs.txt
-    add_songs = []
-    try:
-        with open(filePath + 'intersections/playlistSongsNotInSavedSongs.txt', 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line or line.startswith("Generated on"):
-                    continue
-                # Format: count: Song | Artist | ID | Playlists: ...
-                parts = line.split("|")
-                if len(parts) >= 3 and ":" in parts[0]:
-                    count_part = parts[0].split(":")[0].strip()
-                    try:
-                        count = int(count_part)
-                    except ValueError:
-                        continue
-                    track_id = parts[2].strip()
-                    if count >= 2 and track_id in top_songs_not_in_saved_ids:
-                        add_songs.append(line)
-    except Exception as e:
-        print(f"Error reading playlistSongsNotInSavedSongs.txt: {e}")
-
-    with open(filePath + 'intersections/add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt', 'w') as file:
+    print("Writing topSongRanks.txt...")
+    report_path = filePath + 'intersections/topSongRanks.txt'
+    with open(report_path, 'w') as file:
         file.write(f"Generated on {current_date}\n")
-        for song_line in add_songs:
-            file.write(song_line + "\n")
+        for record in rank_records:
+            ranks = " ".join(format_rank(time_range[0].upper(), record[time_range], record[f"previous_{time_range}"])
+                             for time_range in TIME_RANGES)
+            file.write(f"{ranks}: {format_song_line(record)}\n")
+    write_records(report_path, rank_records)
     
     end_time = time.time()
     total_time = end_time - start_time
@@ -301,9 +189,9 @@ def main():
     print(f"\nComplete!")
     print(f"Wrote {len(saved_songs_list)} saved songs to savedSongs.txt")
     print(f"Wrote {len(top_songs_list)} top songs to topSongs.txt")
-    print(f"Wrote {len([s for s in saved_songs_list if s in top_songs_dict])} songs to savedSongsInTopSongs.txt")
-    print(f"Wrote {len([s for s in saved_songs_list if s not in top_songs_dict])} songs to savedSongsNotInTopSongs.txt")
-    print(f"Wrote {len([s for s in top_songs_list if s not in saved_songs_dict])} songs to topSongsNotInSavedSongs.txt")
+    print(f"Wrote {len(saved_in_top)} songs to savedSongsInTopSongs.txt")
+    print(f"Wrote {len(saved_not_in_top)} songs to savedSongsNotInTopSongs.txt")
+    print(f"Wrote {len(top_not_in_saved)} songs to topSongsNotInSavedSongs.txt")
     print(f"Wrote {len(saved_in_playlists)} songs to savedSongsInPlaylists.txt")
     print(f"Wrote {len(saved_not_in_playlists)} songs to savedSongsNotInPlaylists.txt")
     print(f"Wrote {len(playlist_not_in_saved)} songs to playlistSongsNotInSavedSongs.txt")
@@ -311,7 +199,9 @@ def main():
     print(f"Wrote {len(saved_in_top_not_playlists)} songs to savedSongsInTopSongsButNotInPlaylists.txt")
     print(f"Wrote {len(add_songs)} songs to add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt")
     print(f"Wrote {len(not_in_top_or_playlists)} songs to remove-savedSongsNotInTopSongsOrPlaylists.txt")
+    print(f"Wrote {len(rank_records)} songs to topSongRanks.txt")
     print(f"Total time: {total_time:.2f} seconds")
+    print(f"Run summary: {write_run_summary(filePath + 'intersections', __file__)}")
 
 if __name__ == "__main__":
     main()
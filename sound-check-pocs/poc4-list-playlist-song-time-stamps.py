@@ -11,23 +11,31 @@ Each line format:
 
 Constants to set below: PLAYLIST_ID, CROSSFADE_SECONDS
 
-Uses the project's SpotifyWebApi class (PKCE flow) for authentication.
+Reads the playlist from the library store when the store is fresh and holds every track of
+the playlist, otherwise uses the project's SpotifyWebApi class (PKCE flow) for authentication.
 """
 
 import os
 import time
 from datetime import datetime
 from dotenv import load_dotenv
+from library_store import open_library
 from spotify_web_api import SpotifyWebApi
+from token_manager import create_token_manager
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
 
 load_dotenv()
 FILE_PATH = os.getenv("FILE_PATH", "")
 
 # ----- Edit these constants -----
-PLAYLIST_ID = "4TJxu2T8yhztGBxVXcZscc"
+PLAYLIST_ID = os.getenv("PLAYLIST_ID", "4TJxu2T8yhztGBxVXcZscc")
 CROSSFADE_SECONDS = 6
 # -------------------------------
 
+# Only the track fields the timestamps need are requested when reading from the API
+ITEM_FIELDS = "track(name,duration_ms,artists(name))"
+
 def format_seconds_to_hh_mm_ss(seconds: int) -> str:
     hours = seconds // 3600
     minutes = (seconds % 3600) // 60
@@ -35,21 +43,35 @@ def format_seconds_to_hh_mm_ss(seconds: int) -> str:
     return f"{hours:02d}:{minutes:02d}:{secs:02d}"
 
 def main():
+    start_run()
     start_time = time.time()
 
-    scope = "playlist-read-private playlist-read-collaborative"
-    api = SpotifyWebApi(scope=scope)
-    code_verifier = api.generate_code_verifier()
-    code_challenge = api.generate_code_challenge(code_verifier)
-    authorization_url = api.get_authorization_url(code_challenge)
-    print("Go to this URL and authorize the app:\n", authorization_url)
-    authorization_code = input("Enter the code from the redirect URL: ").strip()
-    api.get_token_pkce(authorization_code, code_verifier)
-
-    print(f"Fetching playlist {PLAYLIST_ID}...")
-    playlist = api.get_playlist(PLAYLIST_ID)
-    items = playlist.get("tracks", {}).get("items", [])
-    print(f"Found {len(items)} track items in playlist.")
+    mark("parse")
+    # Read from the local library store when it is fresh and has the playlist, otherwise from the API.
+    # A stale or missing store is not synced just for one playlist.
+    library = open_library(FILE_PATH)
+    items = None
+    if library:
+        if any(playlist["id"] == PLAYLIST_ID for playlist in library.get_playlists()):
+            items = library.get_playlist_items([PLAYLIST_ID])[0]
+        library.close()
+    api = None
+    # The store keeps no local tracks (they have no ID), so playlists with any are read from the API
+    if items is not None and all(item.track for item in items):
+        print(f"Reading playlist {PLAYLIST_ID} from the library store...")
+        tracks = [item.track for item in items]
+    else:
+        mark("fetch")
+        scope = "playlist-read-private playlist-read-collaborative"
+        api = SpotifyWebApi(scope=scope, token_manager=create_token_manager(FILE_PATH))
+        api.authorize()
+
+        print(f"Fetching playlist {PLAYLIST_ID}...")
+        # Stream track items so lines are built while later pages are still in flight
+        tracks = (item.track for item in api.iter_playlist_items(PLAYLIST_ID, ITEM_FIELDS))
+    # When streaming from the API, pages are still being fetched while this loop runs
+    mark("aggregate")
+    item_count = 0
 
     out_lines = []
 
@@ -59,25 +81,22 @@ def main():
 
     cumulative_seconds = 0
 
-    for idx, item in enumerate(items):
-        track = item.get("track")
+    for idx, track in enumerate(tracks):
+        item_count += 1
         if not track:
             continue
 
         # Skip local or unavailable tracks that don't have duration_ms
-        duration_ms = track.get("duration_ms")
+        duration_ms = track.duration_ms
         if duration_ms is None:
             continue
 
         song_seconds = int(duration_ms // 1000)
         song_length_str = format_seconds_to_hh_mm_ss(song_seconds)
 
-        artist = "Unknown"
-        artists = track.get("artists")
-        if artists and len(artists) > 0:
-            artist = artists[0].get("name", "Unknown")
+        artist = track.artist_name or "Unknown"
 
-        song_name = track.get("name", "Unknown")
+        song_name = track.name or "Unknown"
 
         # Playlist timestamp is the time the song starts: cumulative seconds of all prior songs
         playlist_timestamp_seconds = cumulative_seconds
@@ -101,6 +120,11 @@ def main():
         # advance cumulative by this song's full duration
         cumulative_seconds += song_seconds
 
+    if api:
+        api.close()
+    print(f"Found {item_count} track items in playlist.")
+
+    mark("write")
     # Ensure output directory exists
     if FILE_PATH and not FILE_PATH.endswith(os.path.sep):
         FILE_PATH_DIR = FILE_PATH
@@ -139,6 +163,7 @@ def main():
 
     end_time = time.time()
     print(f"Completed in {end_time - start_time:.2f}s")
+    print(f"Run summary: {write_run_summary(FILE_PATH_DIR, __file__)}")
 
 
 if __name__ == '__main__':
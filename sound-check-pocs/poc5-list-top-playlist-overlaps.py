@@ -3,61 +3,53 @@
 # SoundCheck POC - List Playlist Overlaps (at least 4 common songs)
 
 import os
-from collections import Counter, defaultdict
-from itertools import combinations
 from dotenv import load_dotenv
 from datetime import datetime
+from library_store import load_library
+from playlist_overlap import PlaylistOverlap
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
 
 load_dotenv()
 filePath = os.getenv("FILE_PATH") or ""
 
-input_file = os.path.join(filePath, 'playlist-songs/mostFrequentPlaylistSongs.txt')
 output_file = os.path.join(filePath, 'playlistOverlaps.txt')
 
+# Minimum number of common songs for a pair of playlists to be listed
+MIN_COMMON_SONGS = 4
+
 def main():
-    pair_counter = Counter()
-    pair_songs = defaultdict(set)
-
-    with open(input_file, 'r') as fin:
-        for line in fin:
-            line = line.strip()
-            if not line:
-                continue
-            # Format: count: Song Name | Artist | Id | Playlists: playlist1, playlist2, ...
-            parts = line.split(' | Playlists: ')
-            if len(parts) != 2:
-                continue
-            playlists_str = parts[1]
-            playlists = [p.strip() for p in playlists_str.split(',')]
-            # Remove duplicates if any
-            playlists = list(set(playlists))
-            # Extract the song name from the left side (after the leading count)
-            left = parts[0]
-            # left format: "count: Song Name | Artist | Id"
-            song = left.split(': ', 1)[1].split(' | ')[0].strip() if ': ' in left else left.split(' | ')[0].strip()
-            # Generate all unique pairs
-            for pair in combinations(playlists, 2):
-                # Sort the pair to make it unordered
-                sorted_pair = tuple(sorted(pair))
-                pair_counter[sorted_pair] += 1
-                pair_songs[sorted_pair].add(song)
-
-    # Filter for overlaps with at least 4 common songs and sort by count descending
-    overlaps = [(pair, count) for pair, count in pair_counter.items() if count >= 4]
-    overlaps.sort(key=lambda x: -x[1])
+    start_run()
+    mark("parse")
+    # Read from the local library store (synced at most once a day)
+    library = load_library(filePath)
+    playlists = library.get_playlists()
+    playlist_items = library.get_playlist_items([playlist["id"] for playlist in playlists])
+    library.close()
+
+    mark("aggregate")
+    overlap = PlaylistOverlap.from_rows(
+        (playlist["name"], item.track)
+        for playlist, items in zip(playlists, playlist_items)
+        for item in items
+    )
+
+    # Overlaps with at least MIN_COMMON_SONGS common songs, sorted by count descending
+    overlaps = overlap.pairs(min_overlap=MIN_COMMON_SONGS)
     # Human-friendly generated date for output files
     current_date = datetime.now().strftime("%m/%d/%Y")
 
+    mark("write")
     with open(output_file, 'w') as fout:
         fout.write(f"Generated on {current_date}\n")
         fout.write(f"{len(overlaps)} Total Overlaps\n\n")
-        for pair, count in overlaps:
-            playlist1, playlist2 = pair
-            songs = sorted(pair_songs.get(pair, []))
+        for playlist1, playlist2, count, _ in overlaps:
+            songs = sorted({track.name for track in overlap.shared_tracks(playlist1, playlist2)})
             songs_str = ", ".join(songs)
             fout.write(f"{count}: {playlist1} + {playlist2}:\n  {songs_str}\n\n")
 
-    print(f"Wrote {len(overlaps)} playlist overlaps (with at least 4 common songs) to {output_file}")
+    print(f"Wrote {len(overlaps)} playlist overlaps (with at least {MIN_COMMON_SONGS} common songs) to {output_file}")
+    print(f"Run summary: {write_run_summary(filePath, __file__)}")
 
 if __name__ == "__main__":
     main()
@@ -4,10 +4,16 @@
 
 # POSSIBLY WORKING, BUT WITH GREAT POWER COMES GREAT RESPONSIBILITY
 
+import argparse
 import os
 import time
 from dotenv import load_dotenv
+from library_store import open_library
+from report_records import read_records
 from spotify_web_api import SpotifyWebApi
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
+from token_manager import create_token_manager
 from datetime import datetime
 
 load_dotenv()
@@ -15,97 +21,104 @@ load_dotenv()
 # Get the directory where this script is located
 SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
 
-# File paths (relative to script location)
-ADD_UNSAVED_TOP_MULTIPLE_PATH = os.path.join(SCRIPT_DIR, "personal_data/intersections/add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt")
-REMOVE_SAVED_SONGS_PATH = os.path.join(SCRIPT_DIR, "personal_data/intersections/remove-savedSongsNotInTopSongsOrPlaylists.txt")
-OUTPUT_PATH = os.path.join(SCRIPT_DIR, "personal_data/savedAndUnsavedSongs.txt")
+# File paths (relative to script location unless PERSONAL_DATA_PATH is set)
+PERSONAL_DATA = os.getenv("PERSONAL_DATA_PATH") or os.path.join(SCRIPT_DIR, "personal_data")
+ADD_UNSAVED_TOP_MULTIPLE_PATH = os.path.join(PERSONAL_DATA, "intersections/add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt")
+REMOVE_SAVED_SONGS_PATH = os.path.join(PERSONAL_DATA, "intersections/remove-savedSongsNotInTopSongsOrPlaylists.txt")
+OUTPUT_PATH = os.path.join(PERSONAL_DATA, "savedAndUnsavedSongs.txt")
+PLAN_PATH = os.path.join(PERSONAL_DATA, "savedAndUnsavedSongsPlan.txt")
 
 # Scope for Spotify API
 SCOPE = "user-library-read user-library-modify"
 
-def parse_song_line(line):
+def load_report_records(report_path):
     """
-    Parse a line from the song files.
-    Format: count: Song | Artist | ID | Playlists: ... (for playlistSongsNotInSavedSongs)
-    Format: Song | Artist | ID (for remove-savedSongsNotInTopSongsOrPlaylists)
-    Returns (song_name, artist, track_id) or None if parsing fails
+    Load the typed records poc3 writes next to a report, or [] when the report has not been generated
     """
-    parts = line.strip().split(" | ")
-    
-    # For playlistSongsNotInSavedSongs.txt format: "count: Song | Artist | ID | Playlists: ..."
-    if len(parts) >= 3 and ":" in parts[0]:
-        try:
-            # Extract the count from the first part
-            count_part = parts[0].split(":")[0]
-            count = int(count_part)
-            song = parts[0].split(": ", 1)[1]  # Get the song name after "count: "
-            artist = parts[1]
-            track_id = parts[2]
-            return (song, artist, track_id, count)
-        except (ValueError, IndexError):
-            return None
-    
-    # For remove-savedSongsNotInTopSongsOrPlaylists.txt format: "Song | Artist | ID"
-    elif len(parts) == 3:
-        try:
-            song = parts[0]
-            artist = parts[1]
-            track_id = parts[2]
-            return (song, artist, track_id)
-        except IndexError:
-            return None
-    
-    return None
-
+    try:
+        return read_records(report_path)
+    except FileNotFoundError:
+        print(f"Warning: {report_path} not found")
+        return []
 
 def read_add_unsaved_top_multiple():
     """
-    Read add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt and return a dict of track_id -> (song, artist, count)
+    Read add-unsavedSongsInTopSongsAndInMultiplePlaylists records and return a dict of track_id -> (song, artist, count)
     """
-    songs_to_save = {}
-    if not os.path.exists(ADD_UNSAVED_TOP_MULTIPLE_PATH):
-        print(f"Warning: {ADD_UNSAVED_TOP_MULTIPLE_PATH} not found")
-        return songs_to_save
-    with open(ADD_UNSAVED_TOP_MULTIPLE_PATH, 'r') as f:
-        for line in f:
-            parsed = parse_song_line(line)
-            if parsed and len(parsed) == 4:
-                song, artist, track_id, count = parsed
-                songs_to_save[track_id] = (song, artist, count)
-    return songs_to_save
+    return {
+        record["id"]: (record["name"], record["artist"], record["count"])
+        for record in load_report_records(ADD_UNSAVED_TOP_MULTIPLE_PATH)
+    }
 
 def read_remove_saved_songs():
     """
-    Read remove-savedSongsNotInTopSongsOrPlaylists.txt and return a dict of track_id -> (song, artist)
+    Read remove-savedSongsNotInTopSongsOrPlaylists records and return a dict of track_id -> (song, artist)
     """
-    songs_to_unsave = {}
-    
-    if not os.path.exists(REMOVE_SAVED_SONGS_PATH):
-        print(f"Warning: {REMOVE_SAVED_SONGS_PATH} not found")
-        return songs_to_unsave
-    
-    with open(REMOVE_SAVED_SONGS_PATH, 'r') as f:
-        for line in f:
-            parsed = parse_song_line(line)
-            if parsed and len(parsed) == 3:
-                song, artist, track_id = parsed
-                songs_to_unsave[track_id] = (song, artist)
-    
-    return songs_to_unsave
+    return {
+        record["id"]: (record["name"], record["artist"])
+        for record in load_report_records(REMOVE_SAVED_SONGS_PATH)
+    }
+
+def write_plan(plan, songs_to_save, songs_to_unsave):
+    """
+    Write the dry-run plan: which songs will be saved or unsaved and which need no change
+    """
+    output_dir = os.path.dirname(PLAN_PATH)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    current_date = datetime.now().strftime("%m/%d/%Y")
+
+    def save_line(track_id):
+        song, artist, count = songs_to_save[track_id]
+        return f"  {count}: {song} | {artist} | {track_id}\n"
+
+    def unsave_line(track_id):
+        song, artist = songs_to_unsave[track_id]
+        return f"  {song} | {artist} | {track_id}\n"
+
+    sections = [
+        (f"To Save ({len(plan.save_batches())} requests)", plan.to_save, save_line),
+        ("Already Saved", plan.already_saved, save_line),
+        (f"To Unsave ({len(plan.unsave_batches())} requests)", plan.to_unsave, unsave_line),
+        ("Not Saved", plan.not_saved, unsave_line),
+        ("Could Not Check", [track_id for track_id in plan.save_ids if track_id in plan.unchecked], save_line),
+        ("Could Not Check", [track_id for track_id in plan.unsave_ids if track_id in plan.unchecked], unsave_line),
+    ]
+    with open(PLAN_PATH, 'w') as f:
+        f.write(f"Generated on {current_date}\n")
+        f.write(f"Plan: {plan.summary()}\n")
+        for title, track_ids, format_line in sections:
+            if track_ids:
+                f.write(f"\n{title}: {len(track_ids)}\n")
+                for track_id in track_ids:
+                    f.write(format_line(track_id))
+
+def saved_ids_from_library():
+    """
+    IDs of the saved songs in the local library store when it is fresh, otherwise None
+    """
+    library = open_library(os.getenv("FILE_PATH") or "")
+    if not library:
+        return None
+    saved_ids = {item.track.id for item in library.get_saved_items()}
+    library.close()
+    return saved_ids
 
 def main():
+    start_run()
+    parser = argparse.ArgumentParser(description="Save and unsave songs based on the intersection reports")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="Only write the plan (what would be saved/unsaved) without changing the library")
+    parser.add_argument("--check-saved", action="store_true",
+                        help="Check saved songs with the API even when the local library store is fresh")
+    args = parser.parse_args()
     start_time = time.time()
     
     # Initialize Spotify API
-    api = SpotifyWebApi(scope=SCOPE)
-    code_verifier = api.generate_code_verifier()
-    code_challenge = api.generate_code_challenge(code_verifier)
-    authorization_url = api.get_authorization_url(code_challenge)
-    
-    print("Go to this URL and authorize the app:\n", authorization_url)
-    authorization_code = input("Enter the code from the redirect URL: ").strip()
-    api.get_token_pkce(authorization_code, code_verifier)
+    api = SpotifyWebApi(scope=SCOPE, token_manager=create_token_manager(os.getenv("FILE_PATH")))
+    api.authorize()
     
+    mark("parse")
     # Read songs from files
     print("Reading song data...")
     songs_to_save = read_add_unsaved_top_multiple()
@@ -114,50 +127,46 @@ def main():
     print(f"Found {len(songs_to_save)} songs to save (appear in 2+ playlists)")
     print(f"Found {len(songs_to_unsave)} songs to unsave")
     
-    # Process save and unsave operations
-    saved_results = {"saved": [], "already_saved": [], "failed": []}
-    unsaved_results = {"unsaved": [], "not_saved": [], "failed": []}
-    
-    if songs_to_save:
-        print(f"\nSaving {len(songs_to_save)} songs...")
-        track_ids_to_save = list(songs_to_save.keys())
-        
-        for track_id in track_ids_to_save:
-            try:
-                save_result = api.save_songs([track_id])
-                if save_result.get("saved") and track_id in save_result["saved"]:
-                    saved_results["saved"].append(track_id)
-                    print(f"  Successfully saved: {songs_to_save[track_id][0]}")
-                elif save_result.get("already_saved") and track_id in save_result["already_saved"]:
-                    saved_results["already_saved"].append(track_id)
-                    print(f"  Already saved: {songs_to_save[track_id][0]}")
-                else:
-                    saved_results["failed"].append(track_id)
-                    print(f"  Failed to save: {songs_to_save[track_id][0]}")
-            except Exception as e:
-                saved_results["failed"].append(track_id)
-                print(f"  Error saving {songs_to_save[track_id][0]}: {e}")
-    
-    if songs_to_unsave:
-        print(f"\nUnsaving {len(songs_to_unsave)} songs...")
-        track_ids_to_unsave = list(songs_to_unsave.keys())
-        
-        for track_id in track_ids_to_unsave:
-            try:
-                unsave_result = api.unsave_songs([track_id])
-                if unsave_result.get("unsaved") and track_id in unsave_result["unsaved"]:
-                    unsaved_results["unsaved"].append(track_id)
-                    print(f"  Successfully unsaved: {songs_to_unsave[track_id][0]}")
-                elif unsave_result.get("not_saved") and track_id in unsave_result["not_saved"]:
-                    unsaved_results["not_saved"].append(track_id)
-                    print(f"  Was not saved: {songs_to_unsave[track_id][0]}")
-                else:
-                    unsaved_results["failed"].append(track_id)
-                    print(f"  Failed to unsave: {songs_to_unsave[track_id][0]}")
-            except Exception as e:
-                unsaved_results["failed"].append(track_id)
-                print(f"  Error unsaving {songs_to_unsave[track_id][0]}: {e}")
-    
+    mark("fetch")
+    # Plan every change up front from the fresh library store's saved songs, or with one bulk
+    # membership check instead of one per song
+    saved_ids = None if args.check_saved else saved_ids_from_library()
+    if saved_ids is None:
+        print("\nChecking which songs are already saved...")
+    else:
+        print(f"\nPlanning from the {len(saved_ids)} saved songs in the library store...")
+    plan = api.plan_library_changes(save_ids=songs_to_save.keys(), unsave_ids=songs_to_unsave.keys(),
+                                    saved_ids=saved_ids)
+    mark("write")
+    write_plan(plan, songs_to_save, songs_to_unsave)
+    print(f"Plan: {plan.summary()}")
+    print(f"Plan written to {PLAN_PATH}")
+    if args.dry_run:
+        print("Dry run, no songs were saved or unsaved")
+        api.close()
+        print(f"Run summary: {write_run_summary(os.path.dirname(PLAN_PATH), __file__)}")
+        return
+    
+    mark("fetch")
+    # Send only the batches that change something, concurrently
+    print(f"\nSaving {len(plan.to_save)} songs and unsaving {len(plan.to_unsave)} songs...")
+    saved_results, unsaved_results = api.apply_library_changes(plan)
+    
+    for track_id in saved_results["saved"]:
+        print(f"  Successfully saved: {songs_to_save[track_id][0]}")
+    for track_id in saved_results["already_saved"]:
+        print(f"  Already saved: {songs_to_save[track_id][0]}")
+    for track_id in saved_results["failed"]:
+        print(f"  Failed to save: {songs_to_save[track_id][0]}")
+    for track_id in unsaved_results["unsaved"]:
+        print(f"  Successfully unsaved: {songs_to_unsave[track_id][0]}")
+    for track_id in unsaved_results["not_saved"]:
+        print(f"  Was not saved: {songs_to_unsave[track_id][0]}")
+    for track_id in unsaved_results["failed"]:
+        print(f"  Failed to unsave: {songs_to_unsave[track_id][0]}")
+    api.close()
+    
+    mark("write")
     # Write results to file
     # Create directory if it doesn't exist
     output_dir = os.path.dirname(OUTPUT_PATH)
@@ -222,6 +231,7 @@ def main():
     end_time = time.time()
     execution_time = end_time - start_time
     print(f"Execution time: {execution_time:.2f} seconds")
+    print(f"Run summary: {write_run_summary(os.path.dirname(OUTPUT_PATH), __file__)}")
 
 if __name__ == "__main__":
     main()
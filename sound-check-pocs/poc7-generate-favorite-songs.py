@@ -1,74 +1,50 @@
+import os
 from datetime import datetime
 from pathlib import Path
+from report_records import read_records
+from spotify_web_api import TIME_RANGES
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
 
-# Define file paths
-base_path = Path(__file__).parent / "personal_data"
-saved_songs_file = base_path / "intersections" / "savedSongs.txt"
-saved_in_top_songs_file = base_path / "intersections" / "savedSongsInTopSongs.txt"
-saved_in_playlists_file = base_path / "intersections" / "savedSongsInPlaylists.txt"
+# Define file paths (relative to script location unless PERSONAL_DATA_PATH is set)
+base_path = Path(os.getenv("PERSONAL_DATA_PATH") or Path(__file__).parent / "personal_data")
+# poc3's intersection records, read from where poc3 writes them (FILE_PATH)
+intersections_path = Path(os.getenv("FILE_PATH") or base_path) / "intersections"
+saved_songs_file = intersections_path / "savedSongs.txt"
+top_song_ranks_file = intersections_path / "topSongRanks.txt"
+saved_in_playlists_file = intersections_path / "savedSongsInPlaylists.txt"
 top_100_file = base_path / "favorite-songs" / "my-top-100.txt"
 output_file = base_path / "favorite-songs" / "generated-favorite-songs.txt"
 
-# Parse saved songs
+start_run()
+mark("parse")
+# Load saved songs
 songs = {}
-with open(saved_songs_file, 'r', encoding='utf-8') as f:
-    next(f)  # Skip generated date line
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.rsplit(' | ', 2)
-        if len(parts) == 3:
-            song_name, artist, song_id = parts
-            songs[song_id] = {
-                'name': song_name,
-                'artist': artist,
-                'rank': None,
-                'playlist_count': 0,
-                'popularity': 0,
-                'top_100_score': 0
-            }
+for record in read_records(saved_songs_file):
+    songs[record['id']] = {
+        'name': record['name'],
+        'artist': record['artist'],
+        'ranks': {},
+        'playlist_count': 0,
+        'popularity': 0,
+        'top_100_score': 0
+    }
 
-# Parse saved songs in top songs to get ranks
-rank_counter = 1
-max_rank = 0
-with open(saved_in_top_songs_file, 'r', encoding='utf-8') as f:
-    next(f)  # Skip generated date line
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
-        parts = line.rsplit(' | ', 2)
-        if len(parts) == 3:
-            song_name, artist, song_id = parts
-            if song_id in songs:
-                songs[song_id]['rank'] = rank_counter
-                max_rank = rank_counter
-                rank_counter += 1
+# Rank saved songs within each time range's top songs (1 = highest ranked saved song in that range)
+rank_records = read_records(top_song_ranks_file)
+default_ranks = {}
+for time_range in TIME_RANGES:
+    ranked = sorted((record for record in rank_records if record['id'] in songs and record[time_range]),
+                    key=lambda record: record[time_range])
+    for rank, record in enumerate(ranked, start=1):
+        songs[record['id']]['ranks'][time_range] = rank
+    # Rank of songs not in this range's top songs
+    default_ranks[time_range] = len(ranked) + 1
 
-# Assign default rank for songs not in top songs
-default_rank = max_rank + 1
-for song_id in songs:
-    if songs[song_id]['rank'] is None:
-        songs[song_id]['rank'] = default_rank
-
-# Parse playlist frequency
-with open(saved_in_playlists_file, 'r', encoding='utf-8') as f:
-    next(f)  # Skip generated date line
-    for line in f:
-        line = line.strip()
-        if not line:
-            continue
-        # Format: "5: Song Name | Artist | ID | Playlists: ..."
-        parts = line.split(': ', 1)
-        if len(parts) == 2:
-            count = int(parts[0])
-            rest = parts[1]
-            song_parts = rest.split(' | ')
-            if len(song_parts) >= 3:
-                song_id = song_parts[2]
-                if song_id in songs:
-                    songs[song_id]['playlist_count'] = count
+# Load playlist frequency
+for record in read_records(saved_in_playlists_file):
+    if record['id'] in songs:
+        songs[record['id']]['playlist_count'] = record['count']
 
 # Parse top 100 songs (match by song name and artist)
 top_100_songs = {}  # Map of (song_name, artist) -> rank_position (1-based)
@@ -95,6 +71,7 @@ with open(top_100_file, 'r', encoding='utf-8') as f:
                 artist = parts[1].lower()
                 top_100_songs[(song_name, artist)] = rank_position
 
+mark("aggregate")
 # Mark songs in top 100 with appropriate score
 for song_id in songs:
     song_name_lower = songs[song_id]['name'].lower()
@@ -114,16 +91,18 @@ for song_id in songs:
 scored_songs = []
 for song_id, song_data in songs.items():
     # Calculate rank score (50% weight)
-    # 0 if not in top songs (rank = default_rank), scale from 0 to 100
-    if song_data['rank'] == default_rank:
-        rank_score = 0
-    else:
-        # 1 (top) -> 100, default_rank (bottom) -> 1
-        # Normalize: (rank - 1) / (default_rank - 2)
-        if default_rank > 1:
-            rank_score = ((default_rank - song_data['rank']) / (default_rank - 1)) * 100
+    # Mean over the short, medium and long term ranges of: 0 if not in that range's top songs,
+    # otherwise scaled from 100 (top) down towards 0 (default rank)
+    range_scores = []
+    for time_range in TIME_RANGES:
+        rank = song_data['ranks'].get(time_range)
+        default_rank = default_ranks[time_range]
+        if rank is None:
+            range_scores.append(0)
         else:
-            rank_score = 100
+            # 1 (top) -> 100, default_rank (bottom) -> 0
+            range_scores.append(((default_rank - rank) / (default_rank - 1)) * 100)
+    rank_score = sum(range_scores) / len(range_scores)
     
     # Calculate playlist frequency score (40% weight)
     # 0->0, 1->20, 2->40, 3->60, 4->80, 5+->100
@@ -151,6 +130,7 @@ for song_id, song_data in songs.items():
 # Sort by score descending
 scored_songs.sort(key=lambda x: x['score'], reverse=True)
 
+mark("write")
 # Write output
 with open(output_file, 'w', encoding='utf-8') as f:
     # First line: "Generated on MM/DD/YYYY"
@@ -167,3 +147,4 @@ print(f"Total songs processed: {len(scored_songs)}")
 print(f"Top 5 songs:")
 for i, song in enumerate(scored_songs[:5], 1):
     print(f"{i}. {song['score']}: {song['name']} | {song['artist']}")
+print(f"Run summary: {write_run_summary(output_file.parent, __file__)}")
@@ -0,0 +1,84 @@
+# Eli Dow
+# January 2026
+# SoundCheck POC - Generate library and per-playlist genre distributions
+
+import os
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from genre_stats import GenreIndex
+from library_store import load_library
+from report_records import write_records
+from instrumentation import start_run, write_run_summary
+from stage_timer import mark
+
+load_dotenv()
+filePath = os.getenv("FILE_PATH") or ""
+
+output_dir = os.path.join(filePath, 'genres')
+library_output_file = os.path.join(output_dir, 'libraryGenres.txt')
+playlist_output_file = os.path.join(output_dir, 'playlistGenres.txt')
+
+# Number of genres listed per playlist
+PLAYLIST_TOP_GENRES = 10
+
+def genre_records(distribution):
+    return [{"genre": genre, "count": count, "share": round(share, 4)} for genre, count, share in distribution]
+
+def main():
+    start_run()
+    start_time = time.time()
+
+    mark("parse")
+    # Read from the local library store (synced at most once a day); sync fetches every artist's genres
+    library = load_library(filePath)
+    playlists = library.get_playlists()
+    playlist_items = library.get_playlist_items([playlist["id"] for playlist in playlists])
+    saved_songs = library.get_saved_items()
+    genres = GenreIndex(library.get_artist_genres())
+    library.close()
+    print(f"Loaded genres for {len(genres.artist_genres)} artists.")
+
+    # Human-friendly generated date for output files
+    current_date = datetime.now().strftime("%m/%d/%Y")
+    os.makedirs(output_dir, exist_ok=True)
+
+    mark("aggregate")
+    # Library = every distinct song that is saved or in a playlist
+    library_distribution, library_total = genres.distribution(
+        [item.track for item in saved_songs] + [item.track for items in playlist_items for item in items]
+    )
+    mark("write")
+    with open(library_output_file, 'w') as fout:
+        fout.write(f"Generated on {current_date}\n")
+        fout.write(f"{len(library_distribution)} genres across {library_total} songs\n\n")
+        for genre, count, share in library_distribution:
+            fout.write(f"{genre} | {count} | {share * 100:.1f}%\n")
+    write_records(library_output_file, genre_records(library_distribution))
+    print(f"Wrote {len(library_distribution)} library genres to {library_output_file}")
+
+    mark("aggregate")
+    playlist_distributions = genres.playlist_distributions(playlist_items, top_n=PLAYLIST_TOP_GENRES)
+    mark("write")
+    records = []
+    with open(playlist_output_file, 'w') as fout:
+        fout.write(f"Generated on {current_date}\n")
+        fout.write(f"Top {PLAYLIST_TOP_GENRES} genres for {len(playlists)} playlists\n\n")
+        for playlist, (distribution, total) in zip(playlists, playlist_distributions):
+            fout.write(f"{playlist['name']} ({total} songs):\n")
+            for genre, count, share in distribution:
+                fout.write(f"  {genre} | {count} | {share * 100:.1f}%\n")
+            fout.write("\n")
+            records.append({"playlist": playlist["name"], "id": playlist["id"], "songs": total,
+                            "genres": genre_records(distribution)})
+    write_records(playlist_output_file, records)
+    print(f"Wrote genre distributions for {len(playlists)} playlists to {playlist_output_file}")
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"\nComplete!")
+    print(f"Total time: {total_time:.2f} seconds")
+    print(f"Run summary: {write_run_summary(output_dir, __file__)}")
+
+if __name__ == "__main__":
+    main()
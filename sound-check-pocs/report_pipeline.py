@@ -0,0 +1,188 @@
+import ast
+import hashlib
+import json
+import os
+import runpy
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+# Input name standing for the synced library store rather than a file
+LIBRARY = "library"
+
+
+class Stage:
+    """
+    One report script with the inputs it reads and the files it writes.
+
+    Inputs are file paths or LIBRARY. A stage that reads another stage's output runs after it;
+    stages with no path between them run in parallel. The local modules the script imports are
+    found from its source and count as code alongside the script itself.
+    """
+
+    def __init__(self, name, script, inputs=(), outputs=()):
+        self.name = name
+        self.script = script
+        self.inputs = [LIBRARY if path == LIBRARY else os.path.abspath(path) for path in inputs]
+        self.outputs = [os.path.abspath(path) for path in outputs]
+        self.code = local_modules(script) if os.path.exists(script) else []
+
+
+def file_fingerprint(path):
+    """sha256 of a file's contents, or None when it does not exist."""
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def local_modules(script):
+    """
+    Source files of the modules script imports from its own directory, followed transitively, so
+    a stage is rerun when shared code such as frequency_engine or report_records changes.
+    """
+    directory = os.path.dirname(os.path.abspath(script))
+    found = []
+    pending = [os.path.abspath(script)]
+    seen = set(pending)
+    while pending:
+        with open(pending.pop(), 'rb') as f:
+            tree = ast.parse(f.read())
+        for node in ast.walk(tree):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module]
+            else:
+                continue
+            for name in names:
+                path = os.path.join(directory, *name.split(".")) + ".py"
+                if path not in seen and os.path.exists(path):
+                    seen.add(path)
+                    found.append(path)
+                    pending.append(path)
+    return sorted(found)
+
+
+def run_stage(script):
+    """Run a report script as __main__ in a worker process and return how long it took."""
+    start_time = time.time()
+    runpy.run_path(script, run_name="__main__")
+    return time.time() - start_time
+
+
+class Pipeline:
+    """
+    Runs report stages in dependency order, skipping stages whose inputs are unchanged.
+
+    A stage's fingerprint hashes its script, the local modules it imports and every input (the library's content hash for
+    LIBRARY), taken right before it would run so upstream stages that rewrote identical files do
+    not force a rerun. Fingerprints of successful runs are kept in a JSON state file.
+    """
+
+    def __init__(self, stages, state_path, library_fingerprint=None, max_workers=None):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = state_path
+        self.library_fingerprint = library_fingerprint
+        self.max_workers = max_workers or os.cpu_count()
+        self.state = {}
+        if os.path.exists(state_path):
+            with open(state_path, 'r') as f:
+                self.state = json.load(f)
+
+        producers = {path: stage.name for stage in stages for path in stage.outputs}
+        self.dependencies = {
+            stage.name: {producers[path] for path in stage.inputs if path in producers} - {stage.name}
+            for stage in stages
+        }
+
+    def _save_state(self):
+        directory = os.path.dirname(self.state_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(self.state, f, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def fingerprint(self, stage):
+        digest = hashlib.sha256()
+        digest.update(str(file_fingerprint(stage.script)).encode())
+        for path in stage.code:
+            digest.update(f"{os.path.basename(path)}={file_fingerprint(path)}".encode())
+        for path in stage.inputs:
+            value = self.library_fingerprint if path == LIBRARY else file_fingerprint(path)
+            digest.update(f"{path}={value}".encode())
+        return digest.hexdigest()
+
+    def is_current(self, stage, fingerprint):
+        return self.state.get(stage.name) == fingerprint and all(os.path.exists(path) for path in stage.outputs)
+
+    def run(self, names=None, force=False):
+        """
+        Run the named stages (all when None) plus everything they depend on.
+
+        Returns:
+            Dict of stage name -> "ran", "skipped" or "failed"
+        """
+        unknown = [name for name in names or () if name not in self.stages]
+        if unknown:
+            raise ValueError(f"Unknown stages {', '.join(unknown)}; valid stages are {', '.join(self.stages)}")
+
+        selected = set()
+        pending_names = list(names or self.stages)
+        while pending_names:
+            name = pending_names.pop()
+            if name not in selected:
+                selected.add(name)
+                pending_names.extend(self.dependencies[name])
+
+        results = {}
+        running = {}
+        fingerprints = {}
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            while len(results) < len(selected):
+                progressed = False
+                for name in sorted(selected - set(results) - set(running.values())):
+                    dependencies = self.dependencies[name]
+                    if any(results.get(dependency) == "failed" for dependency in dependencies):
+                        print(f"[{name}] not run, a stage it depends on failed")
+                        results[name] = "failed"
+                        progressed = True
+                    elif all(dependency in results for dependency in dependencies):
+                        stage = self.stages[name]
+                        fingerprint = self.fingerprint(stage)
+                        if not force and self.is_current(stage, fingerprint):
+                            print(f"[{name}] inputs unchanged, skipped")
+                            results[name] = "skipped"
+                            progressed = True
+                            continue
+                        for path in stage.outputs:
+                            os.makedirs(os.path.dirname(path), exist_ok=True)
+                        print(f"[{name}] running {os.path.basename(stage.script)}...")
+                        running[executor.submit(run_stage, stage.script)] = name
+                        fingerprints[name] = fingerprint
+                        # Forget the old fingerprint so a failed rerun is retried next time
+                        self.state.pop(name, None)
+                        progressed = True
+                if not running:
+                    if not progressed:
+                        raise ValueError(f"Stages depend on each other in a cycle: {sorted(selected - set(results))}")
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        elapsed = future.result()
+                    except BaseException as e:
+                        print(f"[{name}] failed - {type(e).__name__}: {str(e)}")
+                        results[name] = "failed"
+                        continue
+                    print(f"[{name}] finished in {elapsed:.2f} seconds")
+                    self.state[name] = fingerprints.pop(name)
+                    self._save_state()
+                    results[name] = "ran"
+        return results
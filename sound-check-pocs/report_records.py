@@ -0,0 +1,76 @@
+import json
+import os
+from dotenv import load_dotenv
+from json_codec import loads
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+load_dotenv()
+
+# Format of the typed record file written next to every text report: "jsonl" or "parquet" (needs pyarrow)
+REPORT_FORMAT = os.getenv("REPORT_FORMAT", "jsonl")
+
+EXTENSIONS = {"jsonl": ".jsonl", "parquet": ".parquet"}
+
+
+def records_path(report_path, fmt=None):
+    """Path of the record file for a text report, e.g. savedSongs.txt -> savedSongs.jsonl."""
+    fmt = fmt or REPORT_FORMAT
+    if fmt not in EXTENSIONS:
+        raise ValueError(f"Unknown report format: {fmt}")
+    return os.path.splitext(report_path)[0] + EXTENSIONS[fmt]
+
+
+def write_records(report_path, records, fmt=None):
+    """
+    Write a report's rows as typed records next to its text file, so later steps can load them
+    instead of re-parsing the pipe-delimited lines.
+
+    Args:
+        report_path: Path of the human-readable text report
+        records: List of dicts (one per report line) with JSON-compatible values
+        fmt: "jsonl" or "parquet"; defaults to REPORT_FORMAT
+
+    Returns:
+        Path of the record file
+    """
+    fmt = fmt or REPORT_FORMAT
+    path = records_path(report_path, fmt)
+    if fmt == "parquet":
+        if pyarrow is None:
+            raise ImportError("pyarrow is required for REPORT_FORMAT=parquet")
+        pyarrow.parquet.write_table(pyarrow.Table.from_pylist(records), path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    return path
+
+
+def read_records(report_path):
+    """
+    Load the records written for a text report, from whichever record file exists.
+
+    Raises:
+        FileNotFoundError: If the report was never written with records
+    """
+    for fmt in ([REPORT_FORMAT] + [other for other in EXTENSIONS if other != REPORT_FORMAT]):
+        path = records_path(report_path, fmt)
+        if not os.path.exists(path):
+            continue
+        if fmt == "parquet":
+            if pyarrow is None:
+                continue
+            return pyarrow.parquet.read_table(path).to_pylist()
+        with open(path, "r", encoding="utf-8") as f:
+            return [loads(line) for line in f if line.strip()]
+    raise FileNotFoundError(f"No records found for {report_path}")
+
+
+def playlist_counts(playlists):
+    """Per-playlist counts ({name: count}) as a list of records, which Parquet can store as one column type."""
+    return [{"playlist": name, "count": count} for name, count in playlists.items()]
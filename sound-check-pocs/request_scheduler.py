@@ -0,0 +1,157 @@
+import math
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import requests
+
+
+def retry_after_seconds(value, default=1.0, maximum=None):
+    """
+    Seconds to wait from a Retry-After header, which is either delay-seconds or an HTTP-date.
+    Missing, unparseable and non-finite values ("inf", "nan") give default; the result is
+    clamped to maximum when one is given.
+    """
+    seconds = default
+    if value is not None:
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                retry_at = parsedate_to_datetime(value)
+            except (TypeError, ValueError):
+                retry_at = None
+            if retry_at is not None:
+                if retry_at.tzinfo is None:
+                    retry_at = retry_at.replace(tzinfo=timezone.utc)
+                seconds = (retry_at - datetime.now(timezone.utc)).total_seconds()
+        if not math.isfinite(seconds):
+            seconds = default
+    seconds = max(0.0, seconds)
+    return min(seconds, maximum) if maximum is not None else seconds
+
+
+class RequestScheduler:
+    """
+    Central scheduler every SpotifyWebApi request goes through.
+
+    A token bucket shared by all threads keeps the request rate under budget, a 429 pauses every
+    caller until its Retry-After has passed, and 5xx responses and connection errors are retried
+    with jittered exponential backoff.
+
+    The budget adapts to what the API actually allows: every successful response raises the rate
+    by rate_step requests/second up to max_rate, and every 429 halves it (down to min_rate). The
+    starting rate, burst and ceiling default to SPOTIFY_REQUEST_RATE, SPOTIFY_REQUEST_BURST and
+    SPOTIFY_MAX_REQUEST_RATE.
+    """
+
+    def __init__(self, rate=None, burst=None, max_retries=5, backoff_base=1.0, backoff_max=30.0,
+                 max_rate=None, min_rate=1.0, rate_step=1.0):
+        self.rate = float(rate or os.getenv("SPOTIFY_REQUEST_RATE") or 10.0)
+        self.burst = int(burst or os.getenv("SPOTIFY_REQUEST_BURST") or 20)
+        self.max_rate = max(self.rate, float(max_rate or os.getenv("SPOTIFY_MAX_REQUEST_RATE") or 100.0))
+        self.min_rate = min(min_rate, self.rate)
+        self.rate_step = rate_step
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "throttled": 0, "retried": 0, "failed": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def reserve(self):
+        """
+        Take one request from the budget without blocking.
+
+        Returns:
+            0.0 when the request may be sent now, otherwise seconds to wait before calling again
+            (AsyncSpotifyWebApi awaits this instead of sleeping a thread)
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+    def succeeded(self):
+        """A request went through: probe for more throughput by raising the rate a step."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.rate_step)
+
+    def block(self, seconds):
+        """Pause every caller for seconds (a 429's Retry-After) and halve the rate."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def _acquire(self):
+        while True:
+            wait = self.reserve()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    def _backoff(self, attempt):
+        # Full jitter: uniform in [0, base * 2^attempt], capped
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def send(self, send_request):
+        """
+        Send a request, retrying throttled and failed attempts.
+
+        Args:
+            send_request: Callable with no arguments that performs the request and returns a requests.Response
+
+        Returns:
+            The final response, which is non-2xx only if retries were exhausted or the error is not retryable
+        """
+        attempt = 0
+        while True:
+            self._acquire()
+            self._count("requests")
+            try:
+                response = send_request()
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    self._count("failed")
+                    raise
+                self._count("retried")
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+
+            if response.status_code == 429 and attempt < self.max_retries:
+                retry_after = retry_after_seconds(response.headers.get("Retry-After"), maximum=self.backoff_max)
+                self._count("throttled")
+                self.block(retry_after)
+                attempt += 1
+                continue
+            if response.status_code >= 500 and attempt < self.max_retries:
+                self._count("retried")
+                time.sleep(self._backoff(attempt))
+                attempt += 1
+                continue
+            if response.status_code == 429 or response.status_code >= 500:
+                self._count("failed")
+            else:
+                self.succeeded()
+            return response
+
+    def summary(self):
+        return (
+            f"{self.stats['requests']} requests, {self.stats['throttled']} throttled, "
+            f"{self.stats['retried']} retried, {self.stats['failed']} failed"
+        )
@@ -0,0 +1,163 @@
+# Eli Dow
+# January 2026
+# SoundCheck POC - Time every POC stage offline against a fake Spotify API and compare with earlier runs
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from fake_spotify_server import FakeSpotifyServer, SyntheticLibrary
+from library_store import SYNC_SCOPE
+from stage_timer import STAGES
+from token_manager import create_token_manager
+
+# Get the directory where this script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PERSONAL_DATA = os.getenv("PERSONAL_DATA_PATH") or os.path.join(SCRIPT_DIR, "personal_data")
+
+# Label and script of every benchmarked run, in order. Syncing twice times a cold and a warm (cached) sync.
+SCRIPTS = [
+    ("sync-cold", "sync-library.py"),
+    ("sync-warm", "sync-library.py"),
+    ("poc1", "poc1-generate-playlist-song-stats.py"),
+    ("poc2", "poc2-generate-saved-data-stats.py"),
+    ("poc3", "poc3-generate-song-intersections.py"),
+    ("poc4", "poc4-list-playlist-song-time-stamps.py"),
+    ("poc5", "poc5-list-top-playlist-overlaps.py"),
+    ("poc6", "poc6-save-and-unsave-songs.py"),
+    ("poc7", "poc7-generate-favorite-songs.py"),
+]
+
+# Scope covering every benchmarked script, including poc6's library changes
+SCOPE = SYNC_SCOPE + " user-library-modify"
+
+# A stage is reported as a regression when it is this much slower than the previous run (and > 50ms slower)
+REGRESSION_THRESHOLD = 0.2
+REGRESSION_MIN_SECONDS = 0.05
+
+def prepare_workspace(file_path, library):
+    """Seed tokens so no script prompts for authorization, and the hand-written inputs poc7 needs."""
+    for directory in ("playlist-songs", "intersections", "favorite-songs"):
+        os.makedirs(os.path.join(file_path, directory), exist_ok=True)
+    create_token_manager(file_path).save({
+        "access_token": "fake-access", "refresh_token": "fake-refresh", "expires_in": 3600, "scope": SCOPE,
+    })
+    with open(os.path.join(file_path, "favorite-songs", "my-top-100.txt"), 'w', encoding='utf-8') as f:
+        f.write(f"Top 100 Favorite Songs: {datetime.now():%m/%d/%Y}\n")
+        for rank, index in enumerate(library.top["long_term"], start=1):
+            track = library.track(index)
+            f.write(f"{rank}) {track['name']} | {track['artists'][0]['name'].upper()}\n")
+
+def run_script(label, script, env, server):
+    """Run one script against the fake server and return its wall time, run summary stages and API traffic."""
+    summary_path = os.path.join(env["FILE_PATH"], f"summary-{label}.json")
+    requests_before, throttled_before, bytes_before = (server.stats[key] for key in ("requests", "throttled", "bytes"))
+    start_time = time.perf_counter()
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPT_DIR, script)], cwd=SCRIPT_DIR,
+                               env=dict(env, RUN_SUMMARY_FILE=summary_path), capture_output=True, text=True)
+    total = time.perf_counter() - start_time
+    if completed.returncode != 0:
+        print(f"  {label} failed ({completed.returncode}):\n{completed.stderr[-2000:]}")
+    summary = {}
+    if os.path.exists(summary_path):
+        with open(summary_path) as f:
+            summary = json.load(f)
+    return {
+        "returncode": completed.returncode,
+        "total": total,
+        "stages": summary.get("stages", {}),
+        "endpoints": summary.get("api", {}),
+        "requests": server.stats["requests"] - requests_before,
+        "throttled": server.stats["throttled"] - throttled_before,
+        "bytes": server.stats["bytes"] - bytes_before,
+    }
+
+def run_benchmark(config, labels):
+    """Serve a synthetic library of config["tracks"] tracks and run the selected scripts against it."""
+    print(f"\nBuilding a synthetic library of {config['tracks']} tracks...")
+    library = SyntheticLibrary(config["tracks"], seed=config["seed"])
+    server = FakeSpotifyServer(library, latency=config["latency"], jitter=config["jitter"],
+                               throttle_rate=config["throttle_rate"], retry_after=config["retry_after"],
+                               seed=config["seed"]).start()
+    results = {}
+    try:
+        with tempfile.TemporaryDirectory(prefix="soundcheck-bench-") as file_path:
+            file_path += os.path.sep
+            prepare_workspace(file_path, library)
+            env = dict(os.environ, FILE_PATH=file_path, PERSONAL_DATA_PATH=file_path,
+                       PLAYLIST_ID=library.playlists[0]["id"], SPOTIFY_API_URL=f"{server.url}/v1",
+                       SPOTIFY_ACCOUNTS_URL=server.url)
+            for label, script in SCRIPTS:
+                if label not in labels:
+                    continue
+                print(f"Running {label}...")
+                results[label] = run_script(label, script, env, server)
+    finally:
+        server.stop()
+    return results
+
+def previous_run(history, config):
+    """Most recent recorded run with the same library size and server settings."""
+    for run in reversed(history):
+        if run["config"] == config:
+            return run
+    return None
+
+def format_change(current, previous):
+    if previous is None:
+        return ""
+    change = (current - previous) / previous if previous else 0.0
+    flag = "  REGRESSION" if change > REGRESSION_THRESHOLD and current - previous > REGRESSION_MIN_SECONDS else ""
+    return f" ({previous:.2f}s before, {change:+.0%}){flag}"
+
+def print_comparison(config, results, previous):
+    print(f"\n{config['tracks']} tracks" + (f", compared with the run on {previous['run_at']}" if previous else ", no earlier run to compare with"))
+    for label, result in results.items():
+        previous_result = (previous or {}).get("results", {}).get(label)
+        status = "" if result["returncode"] == 0 else "  FAILED"
+        print(f"  {label}: {result['total']:.2f}s, {result['requests']} requests, {result['throttled']} throttled, "
+              f"{result['bytes'] / 1_000_000:.1f} MB{format_change(result['total'], (previous_result or {}).get('total'))}{status}")
+        for stage in STAGES:
+            if stage in result["stages"]:
+                before = ((previous_result or {}).get("stages") or {}).get(stage)
+                print(f"    {stage}: {result['stages'][stage]:.2f}s{format_change(result['stages'][stage], before)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the POC scripts against a local fake Spotify API")
+    parser.add_argument("scripts", nargs="*", help=f"Runs to benchmark (default: all of {', '.join(label for label, _ in SCRIPTS)})")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000], help="Synthetic library sizes in tracks (e.g. 1000 10000 100000)")
+    parser.add_argument("--latency", type=float, default=0.02, help="Seconds the fake API waits before every response")
+    parser.add_argument("--jitter", type=float, default=0.01, help="Up to this many extra seconds per response")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds sent with a 429")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--results", default=os.path.join(PERSONAL_DATA, "benchmarks", "results.jsonl"),
+                        help="JSON Lines file every run is appended to and compared against")
+    args = parser.parse_args()
+
+    labels = set(args.scripts or [label for label, _ in SCRIPTS])
+    history = []
+    if os.path.exists(args.results):
+        with open(args.results) as f:
+            history = [json.loads(line) for line in f if line.strip()]
+    os.makedirs(os.path.dirname(args.results) or ".", exist_ok=True)
+
+    for size in args.sizes:
+        config = {"tracks": size, "latency": args.latency, "jitter": args.jitter, "throttle_rate": args.throttle_rate,
+                  "retry_after": args.retry_after, "seed": args.seed}
+        results = run_benchmark(config, labels)
+        previous = previous_run(history, config)
+        print_comparison(config, results, previous)
+        run = {"run_at": datetime.now().isoformat(timespec="seconds"), "config": config, "results": results}
+        history.append(run)
+        with open(args.results, 'a') as f:
+            f.write(json.dumps(run) + "\n")
+
+    print(f"\nResults appended to {args.results}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+# Eli Dow
+# January 2026
+# SoundCheck POC - Regenerate every report, syncing once and skipping reports whose inputs are unchanged
+
+import argparse
+import os
+import time
+from dotenv import load_dotenv
+from library_store import load_library
+from report_pipeline import LIBRARY, Pipeline, Stage
+from report_records import records_path
+
+load_dotenv()
+filePath = os.getenv("FILE_PATH") or ""
+
+# Get the directory where this script is located
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PERSONAL_DATA = os.getenv("PERSONAL_DATA_PATH") or os.path.join(SCRIPT_DIR, "personal_data")
+
+def script(name):
+    return os.path.join(SCRIPT_DIR, name)
+
+def report(*parts):
+    return os.path.join(filePath, *parts)
+
+def with_records(report_path):
+    return [report_path, records_path(report_path)]
+
+INTERSECTIONS = [
+    "savedSongs.txt", "topSongs.txt", "savedSongsInTopSongs.txt", "savedSongsNotInTopSongs.txt",
+    "topSongsNotInSavedSongs.txt", "savedSongsInPlaylists.txt", "savedSongsNotInPlaylists.txt",
+    "playlistSongsNotInSavedSongs.txt", "remove-savedSongsNotInTopSongsOrPlaylists.txt",
+    "savedSongsNotInTopSongsButInPlaylists.txt", "savedSongsInTopSongsButNotInPlaylists.txt",
+    "add-unsavedSongsInTopSongsAndInMultiplePlaylists.txt", "topSongRanks.txt",
+]
+
+# Each report with what it reads and writes. poc6 changes the library, so it stays a manual step.
+STAGES = [
+    Stage("playlist-stats", script("poc1-generate-playlist-song-stats.py"), [LIBRARY], [
+        report("playlist-songs", "basicPlaylistStats.txt"),
+        *with_records(report("playlist-songs", "mostFrequentPlaylistSongs.txt")),
+        *with_records(report("playlist-songs", "mostFrequentPlaylistSongArtists.txt")),
+        *with_records(report("playlist-songs", "mostFrequentPlaylistSongAlbums.txt")),
+    ]),
+    Stage("saved-data", script("poc2-generate-saved-data-stats.py"), [LIBRARY], [
+        report("saved-data", "artists", "mostFrequentArtistsInSavedSongs.txt"),
+        report("saved-data", "albums", "mostFrequentAlbumsInSavedSongs.txt"),
+        report("saved-data", "songs", "savedSongsOrderedByPopularity.txt"),
+        report("saved-data", "songs", "savedSongsOrderedByDuration.txt"),
+        report("saved-data", "songs", "savedSongsOrderedByReleaseDate.txt"),
+        report("saved-data", "songs", "repeats.txt"),
+        report("saved-data", "albums", "savedAlbumsOrderedByTracks.txt"),
+        report("saved-data", "albums", "savedAlbumsOrderedBySavedTracks.txt"),
+        report("saved-data", "albums", "savedAlbumsOrderedByPopularity.txt"),
+        report("saved-data", "albums", "savedAlbumsOrderedByReleaseDate.txt"),
+    ]),
+    Stage("intersections", script("poc3-generate-song-intersections.py"), [LIBRARY], [
+        path for name in INTERSECTIONS for path in with_records(report("intersections", name))
+    ]),
+    Stage("timestamps", script("poc4-list-playlist-song-time-stamps.py"), [LIBRARY], [
+        report("playlistSongsWithTimestamps.txt"),
+    ]),
+    Stage("overlaps", script("poc5-list-top-playlist-overlaps.py"), [LIBRARY], [
+        report("playlistOverlaps.txt"),
+    ]),
+    Stage("genres", script("poc8-generate-genre-distributions.py"), [LIBRARY], [
+        *with_records(report("genres", "libraryGenres.txt")),
+        *with_records(report("genres", "playlistGenres.txt")),
+    ]),
+    Stage("favorites", script("poc7-generate-favorite-songs.py"), [
+        records_path(report("intersections", "savedSongs.txt")),
+        records_path(report("intersections", "savedSongsInPlaylists.txt")),
+        records_path(report("intersections", "topSongRanks.txt")),
+        os.path.join(PERSONAL_DATA, "favorite-songs", "my-top-100.txt"),
+    ], [
+        os.path.join(PERSONAL_DATA, "favorite-songs", "generated-favorite-songs.txt"),
+    ]),
+]
+
+def main():
+    parser = argparse.ArgumentParser(description="Regenerate SoundCheck reports")
+    parser.add_argument("stages", nargs="*", help=f"Reports to regenerate (default: all of {', '.join(stage.name for stage in STAGES)})")
+    parser.add_argument("--force", action="store_true", help="Rerun reports even if their inputs are unchanged")
+    args = parser.parse_args()
+    unknown = [name for name in args.stages if name not in {stage.name for stage in STAGES}]
+    if unknown:
+        parser.error(f"unknown reports {', '.join(unknown)} (choose from {', '.join(stage.name for stage in STAGES)})")
+
+    start_time = time.time()
+
+    # Sync (if stale) once up front so no report has to fetch or authenticate itself
+    library = load_library(filePath)
+    library_fingerprint = library.fingerprint()
+    library.close()
+
+    pipeline = Pipeline(STAGES, os.path.join(filePath, "cache", "pipeline-state.json"), library_fingerprint)
+    results = pipeline.run(args.stages or None, force=args.force)
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"\nComplete!")
+    for status in ("ran", "skipped", "failed"):
+        names = [name for name, result in results.items() if result == status]
+        print(f"{status.capitalize()}: {len(names)}" + (f" ({', '.join(sorted(names))})" if names else ""))
+    print(f"Total time: {total_time:.2f} seconds")
+
+if __name__ == "__main__":
+    main()
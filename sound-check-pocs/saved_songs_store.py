@@ -0,0 +1,52 @@
+import os
+from datetime import datetime, timedelta
+from json_codec import dumps, loads
+
+
+class SavedSongsStore:
+    """
+    Local copy of the user's saved songs (/me/tracks items, newest first).
+
+    Incremental syncs only prepend newly saved songs, so removals are caught by a periodic
+    full reconciliation every full_sync_days.
+    """
+
+    def __init__(self, path, full_sync_days=7):
+        self.path = path
+        self.full_sync_interval = timedelta(days=full_sync_days)
+        self.items = []
+        self.last_full_sync = None
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                data = loads(f.read())
+            self.items = data.get("items", [])
+            if data.get("last_full_sync"):
+                self.last_full_sync = datetime.fromisoformat(data["last_full_sync"])
+
+    def needs_full_sync(self):
+        return self.last_full_sync is None or datetime.now() - self.last_full_sync >= self.full_sync_interval
+
+    def known_keys(self):
+        """(track ID, added_at) pairs already stored; the first one seen while paging is the sync boundary."""
+        return {song_key(item) for item in self.items}
+
+    def save(self, items, full_sync=False):
+        self.items = items
+        if full_sync:
+            self.last_full_sync = datetime.now()
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        data = {
+            "last_full_sync": self.last_full_sync.isoformat() if self.last_full_sync else None,
+            "items": items
+        }
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(dumps(data))
+        os.replace(tmp_path, self.path)
+
+
+def song_key(item):
+    track = item.get("track") or {}
+    return (track.get("id"), item.get("added_at"))
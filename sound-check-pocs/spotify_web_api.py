@@ -4,16 +4,141 @@ import urllib.parse
 import base64
 import hashlib
 import secrets
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice, repeat
+from requests.adapters import HTTPAdapter
 from dotenv import load_dotenv
+from instrumentation import api_metrics, endpoint_name
+from json_codec import loads
+from library_mutations import MutationPlan, batches
+from saved_songs_store import song_key
+from request_scheduler import RequestScheduler
+from track_model import decode_item_page
+
+# Spotify endpoints; SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL point the clients somewhere else (e.g. fake_spotify_server)
+API_URL = "https://api.spotify.com/v1"
+ACCOUNTS_URL = "https://accounts.spotify.com"
+
+# Spotify returns at most 100 playlist track items per page
+PLAYLIST_TRACKS_PAGE_LIMIT = 100
+
+# Market sent with saved songs requests; with a market Spotify leaves each track's available_markets list out
+DEFAULT_MARKET = "ES"
+# Every time range the top tracks endpoint has: ~4 weeks, ~6 months and about a year
+TIME_RANGES = ["short_term", "medium_term", "long_term"]
+# Safety cap on pages followed through next links (50 items each, well past Spotify's library limits)
+MAX_PAGES = 1000
+
+def playlist_fields(item_fields):
+    """
+    fields values for the playlist and playlist tracks endpoints that keep only item_fields of each track
+    item (Spotify's fields syntax, e.g. "added_at,track(id,name)"), or (None, None) for full objects.
+    """
+    if not item_fields:
+        return None, None
+    page_fields = f"limit,total,items({item_fields})"
+    return f"id,name,snapshot_id,tracks({page_fields})", page_fields
+
+def _item_dicts(raw):
+    page = loads(raw)
+    return page["items"], page["total"]
+
+# Playlists left out unless EXCLUDED_PLAYLISTS says otherwise
+DEFAULT_EXCLUDED_PLAYLISTS = ["On Repeat 🎧"]
+
+class PlaylistFilter:
+    """
+    Which playlists get_playlists returns: those owned by one of owners (Spotify user IDs or display
+    names) and not named in excluded. Without owners, the authorized user's own playlists.
+    """
+    def __init__(self, owners=None, excluded=None):
+        self.owners = set(owners or [])
+        self.excluded = set(DEFAULT_EXCLUDED_PLAYLISTS if excluded is None else excluded)
+
+    @classmethod
+    def from_env(cls):
+        """Filter from PLAYLIST_OWNERS and EXCLUDED_PLAYLISTS (comma-separated); unset variables keep the defaults."""
+        def names(value):
+            return [name.strip() for name in value.split(",") if name.strip()] if value is not None else None
+        return cls(names(os.getenv("PLAYLIST_OWNERS")), names(os.getenv("EXCLUDED_PLAYLISTS")))
+
+    def includes(self, playlist, current_user_id=None):
+        owner = playlist.get("owner") or {}
+        owners = self.owners or {current_user_id}
+        return (owner.get("id") in owners or owner.get("display_name") in owners) and playlist.get("name") not in self.excluded
+
+class SpotifyApiError(Exception):
+    """Raised when the Spotify Web API returns an error status that retries could not recover."""
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
 
 class SpotifyWebApi:
-    def __init__(self, client_id=None, redirect_uri=None, scope=None):
+    def __init__(self, client_id=None, redirect_uri=None, scope=None, max_workers=8, pool_size=None,
+                 timeout=(5, 30), playlist_cache=None, saved_songs_store=None, scheduler=None, token_manager=None,
+                 metadata_cache=None, api_url=None, accounts_url=None, metrics=None, playlist_filter=None):
         load_dotenv()
         self.client_id = client_id or os.getenv("CLIENT_ID")
         self.redirect_uri = redirect_uri or os.getenv("REDIRECT_URI")
+        self.api_url = (api_url or os.getenv("SPOTIFY_API_URL") or API_URL).rstrip("/")
+        self.accounts_url = (accounts_url or os.getenv("SPOTIFY_ACCOUNTS_URL") or ACCOUNTS_URL).rstrip("/")
         self.scope = scope
         self.access_token = None
         self.refresh_token = None
+        # Upper bound on concurrent requests for playlist fetching (1 = serial)
+        self.max_workers = max(1, max_workers)
+        # (connect, read) timeout in seconds applied to every request
+        self.timeout = timeout
+        # One keep-alive session for every call, pooled so concurrent fetches reuse connections
+        pool_size = pool_size or max(10, self.max_workers)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        # Optional PlaylistCache; playlists whose snapshot_id is unchanged are served from disk
+        self.playlist_cache = playlist_cache
+        # Optional SavedSongsStore; get_saved_songs then only pages until it reaches known songs
+        self.saved_songs_store = saved_songs_store
+        # Shared rate limiter/retry policy; its stats count throttled and retried requests
+        self.scheduler = scheduler or RequestScheduler()
+        # Optional MetadataCache; albums and artists fetched within their TTL are not requested again
+        self.metadata_cache = metadata_cache
+        # Optional TokenManager; tokens are persisted, reused across runs and refreshed when they expire
+        self.token_manager = token_manager
+        if token_manager:
+            # Refresh over the same pooled session and request budget as every API call
+            token_manager.session = self.session
+            token_manager.scheduler = self.scheduler
+        # Per-endpoint request counts, bytes, latency histograms and retries (process-wide by default)
+        self.metrics = metrics or api_metrics
+        # Which playlists get_playlists returns (PLAYLIST_OWNERS / EXCLUDED_PLAYLISTS by default)
+        self.playlist_filter = playlist_filter or PlaylistFilter.from_env()
+        self._current_user_id = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def _request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        endpoint = endpoint_name(method, url)
+        response = self.scheduler.send(self.metrics.timed(endpoint, lambda: self.session.request(method, url, **kwargs)))
+        headers = kwargs.get("headers") or {}
+        if response.status_code == 401 and self.token_manager and "Authorization" in headers:
+            # The access token was revoked or expired early; refresh it and retry once
+            rejected_token = headers["Authorization"].split(" ", 1)[-1]
+            access_token = self.token_manager.get_access_token(rejected_token=rejected_token)
+            if access_token and access_token != rejected_token:
+                self.access_token = access_token
+                kwargs["headers"] = dict(headers, Authorization=f"Bearer {access_token}")
+                response = self.scheduler.send(self.metrics.timed(endpoint, lambda: self.session.request(method, url, **kwargs)))
+        return response
 
     @staticmethod
     def generate_code_verifier():
@@ -33,10 +158,10 @@ class SpotifyWebApi:
             "code_challenge_method": "S256",
             "code_challenge": code_challenge
         }
-        return "https://accounts.spotify.com/authorize?" + urllib.parse.urlencode(params)
+        return f"{self.accounts_url}/authorize?" + urllib.parse.urlencode(params)
 
     def get_token_pkce(self, authorization_code, code_verifier):
-        url = "https://accounts.spotify.com/api/token"
+        url = f"{self.accounts_url}/api/token"
         data = {
             "client_id": self.client_id,
             "grant_type": "authorization_code",
@@ -44,114 +169,398 @@ class SpotifyWebApi:
             "redirect_uri": self.redirect_uri,
             "code_verifier": code_verifier
         }
-        token_response = requests.post(url, data=data)
+        token_response = self._request("POST", url, data=data)
         if token_response.status_code != 200:
-            raise Exception(f"Failed to get access token: {token_response.status_code}, {token_response.text}")
-        tokens = token_response.json()
+            raise SpotifyApiError(f"Failed to get access token: {token_response.status_code}, {token_response.text}", token_response.status_code)
+        tokens = loads(token_response.content)
         self.access_token = tokens["access_token"]
         self.refresh_token = tokens.get("refresh_token")
+        if self.token_manager:
+            self.token_manager.save(dict(tokens, scope=tokens.get("scope") or self.scope or ""))
         return tokens
 
+    def authorize(self):
+        """
+        Authorize with stored tokens when the token manager has them for this scope, otherwise run the
+        interactive PKCE flow (and store the new tokens when there is a token manager).
+        """
+        if self.token_manager:
+            try:
+                if self.token_manager.has_scope(self.scope):
+                    self.access_token = self.token_manager.get_access_token()
+                    if self.access_token:
+                        return
+            except Exception as e:
+                print(f"Stored tokens could not be used ({e}), authorizing again...")
+            # Also ask for the scopes already granted so the stored tokens keep working for other scripts
+            tokens = self.token_manager.load() or {}
+            self.scope = " ".join(sorted(set((self.scope or "").split()) | set(tokens.get("scope", "").split())))
+
+        code_verifier = self.generate_code_verifier()
+        code_challenge = self.generate_code_challenge(code_verifier)
+        authorization_url = self.get_authorization_url(code_challenge)
+        print("Go to this URL and authorize the app:\n", authorization_url)
+        authorization_code = input("Enter the code from the redirect URL: ").strip()
+        self.get_token_pkce(authorization_code, code_verifier)
+
     def _get_headers(self):
+        if self.token_manager:
+            self.access_token = self.token_manager.get_access_token() or self.access_token
         if not self.access_token:
             raise Exception("Access token not set. Authenticate first.")
         return {"Authorization": f"Bearer {self.access_token}"}
 
+    def get_current_user_id(self):
+        """Spotify user ID of the authorized user, looked up once."""
+        if self._current_user_id is None:
+            response = self._request("GET", f"{self.api_url}/me", headers=self._get_headers())
+            if response.status_code != 200:
+                raise SpotifyApiError(f"Failed to get current user: {response.status_code}, {response.text}", response.status_code)
+            self._current_user_id = loads(response.content)["id"]
+        return self._current_user_id
+
     def get_playlists(self):
-        playlists = []
-        url = "https://api.spotify.com/v1/me/playlists"
+        return list(self.iter_playlists())
+
+    def iter_playlists(self):
+        """Yield the user's playlists that pass the playlist filter, page by page."""
+        url = f"{self.api_url}/me/playlists"
         params = {"limit": 50, "offset": 0}
-        while url:
-            response = requests.get(url, headers=self._get_headers(), params=params)
+        user_id = None if self.playlist_filter.owners else self.get_current_user_id()
+        pages = 0
+        while url and pages < MAX_PAGES:
+            response = self._request("GET", url, headers=self._get_headers(), params=params)
             if response.status_code != 200:
-                raise Exception(f"Failed to get playlists: {response.status_code}, {response.text}")
-            data = response.json()
-            items = data['items']
-            # Only include playlists owned by 'eliasjohnsondow' and not named 'On Repeat 🎧'
-            items = [pl for pl in items if pl['owner']['display_name'] == 'eliasjohnsondow' and pl['name'] != 'On Repeat 🎧']
-            playlists.extend(items)
+                raise SpotifyApiError(f"Failed to get playlists: {response.status_code}, {response.text}", response.status_code)
+            data = loads(response.content)
+            yield from (pl for pl in data['items'] if self.playlist_filter.includes(pl, user_id))
             url = data.get('next')
-        return playlists
+            # The next URL carries its own offset and limit
+            params = None
+            pages += 1
+
+    def iter_playlist(self, playlist_id, item_fields=None):
+        """
+        Yield a playlist's track items in order as their pages arrive.
+
+        Later pages are requested concurrently but at most max_workers pages ahead of the consumer,
+        so only a bounded number of pages is held in memory. Bypasses the playlist cache.
+        item_fields limits each item to those fields (see playlist_fields).
+        """
+        for page_items in self._iter_playlist_pages(playlist_id, item_fields, _item_dicts):
+            yield from page_items
+
+    def iter_playlist_items(self, playlist_id, item_fields=None):
+        """
+        Same as iter_playlist, but yields TrackItems decoded straight from each page's bytes
+        (see track_model.decode_item_page) instead of track item dicts.
+        """
+        tracks = {}
+        for page_items in self._iter_playlist_pages(playlist_id, item_fields, lambda raw: decode_item_page(raw, tracks)):
+            yield from page_items
+
+    def _iter_playlist_pages(self, playlist_id, item_fields, decode_page):
+        """Yield each page's items in order, decode_page(raw) -> (items, total) running in the fetching threads."""
+        _, page_fields = playlist_fields(item_fields)
+        limit = PLAYLIST_TRACKS_PAGE_LIMIT
+
+        def fetch(offset):
+            return decode_page(self._get_playlist_tracks_raw(playlist_id, offset, limit, page_fields))
+
+        first_items, total = fetch(0)
+        offsets = iter(range(len(first_items), total, limit))
+        yield first_items
+        del first_items
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque(executor.submit(fetch, offset) for offset in islice(offsets, self.max_workers))
+            while pending:
+                page_items, _ = pending.popleft().result()
+                # Keep the window full while the consumer works through this page
+                for offset in islice(offsets, 1):
+                    pending.append(executor.submit(fetch, offset))
+                yield page_items
+
+    def get_playlist(self, playlist_id, snapshot_id=None, item_fields=None):
+        return self.get_playlists_data([playlist_id], [snapshot_id], item_fields)[0]
+
+    def get_playlists_data(self, playlist_ids, snapshot_ids=None, item_fields=None):
+        """
+        Retrieve full playlist objects, including every track item, for a list of playlists.
+
+        The first page of every playlist is fetched concurrently, the remaining page offsets are
+        computed up front from tracks.total, and those pages are fetched concurrently as well.
+        Pages are merged back in offset order, so tracks.items matches walking the tracks.next cursor.
+        When a playlist cache is set, playlists whose snapshot_id is unchanged are not refetched.
+
+        Args:
+            playlist_ids: List of Spotify playlist IDs
+            snapshot_ids: Optional list of current snapshot IDs (as returned by get_playlists),
+                looked up from the API when missing and a playlist cache is set
+            item_fields: Optional projection of each track item (see playlist_fields); the playlist
+                keeps only id, name, snapshot_id and tracks. Cached playlists are only served to
+                calls asking for the same projection.
+
+        Returns:
+            List of playlist objects in the same order as playlist_ids
+        """
+        if not playlist_ids:
+            return []
+        snapshot_ids = list(snapshot_ids or [None] * len(playlist_ids))
+        first_fields, page_fields = playlist_fields(item_fields)
+        playlists_data = [None] * len(playlist_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            if self.playlist_cache:
+                unknown = [i for i, snapshot_id in enumerate(snapshot_ids) if not snapshot_id]
+                looked_up = executor.map(self._get_playlist_snapshot_id, [playlist_ids[i] for i in unknown])
+                for index, snapshot_id in zip(unknown, looked_up):
+                    snapshot_ids[index] = snapshot_id
+                for index, playlist_id in enumerate(playlist_ids):
+                    playlists_data[index] = self.playlist_cache.get(playlist_id, snapshot_ids[index], item_fields)
+
+            fetch_indexes = [i for i, playlist_data in enumerate(playlists_data) if playlist_data is None]
+            first_pages = executor.map(self._get_playlist_first_page, [playlist_ids[i] for i in fetch_indexes], repeat(first_fields))
+            for index, playlist_data in zip(fetch_indexes, first_pages):
+                playlists_data[index] = playlist_data
+
+            # Compute every remaining (playlist, offset) page across the playlists being fetched
+            page_indexes, page_ids, page_offsets, page_limits = [], [], [], []
+            for index in fetch_indexes:
+                tracks = playlists_data[index]["tracks"]
+                limit = tracks.get("limit") or PLAYLIST_TRACKS_PAGE_LIMIT
+                for offset in range(len(tracks["items"]), tracks["total"], limit):
+                    page_indexes.append(index)
+                    page_ids.append(playlist_ids[index])
+                    page_offsets.append(offset)
+                    page_limits.append(limit)
+
+            # executor.map yields in submission order, which is already offset order per playlist
+            pages = executor.map(self._get_playlist_tracks_page, page_ids, page_offsets, page_limits, repeat(page_fields))
+            for index, page_items in zip(page_indexes, pages):
+                playlists_data[index]["tracks"]["items"].extend(page_items)
+
+        if self.playlist_cache:
+            for index in fetch_indexes:
+                self.playlist_cache.put(playlists_data[index], item_fields)
+        return playlists_data
+
+    def _get_playlist_snapshot_id(self, playlist_id):
+        url = f"{self.api_url}/playlists/{playlist_id}"
+        response = self._request("GET", url, headers=self._get_headers(), params={"fields": "snapshot_id"})
+        if response.status_code != 200:
+            raise SpotifyApiError(f"Failed to get playlist snapshot: {response.status_code}, {response.text}", response.status_code)
+        return loads(response.content)["snapshot_id"]
+
+    def _get_playlist_first_page(self, playlist_id, fields=None):
+        url = f"{self.api_url}/playlists/{playlist_id}"
+        params = {"fields": fields} if fields else None
+        response = self._request("GET", url, headers=self._get_headers(), params=params)
+        if response.status_code != 200:
+            raise SpotifyApiError(f"Failed to get playlist: {response.status_code}, {response.text}", response.status_code)
+        return loads(response.content)
+
+    def _get_playlist_tracks_page(self, playlist_id, offset, limit, fields=None):
+        return loads(self._get_playlist_tracks_raw(playlist_id, offset, limit, fields))["items"]
 
-    def get_playlist(self, playlist_id):
-        url = f"https://api.spotify.com/v1/playlists/{playlist_id}"
-        response = requests.get(url, headers=self._get_headers())
+    def _get_playlist_tracks_raw(self, playlist_id, offset, limit, fields=None):
+        url = f"{self.api_url}/playlists/{playlist_id}/tracks"
+        params = {"offset": offset, "limit": limit}
+        if fields:
+            params["fields"] = fields
+        response = self._request("GET", url, headers=self._get_headers(), params=params)
         if response.status_code != 200:
-            raise Exception(f"Failed to get playlist: {response.status_code}, {response.text}")
-        playlist_data = response.json()
-        # Handle pagination for tracks
-        tracks = playlist_data["tracks"]
-        all_items = tracks["items"][:]
-        next_url = tracks.get("next")
-        while next_url:
-            track_response = requests.get(next_url, headers=self._get_headers())
-            if track_response.status_code != 200:
-                raise Exception(f"Failed to get playlist tracks: {track_response.status_code}, {track_response.text}")
-            track_data = track_response.json()
-            all_items.extend(track_data["items"])
-            next_url = track_data.get("next")
-        playlist_data["tracks"]["items"] = all_items
-        return playlist_data
-
-    def get_saved_songs(self):
-        saved_songs = []
-        url = "https://api.spotify.com/v1/me/tracks"
-        params = {"market": "ES", "limit": 50, "offset": 0}
-        while url:
-            response = requests.get(url, headers=self._get_headers(), params=params)
+            raise SpotifyApiError(f"Failed to get playlist tracks: {response.status_code}, {response.text}", response.status_code)
+        return response.content
+
+    def get_saved_songs(self, full_sync=False, market=DEFAULT_MARKET):
+        """
+        Retrieve the user's saved songs, newest first.
+
+        With a saved songs store, only songs saved since the last run are fetched: paging stops at the
+        first (track ID, added_at) already in the store. A full refetch replaces the store when
+        full_sync is set or the store's reconciliation interval has passed, which catches removals.
+        market is passed to iter_saved_songs.
+        """
+        store = self.saved_songs_store
+        if not store:
+            return list(self.iter_saved_songs(market=market))
+        if full_sync or store.needs_full_sync():
+            saved_songs = list(self.iter_saved_songs(market=market))
+            store.save(saved_songs, full_sync=True)
+            return saved_songs
+
+        new_songs = list(self.iter_saved_songs(known_keys=store.known_keys(), market=market))
+        # A re-saved song comes back with a new added_at, so drop its older stored entry
+        new_ids = {song_key(item)[0] for item in new_songs}
+        saved_songs = new_songs + [item for item in store.items if song_key(item)[0] not in new_ids]
+        store.save(saved_songs)
+        return saved_songs
+
+    def iter_saved_songs(self, known_keys=None, market=DEFAULT_MARKET):
+        """
+        Yield saved song items from the API page by page, newest first.
+
+        Args:
+            known_keys: Optional set of (track ID, added_at) pairs; iteration stops at the first one seen
+            market: Market code (or "from_token") tracks are relinked for; None returns every track's
+                available_markets list, which is most of each page
+        """
+        url = f"{self.api_url}/me/tracks"
+        params = {"limit": 50, "offset": 0}
+        if market:
+            params["market"] = market
+        pages = 0
+        while url and pages < MAX_PAGES:
+            response = self._request("GET", url, headers=self._get_headers(), params=params)
             if response.status_code != 200:
-                raise Exception(f"Failed to get saved songs: {response.status_code}, {response.text}")
-            data = response.json()
-            saved_songs.extend(data['items'])
+                raise SpotifyApiError(f"Failed to get saved songs: {response.status_code}, {response.text}", response.status_code)
+            data = loads(response.content)
+            for item in data['items']:
+                if known_keys and song_key(item) in known_keys:
+                    return
+                yield item
             url = data.get('next')
-        return saved_songs
+            # The next URL carries its own offset and limit
+            params = None
+            pages += 1
 
     def get_top_songs(self, time_range="medium_term"):  # time_range: short_term, medium_term, long_term
-        top_songs = []
-        url = "https://api.spotify.com/v1/me/top/tracks"
+        return list(self.iter_top_songs(time_range))
+
+    def iter_top_songs(self, time_range="medium_term"):
+        """Yield the user's top tracks for time_range page by page."""
+        url = f"{self.api_url}/me/top/tracks"
         params = {"time_range": time_range, "limit": 50, "offset": 0}
-        i = 0
-        while url and i < 100:
-            response = requests.get(url, headers=self._get_headers(), params=params)
+        pages = 0
+        while url and pages < MAX_PAGES:
+            response = self._request("GET", url, headers=self._get_headers(), params=params)
             if response.status_code != 200:
-                raise Exception(f"Failed to get top songs: {response.status_code}, {response.text}")
-            data = response.json()
-            top_songs.extend(data['items'])
+                raise SpotifyApiError(f"Failed to get top songs: {response.status_code}, {response.text}", response.status_code)
+            data = loads(response.content)
+            yield from data['items']
             url = data.get('next')
-            i += 1
-        return top_songs
+            # The next URL carries its own offset and limit
+            params = None
+            pages += 1
+
+    def get_top_songs_by_range(self, time_ranges=TIME_RANGES):
+        """Top tracks for every time range, fetched concurrently, as a dict of time_range -> track objects."""
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(time_ranges))) as executor:
+            return dict(zip(time_ranges, executor.map(self.get_top_songs, time_ranges)))
+
+    def _get_entity_batch(self, url, key, description, batch):
+        response = self._request("GET", url, headers=self._get_headers(), params={"ids": ",".join(batch)})
+        if response.status_code != 200:
+            raise SpotifyApiError(f"Failed to {description}: {response.status_code}, {response.text}", response.status_code)
+        return loads(response.content).get(key, [])
+
+    def _get_entities(self, kind, ids, url, batch_size, key, description):
+        """Fetch album or artist objects, serving fresh ones from the metadata cache and fetching the rest in concurrent batches."""
+        ids = list(ids)
+        if not ids:
+            return []
+        cached, missing = self.metadata_cache.get_many(kind, ids) if self.metadata_cache else ({}, ids)
+        id_batches = [missing[i:i + batch_size] for i in range(0, len(missing), batch_size)]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            fetched = [
+                entity for batch in executor.map(lambda batch: self._get_entity_batch(url, key, description, batch), id_batches)
+                for entity in batch
+            ]
+        if self.metadata_cache:
+            self.metadata_cache.put_many(kind, fetched)
+        entities = dict(cached)
+        entities.update((entity["id"], entity) for entity in fetched if entity)
+        # Same order as requested; unknown IDs come back as None, as from the API
+        return [entities.get(entity_id) for entity_id in ids]
 
     def get_albums(self, album_ids):
         """Retrieve one or more album objects by Spotify album IDs."""
-        if not album_ids:
-            return []
-        albums = []
-        for i in range(0, len(album_ids), 20):
-            batch = album_ids[i:i + 20]
-            url = "https://api.spotify.com/v1/albums"
-            params = {"ids": ",".join(batch)}
-            response = requests.get(url, headers=self._get_headers(), params=params)
-            if response.status_code != 200:
-                raise Exception(f"Failed to get albums: {response.status_code}, {response.text}")
-            data = response.json()
-            albums.extend(data.get('albums', []))
-        return albums
+        return self._get_entities("album", album_ids, f"{self.api_url}/albums", 20, "albums", "get albums")
 
     def get_artists(self, artist_ids):
         """Retrieve one or more artist objects by Spotify artist IDs."""
-        if not artist_ids:
-            return []
-        artists = []
-        for i in range(0, len(artist_ids), 50):
-            batch = artist_ids[i:i + 50]
-            url = "https://api.spotify.com/v1/artists"
-            params = {"ids": ",".join(batch)}
-            response = requests.get(url, headers=self._get_headers(), params=params)
+        return self._get_entities("artist", artist_ids, f"{self.api_url}/artists", 50, "artists", "get artists")
+
+    def _check_saved_batch(self, batch):
+        """Saved flags for up to 50 track IDs, or None when the check fails."""
+        try:
+            response = self._request("GET", f"{self.api_url}/me/tracks/contains",
+                                     headers=self._get_headers(), params={"ids": ",".join(batch)})
             if response.status_code != 200:
-                raise Exception(f"Failed to get artists: {response.status_code}, {response.text}")
-            data = response.json()
-            artists.extend(data.get('artists', []))
-        return artists
+                raise SpotifyApiError(f"Failed to check saved songs: {response.status_code}, {response.text}", response.status_code)
+            response_data = loads(response.content)
+            # The response can be either a list or a dict with 'contains' field
+            if isinstance(response_data, dict) and "contains" in response_data:
+                return response_data["contains"]
+            if isinstance(response_data, list):
+                return response_data
+            raise Exception(f"Unexpected response format: {type(response_data)}")
+        except Exception as e:
+            print(f"  Failed to check {len(batch)} songs - {type(e).__name__}: {str(e)}")
+            return None
+
+    def check_saved_songs(self, track_ids):
+        """
+        Check which songs are in the user's library, 50 IDs per request with batches sent concurrently.
+
+        Returns:
+            Dictionary of track ID -> True/False, or None for IDs whose batch could not be checked
+        """
+        track_ids = list(track_ids)
+        saved_flags = {}
+        id_batches = batches(track_ids)
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            for batch, flags in zip(id_batches, executor.map(self._check_saved_batch, id_batches)):
+                for j, track_id in enumerate(batch):
+                    saved_flags[track_id] = None if flags is None else bool(j < len(flags) and flags[j])
+        return saved_flags
+
+    def plan_library_changes(self, save_ids=(), unsave_ids=(), saved_ids=None):
+        """
+        Work out which songs actually need saving or unsaving, without changing anything.
+
+        Args:
+            save_ids: Track IDs to save
+            unsave_ids: Track IDs to unsave
+            saved_ids: Optional set of IDs known to be saved (e.g. a local saved songs snapshot);
+                membership is checked with /me/tracks/contains when omitted
+
+        Returns:
+            MutationPlan to inspect (dry run) or pass to apply_library_changes
+        """
+        save_ids, unsave_ids = list(save_ids), list(unsave_ids)
+        if saved_ids is not None:
+            saved_flags = {track_id: track_id in saved_ids for track_id in save_ids + unsave_ids}
+        else:
+            saved_flags = self.check_saved_songs(list(dict.fromkeys(save_ids + unsave_ids)))
+        return MutationPlan(save_ids, unsave_ids, saved_flags)
+
+    def _change_saved_batch(self, method, batch):
+        try:
+            response = self._request(method, f"{self.api_url}/me/tracks",
+                                     headers=self._get_headers(), json={"ids": batch})
+            if response.status_code == 200:
+                return True
+            print(f"  Failed to {method.lower()} {len(batch)} songs - {response.status_code}, {response.text}")
+        except Exception as e:
+            print(f"  Failed to {method.lower()} {len(batch)} songs - {type(e).__name__}: {str(e)}")
+        return False
+
+    def apply_library_changes(self, plan):
+        """
+        Send a MutationPlan's PUT/DELETE batches concurrently.
+
+        Returns:
+            (save result, unsave result) dictionaries shaped like save_songs and unsave_songs
+        """
+        save_result, unsave_result = plan.empty_results()
+        jobs = [("PUT", batch) for batch in plan.save_batches()] + [("DELETE", batch) for batch in plan.unsave_batches()]
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            outcomes = list(executor.map(lambda job: self._change_saved_batch(*job), jobs))
+        for (method, batch), succeeded in zip(jobs, outcomes):
+            result = save_result if method == "PUT" else unsave_result
+            result[("saved" if method == "PUT" else "unsaved") if succeeded else "failed"].extend(batch)
+        return save_result, unsave_result
 
     def save_songs(self, track_ids):
         """
@@ -165,75 +574,7 @@ class SpotifyWebApi:
         """
         if not track_ids:
             return {"saved": [], "already_saved": [], "failed": []}
-        
-        save_url = "https://api.spotify.com/v1/me/tracks"
-        check_url = "https://api.spotify.com/v1/me/tracks/contains"
-        headers = self._get_headers()
-        
-        result = {"saved": [], "already_saved": [], "failed": []}
-        
-        # Process in batches of 50 (Spotify API limit)
-        batch_size = 50
-        for i in range(0, len(track_ids), batch_size):
-            batch = track_ids[i:i+batch_size]
-            batch_num = i//batch_size + 1
-            
-            try:
-                # Check which songs are already saved
-                print(f"  Batch {batch_num}: Checking if {len(batch)} songs are already saved...")
-                check_response = requests.get(check_url, headers=headers, params={"ids": ",".join(batch)})
-                if check_response.status_code != 200:
-                    raise Exception(f"Failed to check saved songs: {check_response.status_code}, {check_response.text}")
-                
-                response_data = check_response.json()
-                print(f"  Batch {batch_num}: Got response type: {type(response_data).__name__}")
-                if isinstance(response_data, dict):
-                    print(f"  Batch {batch_num}: Response keys: {list(response_data.keys())}")
-                
-                # The response can be either a list or a dict with 'contains' field
-                if isinstance(response_data, dict) and "contains" in response_data:
-                    already_saved_flags = response_data["contains"]
-                elif isinstance(response_data, list):
-                    already_saved_flags = response_data
-                else:
-                    # If it's a dict without 'contains', try to use its values
-                    print(f"  Batch {batch_num}: Unexpected response format: {type(response_data).__name__}")
-                    print(f"  Batch {batch_num}: Full response: {response_data}")
-                    raise Exception(f"Unexpected response format: {type(response_data)}")
-                
-                print(f"  Batch {batch_num}: Got {len(already_saved_flags)} saved flags")
-                
-                # Separate tracks that are already saved from those that aren't
-                tracks_to_save = []
-                for j, track_id in enumerate(batch):
-                    if j < len(already_saved_flags) and already_saved_flags[j]:
-                        result["already_saved"].append(track_id)
-                    else:
-                        tracks_to_save.append(track_id)
-                
-                # Save tracks that aren't already saved
-                if tracks_to_save:
-                    print(f"  Batch {batch_num}: Saving {len(tracks_to_save)} new songs...")
-                    save_response = requests.put(
-                        save_url,
-                        headers=headers,
-                        json={"ids": tracks_to_save}
-                    )
-                    if save_response.status_code == 200:
-                        result["saved"].extend(tracks_to_save)
-                        print(f"  Batch {batch_num}: Successfully saved {len(tracks_to_save)} songs")
-                    else:
-                        result["failed"].extend(tracks_to_save)
-                        print(f"  Batch {batch_num}: Failed to save - {save_response.status_code}, {save_response.text}")
-                else:
-                    print(f"  Batch {batch_num}: All {len(batch)} songs were already saved")
-            except Exception as e:
-                result["failed"].extend(batch)
-                print(f"  Batch {batch_num}: Exception - {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-        
-        return result
+        return self.apply_library_changes(self.plan_library_changes(save_ids=track_ids))[0]
 
     def unsave_songs(self, track_ids):
         """
@@ -247,72 +588,4 @@ class SpotifyWebApi:
         """
         if not track_ids:
             return {"unsaved": [], "not_saved": [], "failed": []}
-        
-        unsave_url = "https://api.spotify.com/v1/me/tracks"
-        check_url = "https://api.spotify.com/v1/me/tracks/contains"
-        headers = self._get_headers()
-        
-        result = {"unsaved": [], "not_saved": [], "failed": []}
-        
-        # Process in batches of 50 (Spotify API limit)
-        batch_size = 50
-        for i in range(0, len(track_ids), batch_size):
-            batch = track_ids[i:i+batch_size]
-            batch_num = i//batch_size + 1
-            
-            try:
-                # Check which songs are saved
-                print(f"  Batch {batch_num}: Checking if {len(batch)} songs are saved...")
-                check_response = requests.get(check_url, headers=headers, params={"ids": ",".join(batch)})
-                if check_response.status_code != 200:
-                    raise Exception(f"Failed to check saved songs: {check_response.status_code}, {check_response.text}")
-                
-                response_data = check_response.json()
-                print(f"  Batch {batch_num}: Got response type: {type(response_data).__name__}")
-                if isinstance(response_data, dict):
-                    print(f"  Batch {batch_num}: Response keys: {list(response_data.keys())}")
-                
-                # The response can be either a list or a dict with 'contains' field
-                if isinstance(response_data, dict) and "contains" in response_data:
-                    saved_flags = response_data["contains"]
-                elif isinstance(response_data, list):
-                    saved_flags = response_data
-                else:
-                    # If it's a dict without 'contains', try to use its values
-                    print(f"  Batch {batch_num}: Unexpected response format: {type(response_data).__name__}")
-                    print(f"  Batch {batch_num}: Full response: {response_data}")
-                    raise Exception(f"Unexpected response format: {type(response_data)}")
-                
-                print(f"  Batch {batch_num}: Got {len(saved_flags)} saved flags")
-                
-                # Separate tracks that are saved from those that aren't
-                tracks_to_unsave = []
-                for j, track_id in enumerate(batch):
-                    if j < len(saved_flags) and saved_flags[j]:
-                        tracks_to_unsave.append(track_id)
-                    else:
-                        result["not_saved"].append(track_id)
-                
-                # Unsave tracks that are saved
-                if tracks_to_unsave:
-                    print(f"  Batch {batch_num}: Unsaving {len(tracks_to_unsave)} songs...")
-                    unsave_response = requests.delete(
-                        unsave_url,
-                        headers=headers,
-                        json={"ids": tracks_to_unsave}
-                    )
-                    if unsave_response.status_code == 200:
-                        result["unsaved"].extend(tracks_to_unsave)
-                        print(f"  Batch {batch_num}: Successfully unsaved {len(tracks_to_unsave)} songs")
-                    else:
-                        result["failed"].extend(tracks_to_unsave)
-                        print(f"  Batch {batch_num}: Failed to unsave - {unsave_response.status_code}, {unsave_response.text}")
-                else:
-                    print(f"  Batch {batch_num}: All {len(batch)} songs were not saved")
-            except Exception as e:
-                result["failed"].extend(batch)
-                print(f"  Batch {batch_num}: Exception - {type(e).__name__}: {str(e)}")
-                import traceback
-                traceback.print_exc()
-        
-        return result
+        return self.apply_library_changes(self.plan_library_changes(unsave_ids=track_ids))[1]
@@ -0,0 +1,49 @@
+import time
+
+# Stage names the scripts mark, in pipeline order
+STAGES = ["fetch", "parse", "aggregate", "write"]
+
+
+class StageTimer:
+    """
+    Wall time a script spends in each named stage (fetch, parse, aggregate, write).
+
+    mark(name) ends the running stage and starts name. A stage marked several times adds up,
+    so scripts that alternate between computing and writing reports still get one total per
+    stage. Time before the first mark (imports, startup) is not counted. count() adds to a
+    named counter of the running stage (e.g. rows read while parsing).
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.timings = {}
+        self.counters = {}
+        self._current = None
+        self._started = None
+
+    def mark(self, name):
+        now = time.perf_counter()
+        if self._current is not None:
+            self.timings[self._current] = self.timings.get(self._current, 0.0) + now - self._started
+        self._current = name
+        self._started = now
+
+    def count(self, name, amount=1):
+        stage_counters = self.counters.setdefault(self._current or "setup", {})
+        stage_counters[name] = stage_counters.get(name, 0) + amount
+
+    def stop(self):
+        """End the running stage and return the timings as a dict of stage -> seconds."""
+        self.mark(None)
+        return dict(self.timings)
+
+    def counter_totals(self):
+        """Counters as a dict of stage -> {counter: total}."""
+        return {stage: dict(counters) for stage, counters in self.counters.items()}
+
+
+timer = StageTimer()
+mark = timer.mark
+count = timer.count
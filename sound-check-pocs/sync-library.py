@@ -0,0 +1,39 @@
+# Eli Dow
+# January 2026
+# SoundCheck POC - Sync the local library store that every report reads from
+
+import asyncio
+import os
+import time
+from dotenv import load_dotenv
+from async_spotify_web_api import AsyncSpotifyWebApi
+from instrumentation import start_run, write_run_summary
+from library_store import LibraryStore, create_sync_api, sync_library_async
+
+load_dotenv()
+filePath = os.getenv("FILE_PATH")
+
+def main():
+    start_run()
+    start_time = time.time()
+
+    api = create_sync_api(filePath)
+    store = LibraryStore(os.path.join(filePath, "library.db"))
+    async_api = AsyncSpotifyWebApi.from_api(api)
+    asyncio.run(sync_library_async(async_api, store))
+    api.close()
+
+    end_time = time.time()
+    total_time = end_time - start_time
+    print(f"\nComplete!")
+    print(f"Synced {len(store.get_playlists())} playlists, {len(store.get_saved_items())} saved songs to {store.db_path}")
+    print(f"Playlist cache: {api.playlist_cache.summary()}")
+    print(f"Album/artist cache: {api.metadata_cache.summary()}")
+    print(f"API requests: {async_api.summary()}")
+    print(f"Total time: {total_time:.2f} seconds")
+    store.close()
+    clients = {"async": async_api.stats, "scheduler": api.scheduler.stats}
+    print(f"Run summary: {write_run_summary(filePath, __file__, api.metrics, clients)}")
+
+if __name__ == "__main__":
+    main()
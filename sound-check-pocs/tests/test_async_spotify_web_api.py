@@ -0,0 +1,78 @@
+import asyncio
+import threading
+
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from async_spotify_web_api import AsyncSpotifyWebApi
+from fake_spotify_server import FakeSpotifyServer, SyntheticLibrary, _id
+from request_scheduler import RequestScheduler
+
+
+class RotatingTokens:
+    """Token manager stand-in that hands out old-0 until a token is rejected, then new-1, new-2..."""
+
+    def __init__(self):
+        self.token = "old-0"
+        self.refreshes = 0
+        self._lock = threading.Lock()
+
+    def get_access_token(self, rejected_token=None):
+        with self._lock:
+            if rejected_token == self.token:
+                self.refreshes += 1
+                self.token = f"new-{self.refreshes}"
+            return self.token
+
+
+def test_concurrent_401s_refresh_once():
+    rejected = []
+
+    async def me(request):
+        if not request.headers["Authorization"].startswith("Bearer new-"):
+            # The first rejection comes back at once, the rest after the client has refreshed
+            rejected.append(request)
+            await asyncio.sleep(0 if len(rejected) == 1 else 0.2)
+            return web.json_response({"error": {"status": 401}}, status=401)
+        return web.json_response({"id": "user"})
+
+    async def run():
+        app = web.Application()
+        app.router.add_get("/v1/me", me)
+        async with TestServer(app) as server:
+            tokens = RotatingTokens()
+            async with AsyncSpotifyWebApi(None, api_url=str(server.make_url("/v1")), token_manager=tokens,
+                                          scheduler=RequestScheduler(rate=100, burst=100)) as client:
+                results = await asyncio.gather(*[client._request("GET", f"{client.api_url}/me", "get user")
+                                                 for _ in range(6)])
+            return tokens, results
+
+    tokens, results = asyncio.run(run())
+    assert results == [{"id": "user"}] * 6
+    # Every request sent old-0; the later rejections must not refresh the new token again
+    assert tokens.refreshes == 1
+
+
+def test_save_and_unsave_songs_use_the_plan():
+    library = SyntheticLibrary(200)
+    server = FakeSpotifyServer(library).start()
+    saved = library.saved_ids()
+    saved_ids = [_id("tr", index) for index in range(library.track_count) if index in saved][:3]
+    unsaved_ids = [_id("tr", index) for index in range(library.track_count) if index not in saved][:3]
+
+    async def run():
+        async with AsyncSpotifyWebApi("test", api_url=f"{server.url}/v1") as client:
+            saved_result = await client.save_songs(unsaved_ids + saved_ids)
+            unsaved_result = await client.unsave_songs(unsaved_ids + ["tr-not-a-track"])
+            plan = await client.plan_library_changes(save_ids=unsaved_ids, saved_ids=set())
+            return saved_result, unsaved_result, plan, client.stats["requests"]
+
+    try:
+        saved_result, unsaved_result, plan, requests = asyncio.run(run())
+    finally:
+        server.stop()
+    assert saved_result == {"saved": unsaved_ids, "already_saved": saved_ids, "failed": []}
+    assert unsaved_result == {"unsaved": unsaved_ids, "not_saved": ["tr-not-a-track"], "failed": []}
+    assert plan.to_save == unsaved_ids
+    # One contains check and one PUT or DELETE per call; planning from saved_ids sends nothing
+    assert requests == 4
@@ -0,0 +1,87 @@
+from fake_spotify_server import SyntheticLibrary
+from frequency_engine import FrequencyEngine
+from track_model import Track
+
+
+def baseline_counts(playlists):
+    """The dict-of-dict counting poc1 did before FrequencyEngine, over (title, raw items) pairs."""
+    song_freq, artist_freq, album_freq = {}, {}, {}
+    for title, items in playlists:
+        for item in items:
+            track = item.get("track")
+            if not track or not track.get("id"):
+                continue
+            song_id = track["id"]
+            song_name = track["name"]
+            artist_name = track["artists"][0]["name"] if track["artists"] else "Unknown"
+            artist_id = track["artists"][0]["id"] if track["artists"] else "Unknown"
+            album_name = track["album"]["name"] if track.get("album") else "Unknown"
+            album_id = track["album"]["id"] if track.get("album") else "Unknown"
+
+            if song_id in song_freq:
+                song_freq[song_id]["count"] += 1
+                song_freq[song_id]["playlists"].add(title)
+            else:
+                song_freq[song_id] = {"count": 1, "name": song_name, "artist": artist_name, "id": song_id,
+                                      "playlists": {title}}
+            artist_key = (artist_id, artist_name)
+            if artist_key in artist_freq:
+                artist_freq[artist_key]["count"] += 1
+                artist_freq[artist_key]["playlists"][title] = artist_freq[artist_key]["playlists"].get(title, 0) + 1
+            else:
+                artist_freq[artist_key] = {"count": 1, "id": artist_id, "name": artist_name, "playlists": {title: 1}}
+            album_key = (album_id, album_name)
+            if album_key in album_freq:
+                album_freq[album_key]["count"] += 1
+                album_freq[album_key]["playlists"][title] = album_freq[album_key]["playlists"].get(title, 0) + 1
+            else:
+                album_freq[album_key] = {"count": 1, "id": album_id, "name": album_name, "artist": artist_name,
+                                         "playlists": {title: 1}}
+    return list(song_freq.values()), list(artist_freq.values()), list(album_freq.values())
+
+
+def ranked(rows):
+    # The sort poc1 writes its reports in; stable, so ties keep first-seen order
+    return sorted(rows, key=lambda row: (-row["count"], row["name"]))
+
+
+def library_playlists():
+    library = SyntheticLibrary(500, seed=3)
+    playlists = [(playlist["name"], [{"track": library.track(index)} for index, _ in playlist["items"]])
+                 for playlist in library.playlists]
+    # Edge cases: removed and local tracks, a song repeated in one playlist, no album or artists,
+    # and an artist and album that show up under a second name
+    renamed = library.track(0)
+    renamed["artists"][0] = dict(renamed["artists"][0], name="Renamed Artist")
+    renamed["album"] = dict(renamed["album"], name="Renamed Album")
+    renamed["id"] = "renamed"
+    bare = {"id": "bare", "name": "Bare", "artists": [], "album": None}
+    playlists.append(("Edge Cases", [
+        {"track": None}, {"track": dict(library.track(1), id=None)}, {"track": library.track(2)},
+        {"track": library.track(2)}, {"track": bare}, {"track": renamed}, {"track": library.track(0)},
+    ]))
+    return playlists
+
+
+def test_counts_match_baseline_poc1():
+    playlists = library_playlists()
+    engine = FrequencyEngine()
+    for title, items in playlists:
+        for item in items:
+            engine.add(Track.from_api(item["track"]), title)
+    songs, artists, albums = baseline_counts(playlists)
+
+    engine_songs = [dict(row, playlists=set(row["playlists"])) for row in engine.song_rows()]
+    assert ranked(engine_songs) == ranked(songs)
+    assert ranked(engine.artist_rows()) == ranked(artists)
+    assert ranked(engine.album_rows()) == ranked(albums)
+
+
+def test_song_counts_per_playlist():
+    engine = FrequencyEngine()
+    track = Track("t1", "Song", "ar1", "Artist", "al1", "Album")
+    engine.add_rows([("A", track), ("A", track), ("B", track), ("B", None)])
+    engine.add(track)
+    (row,) = engine.song_rows()
+    assert row["count"] == 4
+    assert row["playlists"] == {"A": 2, "B": 1}
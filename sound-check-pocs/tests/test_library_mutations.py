@@ -0,0 +1,86 @@
+import pytest
+
+from fake_spotify_server import FakeSpotifyServer, SyntheticLibrary, _id
+from library_mutations import LIBRARY_BATCH_SIZE, MutationPlan, batches
+from spotify_web_api import SpotifyWebApi
+
+
+def test_plan_sorts_ids_by_saved_flag():
+    plan = MutationPlan(["a", "b", "c", "a"], ["d", "e", "f"],
+                        {"a": False, "b": True, "c": None, "d": True, "e": False})
+    assert plan.save_ids == ["a", "b", "c"]
+    assert plan.to_save == ["a"]
+    assert plan.already_saved == ["b"]
+    assert plan.to_unsave == ["d"]
+    assert plan.not_saved == ["e"]
+    assert plan.unchecked == {"c", "f"}
+
+
+def test_empty_results_hold_decisions_made_without_requests():
+    plan = MutationPlan(["a", "b", "c"], ["d", "e", "f"],
+                        {"a": False, "b": True, "c": None, "d": True, "e": False})
+    save_result, unsave_result = plan.empty_results()
+    assert save_result == {"saved": [], "already_saved": ["b"], "failed": ["c"]}
+    assert unsave_result == {"unsaved": [], "not_saved": ["e"], "failed": ["f"]}
+
+
+def test_batches_respect_the_api_limit():
+    ids = [str(i) for i in range(2 * LIBRARY_BATCH_SIZE + 1)]
+    plan = MutationPlan(ids, [], dict.fromkeys(ids, False))
+    assert [len(batch) for batch in plan.save_batches()] == [LIBRARY_BATCH_SIZE, LIBRARY_BATCH_SIZE, 1]
+    assert plan.unsave_batches() == []
+    assert batches([]) == []
+    assert plan.summary().startswith(f"save {len(ids)} songs in 3 requests (0 already saved)")
+
+
+@pytest.fixture
+def server():
+    server = FakeSpotifyServer(SyntheticLibrary(200)).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def api(server):
+    api = SpotifyWebApi(api_url=f"{server.url}/v1", accounts_url=server.url)
+    api.access_token = "test"
+    yield api
+    api.close()
+
+
+def split_by_saved(library, count):
+    saved = library.saved_ids()
+    saved_ids = [_id("tr", index) for index in range(library.track_count) if index in saved][:count]
+    unsaved_ids = [_id("tr", index) for index in range(library.track_count) if index not in saved][:count]
+    return saved_ids, unsaved_ids
+
+
+def test_save_and_unsave_songs(server, api):
+    saved_ids, unsaved_ids = split_by_saved(server.library, 3)
+
+    result = api.save_songs(unsaved_ids + saved_ids)
+    assert result == {"saved": unsaved_ids, "already_saved": saved_ids, "failed": []}
+    assert {_id("tr", index) for index in server.library.saved_ids()} >= set(unsaved_ids)
+
+    result = api.unsave_songs(unsaved_ids)
+    assert result == {"unsaved": unsaved_ids, "not_saved": [], "failed": []}
+    result = api.unsave_songs(unsaved_ids)
+    assert result == {"unsaved": [], "not_saved": unsaved_ids, "failed": []}
+
+
+def test_plan_from_local_snapshot_skips_contains(server, api):
+    saved_ids, unsaved_ids = split_by_saved(server.library, 2)
+    requests_before = server.stats["requests"]
+    plan = api.plan_library_changes(save_ids=unsaved_ids, unsave_ids=saved_ids, saved_ids=set(saved_ids))
+    assert server.stats["requests"] == requests_before
+    assert (plan.to_save, plan.to_unsave) == (unsaved_ids, saved_ids)
+
+
+def test_failed_batches_are_reported(server, api, monkeypatch):
+    saved_ids, unsaved_ids = split_by_saved(server.library, 2)
+    monkeypatch.setattr(api, "_change_saved_batch", lambda method, batch: method == "PUT")
+    plan = MutationPlan(unsaved_ids + ["unknown"], saved_ids, {**dict.fromkeys(unsaved_ids, False),
+                                                              **dict.fromkeys(saved_ids, True)})
+    save_result, unsave_result = api.apply_library_changes(plan)
+    assert save_result == {"saved": unsaved_ids, "already_saved": [], "failed": ["unknown"]}
+    assert unsave_result == {"unsaved": [], "not_saved": [], "failed": saved_ids}
@@ -0,0 +1,64 @@
+from datetime import date
+
+import pytest
+
+from library_store import LibraryStore
+
+
+def track(index):
+    return {"id": f"t{index}", "name": f"Song {index}", "artists": [{"id": f"ar{index}", "name": f"Artist {index}"}],
+            "album": {"id": f"al{index}", "name": f"Album {index}"}}
+
+
+LOCAL_TRACK = {"id": None, "name": "Local file", "artists": [], "album": {}}
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = LibraryStore(str(tmp_path / "library.db"))
+    yield store
+    store.close()
+
+
+def snapshot(store, day, tracks, time_range="short_term"):
+    with store.conn:
+        store._snapshot_top_tracks(time_range, tracks, date(2026, 1, day))
+
+
+def test_top_tracks_keep_api_positions(store):
+    store.replace([], [], [], {"short_term": [track(1), LOCAL_TRACK, track(2)]}, [], [])
+    assert [top.id for top in store.get_top_tracks("short_term")] == ["t1", "t2"]
+    changes = store.get_rank_changes("short_term")
+    assert [(change["id"], change["rank"]) for change in changes] == [("t1", 1), ("t2", 3)]
+
+
+def test_rank_history_and_changes(store):
+    snapshot(store, 1, [track(1), track(2), track(3)])
+    snapshot(store, 2, [track(2), track(1), track(4)])
+    snapshot(store, 2, [track(2), track(1), track(4)], "long_term")
+
+    assert store.get_top_snapshot_dates("short_term") == ["2026-01-01", "2026-01-02"]
+    history = store.get_rank_history("short_term")
+    assert history["t1"] == [("2026-01-01", 1), ("2026-01-02", 2)]
+    assert history["t3"] == [("2026-01-01", 3), ("2026-01-02", None)]
+    assert history["t4"] == [("2026-01-01", None), ("2026-01-02", 3)]
+    assert store.get_rank_history("short_term", ["t9"]) == {"t9": [("2026-01-01", None), ("2026-01-02", None)]}
+
+    changes = [(change["id"], change["rank"], change["previous_rank"]) for change in store.get_rank_changes("short_term")]
+    assert changes == [("t2", 1, 2), ("t1", 2, 1), ("t4", 3, None), ("t3", None, 3)]
+    assert [change["previous_rank"] for change in store.get_rank_changes("long_term")] == [None, None, None]
+
+
+def test_unchanged_ranking_is_not_stored_again(store):
+    snapshot(store, 1, [track(1), track(2)])
+    snapshot(store, 2, [track(1), track(2)])
+    assert store.get_top_snapshot_dates("short_term") == ["2026-01-01"]
+    # Same order, but a local track now sits between them, so the ranks changed
+    snapshot(store, 3, [track(1), LOCAL_TRACK, track(2)])
+    assert store.get_rank_history("short_term")["t2"] == [("2026-01-01", 2), ("2026-01-03", 3)]
+
+
+def test_same_day_snapshot_is_replaced(store):
+    snapshot(store, 1, [track(1), track(2)])
+    snapshot(store, 1, [track(2), track(1)])
+    assert store.get_rank_history("short_term") == {"t2": [("2026-01-01", 1)], "t1": [("2026-01-01", 2)]}
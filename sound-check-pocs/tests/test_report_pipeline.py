@@ -0,0 +1,81 @@
+import pytest
+
+from report_pipeline import LIBRARY, Pipeline, Stage, local_modules
+
+
+def write(path, text):
+    path.write_text(text)
+    return str(path)
+
+
+@pytest.fixture
+def stages(tmp_path):
+    """upper.py uppercases input.txt into upper.txt, count.py counts upper.txt's characters."""
+    write(tmp_path / "input.txt", "abc")
+    write(tmp_path / "helpers.py", "def shout(text):\n    return text.upper()\n")
+    upper = write(tmp_path / "upper.py", (
+        "import os, sys\n"
+        "sys.path.insert(0, os.path.dirname(__file__))\n"
+        "from helpers import shout\n"
+        f"open({str(tmp_path / 'upper.txt')!r}, 'w').write(shout(open({str(tmp_path / 'input.txt')!r}).read()))\n"
+    ))
+    count = write(tmp_path / "count.py", (
+        f"open({str(tmp_path / 'count.txt')!r}, 'w').write(str(len(open({str(tmp_path / 'upper.txt')!r}).read())))\n"
+    ))
+    return [
+        Stage("upper", upper, [tmp_path / "input.txt"], [tmp_path / "upper.txt"]),
+        Stage("count", count, [tmp_path / "upper.txt", LIBRARY], [tmp_path / "count.txt"]),
+    ]
+
+
+def run(stages, tmp_path, library="v1", **kwargs):
+    return Pipeline(stages, str(tmp_path / "state.json"), library, max_workers=2).run(**kwargs)
+
+
+def test_second_run_skips_unchanged_stages(stages, tmp_path):
+    assert run(stages, tmp_path) == {"upper": "ran", "count": "ran"}
+    assert (tmp_path / "count.txt").read_text() == "3"
+    assert run(stages, tmp_path) == {"upper": "skipped", "count": "skipped"}
+    assert run(stages, tmp_path, force=True) == {"upper": "ran", "count": "ran"}
+
+
+def test_changed_inputs_rerun_only_affected_stages(stages, tmp_path):
+    run(stages, tmp_path)
+    assert run(stages, tmp_path, library="v2") == {"upper": "skipped", "count": "ran"}
+    # Same output contents, so the downstream stage stays skipped
+    (tmp_path / "input.txt").write_text("ABC")
+    assert run(stages, tmp_path, library="v2") == {"upper": "ran", "count": "skipped"}
+    (tmp_path / "input.txt").write_text("abcd")
+    assert run(stages, tmp_path, library="v2") == {"upper": "ran", "count": "ran"}
+    assert (tmp_path / "count.txt").read_text() == "4"
+
+
+def test_imported_module_change_reruns_stage(stages, tmp_path):
+    assert [path.endswith("helpers.py") for path in stages[0].code] == [True]
+    run(stages, tmp_path)
+    (tmp_path / "helpers.py").write_text("def shout(text):\n    return text.upper() + '!'\n")
+    stages[0].code = local_modules(stages[0].script)
+    assert run(stages, tmp_path) == {"upper": "ran", "count": "ran"}
+
+
+def test_missing_output_reruns_stage(stages, tmp_path):
+    run(stages, tmp_path)
+    (tmp_path / "count.txt").unlink()
+    assert run(stages, tmp_path) == {"upper": "skipped", "count": "ran"}
+
+
+def test_failed_stage_fails_dependents_and_is_retried(stages, tmp_path):
+    (tmp_path / "input.txt").unlink()
+    assert run(stages, tmp_path) == {"upper": "failed", "count": "failed"}
+    (tmp_path / "input.txt").write_text("abc")
+    assert run(stages, tmp_path) == {"upper": "ran", "count": "ran"}
+
+
+def test_named_stages_run_with_their_dependencies(stages, tmp_path):
+    assert run(stages, tmp_path, names=["upper"]) == {"upper": "ran"}
+    assert run(stages, tmp_path, names=["count"]) == {"upper": "skipped", "count": "ran"}
+
+
+def test_unknown_stage_names_are_rejected(stages, tmp_path):
+    with pytest.raises(ValueError, match="valid stages are upper, count"):
+        run(stages, tmp_path, names=["count", "nope"])
@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+
+import pytest
+import requests
+
+import request_scheduler
+from request_scheduler import RequestScheduler, retry_after_seconds
+
+
+class FakeResponse:
+    def __init__(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.headers = {} if retry_after is None else {"Retry-After": retry_after}
+
+
+def responses(*items):
+    """send_request callable returning (or raising) items in order."""
+    items = list(items)
+
+    def send_request():
+        item = items.pop(0)
+        if isinstance(item, Exception):
+            raise item
+        return item
+    return send_request
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    slept = []
+    monkeypatch.setattr(request_scheduler.time, "sleep", slept.append)
+    return slept
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("3", 3.0),
+    ("0.5", 0.5),
+    (None, 1.0),
+    ("soon", 1.0),
+    ("inf", 1.0),
+    ("nan", 1.0),
+    ("-4", 0.0),
+])
+def test_retry_after_seconds(value, expected):
+    assert retry_after_seconds(value) == expected
+
+
+def test_retry_after_seconds_is_clamped():
+    assert retry_after_seconds("86400", maximum=30.0) == 30.0
+    assert retry_after_seconds("1e308", maximum=30.0) == 30.0
+
+
+def test_retry_after_http_date():
+    retry_at = datetime.now(timezone.utc) + timedelta(seconds=20)
+    assert 15 < retry_after_seconds(format_datetime(retry_at, usegmt=True)) <= 20
+    past = datetime.now(timezone.utc) - timedelta(hours=1)
+    assert retry_after_seconds(format_datetime(past, usegmt=True)) == 0.0
+
+
+def test_send_retries_429_and_blocks(sleeps):
+    scheduler = RequestScheduler(rate=10, burst=20)
+    response = scheduler.send(responses(FakeResponse(429, "0"), FakeResponse(200)))
+    assert response.status_code == 200
+    assert scheduler.stats == {"requests": 2, "throttled": 1, "retried": 0, "failed": 0}
+    # Halved by the 429, then one step up for the success
+    assert scheduler.rate == 6.0
+
+
+def test_send_retries_server_errors_with_capped_backoff(sleeps):
+    scheduler = RequestScheduler(rate=10, burst=20, backoff_base=1.0, backoff_max=3.0)
+    response = scheduler.send(responses(FakeResponse(503), requests.ConnectionError(), FakeResponse(502),
+                                        FakeResponse(500), FakeResponse(201)))
+    assert response.status_code == 201
+    assert scheduler.stats["retried"] == 4
+    assert len(sleeps) == 4
+    assert all(0 <= seconds <= 3.0 for seconds in sleeps)
+
+
+def test_send_gives_up_after_max_retries(sleeps):
+    scheduler = RequestScheduler(rate=10, burst=20, max_retries=2)
+    response = scheduler.send(responses(FakeResponse(500), FakeResponse(500), FakeResponse(500)))
+    assert response.status_code == 500
+    assert scheduler.stats == {"requests": 3, "throttled": 0, "retried": 2, "failed": 1}
+
+    with pytest.raises(requests.Timeout):
+        scheduler.send(responses(requests.Timeout(), requests.Timeout(), requests.Timeout()))
+
+
+def test_client_errors_are_not_retried(sleeps):
+    scheduler = RequestScheduler(rate=10, burst=20)
+    assert scheduler.send(responses(FakeResponse(404))).status_code == 404
+    assert scheduler.stats["requests"] == 1
+    assert not sleeps
+
+
+def test_block_pauses_reserve_and_halves_rate():
+    scheduler = RequestScheduler(rate=8, burst=5, min_rate=2)
+    assert scheduler.reserve() == 0.0
+    scheduler.block(10)
+    assert 9 < scheduler.reserve() <= 10
+    assert scheduler.rate == 4.0
+    scheduler.block(0)
+    scheduler.block(0)
+    assert scheduler.rate == 2.0
+
+
+def test_rate_rises_on_success_up_to_max_rate():
+    scheduler = RequestScheduler(rate=10, burst=20, max_rate=12, rate_step=1.5)
+    for _ in range(5):
+        scheduler.succeeded()
+    assert scheduler.rate == 12
+
+
+def test_bucket_empties_after_burst():
+    scheduler = RequestScheduler(rate=10, burst=3)
+    assert [scheduler.reserve() for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert 0 < scheduler.reserve() <= 0.1
+
+
+def test_budget_from_environment(monkeypatch):
+    monkeypatch.setenv("SPOTIFY_REQUEST_RATE", "4")
+    monkeypatch.setenv("SPOTIFY_REQUEST_BURST", "7")
+    monkeypatch.setenv("SPOTIFY_MAX_REQUEST_RATE", "9")
+    scheduler = RequestScheduler()
+    assert (scheduler.rate, scheduler.burst, scheduler.max_rate) == (4.0, 7, 9.0)
+    assert RequestScheduler(rate=2, burst=1).rate == 2.0
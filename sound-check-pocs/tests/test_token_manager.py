@@ -0,0 +1,86 @@
+import json
+import os
+import stat
+
+import pytest
+from cryptography.fernet import Fernet
+
+from fake_spotify_server import FakeSpotifyServer, SyntheticLibrary
+from token_manager import TokenManager, load_encryption_key
+
+TOKENS = {"access_token": "access", "refresh_token": "refresh", "expires_in": 3600, "scope": "user-library-read"}
+
+
+@pytest.fixture(autouse=True)
+def key_file(tmp_path, monkeypatch):
+    monkeypatch.delenv("TOKEN_ENCRYPTION_KEY", raising=False)
+    monkeypatch.delenv("TOKEN_ENCRYPTION", raising=False)
+    monkeypatch.setenv("TOKEN_KEY_FILE", str(tmp_path / "keys" / "token.key"))
+    return tmp_path / "keys" / "token.key"
+
+
+def test_tokens_are_encrypted_and_read_back(tmp_path, key_file):
+    path = str(tmp_path / "cache" / "tokens.json")
+    TokenManager(path).save(TOKENS)
+    with open(path, "rb") as f:
+        raw = f.read()
+    assert b"access" not in raw and b"refresh" not in raw
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert stat.S_IMODE(os.stat(key_file).st_mode) == 0o600
+
+    tokens = TokenManager(path).load()
+    assert (tokens["access_token"], tokens["refresh_token"], tokens["scope"]) == ("access", "refresh", "user-library-read")
+    assert TokenManager(path).has_scope("user-library-read")
+
+
+def test_plaintext_tokens_are_read_and_encrypted_on_next_write(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text(json.dumps(dict(TOKENS, expires_at=4102444800)))
+    manager = TokenManager(str(path))
+    assert manager.get_access_token() == "access"
+
+    manager.save({"access_token": "new", "expires_in": 3600})
+    assert not path.read_bytes().lstrip().startswith(b"{")
+    tokens = TokenManager(str(path)).load()
+    # The refresh token and scope carry over when a response leaves them out
+    assert (tokens["access_token"], tokens["refresh_token"], tokens["scope"]) == ("new", "refresh", "user-library-read")
+
+
+def test_key_from_environment_and_wrong_key(tmp_path, monkeypatch):
+    key = Fernet.generate_key()
+    monkeypatch.setenv("TOKEN_ENCRYPTION_KEY", key.decode())
+    assert load_encryption_key() == key
+    path = str(tmp_path / "tokens.json")
+    TokenManager(path).save(TOKENS)
+
+    with pytest.raises(ValueError, match="different key"):
+        TokenManager(path, encryption_key=Fernet.generate_key()).load()
+
+
+def test_encryption_off_stores_plain_json(tmp_path, monkeypatch):
+    monkeypatch.setenv("TOKEN_ENCRYPTION", "off")
+    path = tmp_path / "tokens.json"
+    with pytest.warns(UserWarning, match="unencrypted"):
+        manager = TokenManager(str(path))
+    manager.save(TOKENS)
+    assert json.loads(path.read_text())["access_token"] == "access"
+
+
+def test_expired_and_rejected_tokens_are_refreshed(tmp_path):
+    server = FakeSpotifyServer(SyntheticLibrary(10)).start()
+    try:
+        manager = TokenManager(str(tmp_path / "tokens.json"), token_url=f"{server.url}/api/token")
+        assert manager.get_access_token() is None
+
+        manager.save(dict(TOKENS, expires_in=0))
+        refreshed = manager.get_access_token()
+        assert refreshed != "access"
+        assert manager.get_access_token() == refreshed
+        assert server.stats["requests"] == 1
+
+        # A token the API rejected is refreshed even though it has not expired
+        manager.get_access_token(rejected_token=refreshed)
+        assert server.stats["requests"] == 2
+        assert TokenManager(manager.path).load()["refresh_token"] == "refresh"
+    finally:
+        server.stop()
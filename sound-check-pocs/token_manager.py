@@ -0,0 +1,195 @@
+import json
+import os
+import threading
+import time
+import warnings
+from contextlib import contextmanager
+import requests
+from dotenv import load_dotenv
+from json_codec import loads
+from request_scheduler import RequestScheduler
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+try:
+    from cryptography.fernet import Fernet, InvalidToken
+except ImportError:
+    Fernet = None
+
+load_dotenv()
+
+TOKEN_URL = "https://accounts.spotify.com/api/token"
+# Generated encryption key used when TOKEN_ENCRYPTION_KEY is not set, kept apart from the token files
+DEFAULT_KEY_FILE = os.path.join(os.path.expanduser("~"), ".config", "soundcheck", "token.key")
+
+
+def load_encryption_key(key_file=None):
+    """
+    Fernet key for the token files: TOKEN_ENCRYPTION_KEY if set, otherwise the key in key_file
+    (TOKEN_KEY_FILE or ~/.config/soundcheck/token.key), generated on first use and readable only
+    by the owner.
+    """
+    key = os.getenv("TOKEN_ENCRYPTION_KEY")
+    if key:
+        return key.encode("utf-8")
+    key_file = key_file or os.getenv("TOKEN_KEY_FILE") or DEFAULT_KEY_FILE
+    if not os.path.exists(key_file):
+        os.makedirs(os.path.dirname(key_file) or ".", exist_ok=True)
+        try:
+            fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            pass  # Another process generated it first
+        else:
+            with os.fdopen(fd, "wb") as f:
+                f.write(Fernet.generate_key())
+    with open(key_file, "rb") as f:
+        return f.read().strip()
+
+
+class TokenManager:
+    """
+    Persists Spotify tokens between runs and refreshes the access token when it expires.
+
+    Tokens live in one owner-only file, Fernet-encrypted (needs the cryptography package) with
+    the key from load_encryption_key. Setting TOKEN_ENCRYPTION=off stores plain JSON instead,
+    with a warning; a plaintext file from before is encrypted the next time tokens are written.
+    Refreshes go through a RequestScheduler (SpotifyWebApi shares its session and scheduler), so
+    throttled, 5xx and dropped requests are retried. Every read-modify-write happens under a thread lock plus
+    an exclusive lock on a sidecar .lock file, and the file is re-read under the lock, so when
+    several threads or processes see an expired token only the first one refreshes it and the
+    rest pick up the new token.
+    """
+
+    def __init__(self, path, client_id=None, encryption_key=None, refresh_margin=60, timeout=(5, 30), token_url=None,
+                 session=None, scheduler=None):
+        self.path = path
+        accounts_url = os.getenv("SPOTIFY_ACCOUNTS_URL")
+        self.token_url = token_url or (accounts_url.rstrip("/") + "/api/token" if accounts_url else TOKEN_URL)
+        self.client_id = client_id or os.getenv("CLIENT_ID")
+        if os.getenv("TOKEN_ENCRYPTION", "").lower() == "off" and not encryption_key:
+            warnings.warn(f"TOKEN_ENCRYPTION=off: tokens are stored unencrypted in {path}")
+            self._fernet = None
+        elif Fernet is None:
+            raise ImportError("The cryptography package is required to encrypt the token file "
+                              "(or set TOKEN_ENCRYPTION=off to store tokens unencrypted)")
+        else:
+            self._fernet = Fernet(encryption_key or load_encryption_key())
+        self.session = session or requests.Session()
+        self.scheduler = scheduler or RequestScheduler()
+        # Refresh this many seconds before the access token actually expires
+        self.refresh_margin = refresh_margin
+        self.timeout = timeout
+        self._thread_lock = threading.Lock()
+        self._tokens = None
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _read(self):
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path, "rb") as f:
+            raw = f.read()
+        if self._fernet and not raw.lstrip().startswith(b"{"):
+            try:
+                raw = self._fernet.decrypt(raw)
+            except InvalidToken:
+                raise ValueError(f"{self.path} was encrypted with a different key than the current one") from None
+        return json.loads(raw)
+
+    def _write(self, tokens):
+        raw = json.dumps(tokens).encode("utf-8")
+        if self._fernet:
+            raw = self._fernet.encrypt(raw)
+        tmp_path = self.path + ".tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(raw)
+        os.replace(tmp_path, self.path)
+        self._tokens = tokens
+
+    def _is_fresh(self, tokens):
+        return bool(tokens) and tokens.get("expires_at", 0) - self.refresh_margin > time.time()
+
+    def load(self):
+        """Return the stored tokens (access_token, refresh_token, expires_at, scope) or None."""
+        with self._locked():
+            self._tokens = self._read()
+            return self._tokens
+
+    def save(self, tokens):
+        """Store a token response from the authorization code or refresh grant."""
+        with self._locked():
+            self._store(tokens, self._read())
+
+    def _store(self, tokens, previous=None):
+        previous = previous or {}
+        self._write({
+            "access_token": tokens["access_token"],
+            # Spotify may leave out refresh_token when refreshing; the old one stays valid then
+            "refresh_token": tokens.get("refresh_token") or previous.get("refresh_token"),
+            "expires_at": tokens.get("expires_at") or time.time() + tokens.get("expires_in", 3600),
+            "scope": tokens.get("scope", previous.get("scope", "")),
+        })
+
+    def has_scope(self, scope):
+        """Whether stored tokens were granted every scope in the space-separated scope string."""
+        tokens = self._tokens or self.load()
+        return bool(tokens and tokens.get("refresh_token")) and set((scope or "").split()) <= set(tokens.get("scope", "").split())
+
+    def _refresh(self, tokens):
+        data = {
+            "grant_type": "refresh_token",
+            "refresh_token": tokens["refresh_token"],
+            "client_id": self.client_id,
+        }
+        response = self.scheduler.send(lambda: self.session.post(self.token_url, timeout=self.timeout, data=data))
+        if response.status_code != 200:
+            raise Exception(f"Failed to refresh access token: {response.status_code}, {response.text}")
+        self._store(loads(response.content), tokens)
+
+    def get_access_token(self, rejected_token=None):
+        """
+        Return a usable access token, refreshing it when it is about to expire.
+
+        Args:
+            rejected_token: Access token the API just answered 401 for; it is refreshed even if not expired yet
+
+        Returns:
+            The access token, or None when nothing is stored
+        """
+        tokens = self._tokens
+        if self._is_fresh(tokens) and tokens["access_token"] != rejected_token:
+            return tokens["access_token"]
+        with self._locked():
+            # Another thread or process may have refreshed while we waited for the lock
+            tokens = self._read()
+            if not tokens:
+                self._tokens = None
+                return None
+            if not self._is_fresh(tokens) or tokens["access_token"] == rejected_token:
+                self._refresh(tokens)
+            else:
+                self._tokens = tokens
+            return self._tokens["access_token"]
+
+
+def create_token_manager(file_path):
+    """TokenManager storing tokens under file_path/cache, shared by every script using that FILE_PATH."""
+    return TokenManager(os.path.join(file_path or "", "cache", "tokens.json"))
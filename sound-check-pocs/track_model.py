@@ -0,0 +1,175 @@
+import sys
+from typing import List, Optional
+from json_codec import DECODER, loads
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+
+def _intern(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+class Track:
+    """
+    Compact track record used by the analysis code instead of the raw Spotify track JSON.
+
+    Only the primary artist and album fields the reports read are kept, ids and names are
+    interned so repeated artists/albums share one string, and __slots__ drops the per-object dict.
+    """
+    __slots__ = ("id", "name", "artist_id", "artist_name", "album_id", "album_name",
+                 "release_date", "popularity", "duration_ms", "artist_ids")
+
+    def __init__(self, track_id, name, artist_id=None, artist_name=None, album_id=None, album_name=None,
+                 release_date=None, popularity=None, duration_ms=None, artist_ids=()):
+        self.id = _intern(track_id)
+        self.name = _intern(name)
+        self.artist_id = _intern(artist_id)
+        self.artist_name = _intern(artist_name)
+        self.album_id = _intern(album_id)
+        self.album_name = _intern(album_name)
+        self.release_date = _intern(release_date)
+        self.popularity = popularity
+        self.duration_ms = duration_ms
+        # Every artist on the track, primary first
+        self.artist_ids = tuple(_intern(artist_id) for artist_id in artist_ids)
+
+    @classmethod
+    def from_api(cls, track):
+        """Build a Track from a Spotify track object; returns None for a missing (removed) track."""
+        if not track:
+            return None
+        artists = track.get("artists") or []
+        album = track.get("album") or {}
+        return cls(
+            track.get("id"),
+            track.get("name"),
+            artists[0].get("id") if artists else None,
+            artists[0].get("name") if artists else None,
+            album.get("id"),
+            album.get("name"),
+            album.get("release_date"),
+            track.get("popularity"),
+            track.get("duration_ms"),
+            [artist.get("id") for artist in artists if artist.get("id")]
+        )
+
+    def __repr__(self):
+        return f"Track({self.id!r}, {self.name!r}, {self.artist_name!r})"
+
+
+class TrackItem:
+    """A track's membership in a playlist or the saved library, with when it was added."""
+    __slots__ = ("track", "added_at")
+
+    def __init__(self, track, added_at):
+        self.track = track
+        self.added_at = _intern(added_at)
+
+
+def items_from_api(items, tracks=None):
+    """
+    Convert playlist or saved track items into TrackItems, dropping the raw JSON.
+
+    Args:
+        items: List of Spotify items ({"added_at": ..., "track": {...}})
+        tracks: Optional dict of track ID -> Track shared across calls so each track is built once
+
+    Returns:
+        List of TrackItem in the same order
+    """
+    tracks = tracks if tracks is not None else {}
+    result = []
+    for item in items:
+        track_json = item.get("track")
+        track_id = track_json.get("id") if track_json else None
+        if track_id and track_id in tracks:
+            track = tracks[track_id]
+        else:
+            track = Track.from_api(track_json)
+            if track_id:
+                tracks[track_id] = track
+        result.append(TrackItem(track, item.get("added_at")))
+    return result
+
+
+if msgspec is not None:
+    # Typed shapes of a track item page holding only what Track keeps; msgspec skips every other field
+    class _ArtistStruct(msgspec.Struct):
+        id: Optional[str] = None
+        name: Optional[str] = None
+
+    class _AlbumStruct(msgspec.Struct):
+        id: Optional[str] = None
+        name: Optional[str] = None
+        release_date: Optional[str] = None
+
+    class _TrackStruct(msgspec.Struct):
+        id: Optional[str] = None
+        name: Optional[str] = None
+        popularity: Optional[int] = None
+        duration_ms: Optional[int] = None
+        album: Optional[_AlbumStruct] = None
+        artists: List[_ArtistStruct] = []
+
+    class _ItemStruct(msgspec.Struct):
+        added_at: Optional[str] = None
+        track: Optional[_TrackStruct] = None
+
+    class _PageStruct(msgspec.Struct):
+        items: List[_ItemStruct] = []
+        total: int = 0
+
+    _page_decoder = msgspec.json.Decoder(_PageStruct)
+
+
+def _track_from_struct(track):
+    artists = track.artists
+    album = track.album
+    return Track(
+        track.id,
+        track.name,
+        artists[0].id if artists else None,
+        artists[0].name if artists else None,
+        album.id if album else None,
+        album.name if album else None,
+        album.release_date if album else None,
+        track.popularity,
+        track.duration_ms,
+        [artist.id for artist in artists if artist.id]
+    )
+
+
+def decode_item_page(raw, tracks=None):
+    """
+    Decode a raw playlist tracks or saved tracks page straight into TrackItems.
+
+    With msgspec installed the page is decoded into typed structs holding only the fields Track
+    keeps, so available_markets, images and the rest never become Python objects. Otherwise (or
+    with JSON_DECODER=json) it goes through json_codec.loads and items_from_api.
+
+    Args:
+        raw: Response body (bytes) of a paging object of track items
+        tracks: Optional dict of track ID -> Track shared across pages (see items_from_api)
+
+    Returns:
+        (list of TrackItem, total number of items in the paged collection)
+    """
+    if msgspec is None or DECODER == "json":
+        page = loads(raw)
+        return items_from_api(page["items"], tracks), page["total"]
+    tracks = tracks if tracks is not None else {}
+    page = _page_decoder.decode(raw)
+    result = []
+    for item in page.items:
+        track_id = item.track.id if item.track else None
+        if track_id and track_id in tracks:
+            track = tracks[track_id]
+        else:
+            track = _track_from_struct(item.track) if item.track else None
+            if track_id:
+                tracks[track_id] = track
+        result.append(TrackItem(track, item.added_at))
+    return result, page.total
@@ -0,0 +1,72 @@
+import numpy as np
+
+
+class TrackSets:
+    """
+    Named track collections (saved, top, playlists, ...) as boolean masks over one track index.
+
+    Every track gets a dense integer index the first time any collection mentions it, and each
+    collection becomes a bool array over that index, so intersections and differences are
+    numpy expressions like sets["saved"] & ~sets["top"]. Each collection also keeps its original
+    sequence of indices (with repeats), which select() uses to list results in that collection's
+    order and counts() uses for occurrence counts.
+    """
+
+    def __init__(self, named_tracks):
+        """
+        Args:
+            named_tracks: Dict of collection name -> iterable of Track; tracks without an id are skipped
+        """
+        self.tracks = []
+        self._codes = {}
+        self.sequences = {}
+        for name, tracks in named_tracks.items():
+            self.sequences[name] = np.array([self._code(track) for track in tracks if track and track.id], dtype=np.int64)
+
+        self.size = len(self.tracks)
+        self.masks = {}
+        for name, sequence in self.sequences.items():
+            mask = np.zeros(self.size, dtype=bool)
+            mask[sequence] = True
+            self.masks[name] = mask
+
+    def _code(self, track):
+        code = self._codes.get(track.id)
+        if code is None:
+            code = self._codes[track.id] = len(self.tracks)
+            self.tracks.append(track)
+        return code
+
+    def __getitem__(self, name):
+        return self.masks[name]
+
+    def code(self, track_id):
+        return self._codes[track_id]
+
+    def counts(self, name):
+        """Number of times each indexed track occurs in the named collection."""
+        return np.bincount(self.sequences[name], minlength=self.size)
+
+    def mask_where(self, predicate):
+        """Bool mask of the indexed tracks for which predicate(track) is true."""
+        return np.fromiter((predicate(track) for track in self.tracks), dtype=bool, count=self.size)
+
+    def select(self, order, mask=None, unique=False):
+        """
+        Tracks of the collection named order that fall in mask, in that collection's order.
+
+        Args:
+            order: Name of the collection whose sequence gives the result order
+            mask: Bool mask over the track index (all of the collection when None)
+            unique: Keep only the first occurrence of repeated tracks
+
+        Returns:
+            List of Track
+        """
+        sequence = self.sequences[order]
+        if unique:
+            _, first = np.unique(sequence, return_index=True)
+            sequence = sequence[np.sort(first)]
+        if mask is not None:
+            sequence = sequence[mask[sequence]]
+        return [self.tracks[code] for code in sequence]